@@ -4,6 +4,8 @@ import sys
 import shutil
 import tempfile
 
+from render_planner import ass_force_style
+
 def normalize_path_for_ffmpeg(path):
     """标准化路径以适配FFmpeg的subtitles滤镜"""
     # 转换为绝对路径
@@ -160,7 +162,7 @@ def parse_srt_to_drawtext(srt_file):
         print(f"⚠️ 解析SRT文件失败: {str(e)}")
         return None
 
-def run(video_file, subtitle_file, output_file, hard_subtitle=True):
+def run(video_file, subtitle_file, output_file, hard_subtitle=True, style_options=None):
     """
     将字幕嵌入视频
     
@@ -169,6 +171,7 @@ def run(video_file, subtitle_file, output_file, hard_subtitle=True):
         subtitle_file: 字幕文件路径
         output_file: 输出视频文件路径
         hard_subtitle: True=硬字幕(烧录到画面), False=软字幕(可切换)
+        style_options: 硬字幕样式（字体、字号、颜色、描边、位置），用于ASS滤镜
     
     Returns:
         bool: 是否成功
@@ -243,10 +246,14 @@ def run(video_file, subtitle_file, output_file, hard_subtitle=True):
                     print(f"   ASS字幕路径: {ass_file}")
                     
                     # 使用subtitles滤镜代替ass滤镜，更稳定
+                    subtitle_filter = f"subtitles={ass_file}"
+                    force_style = ass_force_style(style_options)
+                    if force_style:
+                        subtitle_filter += f":force_style='{force_style}'"
                     cmd = [
                         'ffmpeg', '-y',
                         '-i', temp_video,
-                        '-vf', f"subtitles={ass_file}",
+                        '-vf', subtitle_filter,
                         '-c:v', 'libx264',
                         '-c:a', 'copy',
                         output_file
@@ -587,7 +594,7 @@ def create_bilingual_subtitle_file(original_subtitle_path, converted_subtitle_pa
         traceback.print_exc()
         return False
 
-def run_with_bilingual_subtitle_enhanced(video_file, original_subtitle_file, converted_subtitle_file, output_file, conversion_type, subtitle_mode="硬字幕（烧录到视频）"):
+def run_with_bilingual_subtitle_enhanced(video_file, original_subtitle_file, converted_subtitle_file, output_file, conversion_type, subtitle_mode="硬字幕（烧录到视频）", style_options=None):
     """
     增强版双语字幕嵌入函数，整合字幕创建和视频嵌入
     
@@ -598,6 +605,7 @@ def run_with_bilingual_subtitle_enhanced(video_file, original_subtitle_file, con
         output_file: 输出视频文件路径
         conversion_type: 转换类型 ("中文转英文" 或 "英文转中文")
         subtitle_mode: 字幕模式（"硬字幕（烧录到视频）" 或 "软字幕（可选显示）"）
+        style_options: 硬字幕样式
     
     Returns:
         dict: 包含处理结果和相关文件路径的字典
@@ -641,7 +649,7 @@ def run_with_bilingual_subtitle_enhanced(video_file, original_subtitle_file, con
         # 根据字幕模式选择嵌入方式
         if subtitle_mode == "硬字幕（烧录到视频）":
             # 硬字幕模式：将双语字幕烧录到视频
-            success = run(video_file, temp_bilingual_file, output_file, hard_subtitle=True)
+            success = run(video_file, temp_bilingual_file, output_file, hard_subtitle=True, style_options=style_options)
         else:
             # 软字幕模式：如果有两个独立字幕文件，使用双轨道方式
             if converted_subtitle_file and os.path.exists(converted_subtitle_file):
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+"""
+合成音频缓存模块
+使用SQLite索引管理 audio_cache 目录：限制总字节数，按LRU淘汰，并记录命中统计。
+缓存条目以紧凑格式存储：安装 soundfile 时使用无损压缩的FLAC，否则使用可内存映射的 int16 .npy。
+
+缓存目录可以放在多个进程共享的路径上：
+- 音频文件按内容哈希命名（objects/<前两位>/<哈希>.<格式>），相同内容只保存一份
+- 先写临时文件再原子重命名，读取方不会看到写了一半的文件
+- 修改索引和淘汰时持有跨进程文件锁
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from audio_io import SYNTHESIS_SAMPLE_RATE, read_wav_pcm, write_wav_pcm
+
+# 可选依赖：soundfile（用于FLAC压缩存储）。若缺失，则降级为 .npy 存储。
+try:
+    import soundfile
+    _HAS_SOUNDFILE = True
+except Exception:
+    soundfile = None
+    _HAS_SOUNDFILE = False
+
+# 默认缓存容量上限：2GB
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# 旧版本直接放在缓存目录下的缓存文件：<md5>.wav
+LEGACY_FILENAME_PATTERN = re.compile(r"[0-9a-f]{32}\.wav")
+
+
+class InterProcessLock:
+    """基于锁文件的跨进程互斥锁（POSIX 使用 fcntl，Windows 使用 msvcrt）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._file = open(self.path, "a+b")
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK 重试约10秒仍失败时抛出异常，继续等待
+                        time.sleep(0.05)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+        return False
+
+
+class AudioCache:
+    """带索引和容量上限的音频缓存
+
+    索引保存在缓存目录下的 cache_index.sqlite 中，并在内存中保留一份按访问顺序排列的镜像，
+    查找为O(1)且未命中时不访问文件系统。命中只更新内存，访问时间在写入、淘汰时或每隔
+    ACCESS_FLUSH_INTERVAL 秒批量写回索引。未命中时才检查其他进程是否写入了新条目，
+    最迟 refresh_interval 秒后同步到镜像。超过容量上限时淘汰最久未使用的条目。
+    """
+
+    INDEX_FILENAME = "cache_index.sqlite"
+    LOCK_FILENAME = "cache.lock"
+    OBJECTS_DIRNAME = "objects"
+    STORAGE_FORMATS = ("flac", "npy", "wav")
+    # 命中的访问时间最多缓冲多少秒再批量写回索引
+    ACCESS_FLUSH_INTERVAL = 30.0
+
+    def __init__(self, cache_dir="audio_cache", max_bytes=DEFAULT_CACHE_MAX_BYTES, storage_format=None,
+                 refresh_interval=5.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        if storage_format is None:
+            storage_format = default_storage_format()
+        if storage_format not in self.STORAGE_FORMATS:
+            raise ValueError(f"不支持的缓存存储格式: {storage_format}")
+        if storage_format == "flac" and not _HAS_SOUNDFILE:
+            raise ValueError("FLAC缓存格式需要安装 soundfile 库")
+        self.storage_format = storage_format
+        self._lock = threading.RLock()
+        # key -> (filename, size_bytes, sample_rate)，顺序即LRU顺序（最近使用的在末尾）
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+        # 尚未写入索引的统计增量：多个进程共享同一索引，按增量累加
+        self._unflushed_stats = dict.fromkeys(self._stats, 0)
+        # 尚未写回索引的命中：key -> [最近访问时间, 命中次数]
+        self._pending_access = {}
+        self._last_access_flush = time.monotonic()
+        self._data_version = None
+        self._last_refresh = 0.0
+
+        os.makedirs(os.path.join(self.cache_dir, self.OBJECTS_DIRNAME), exist_ok=True)
+        self._file_lock = InterProcessLock(os.path.join(self.cache_dir, self.LOCK_FILENAME))
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, self.INDEX_FILENAME),
+                                     timeout=30, check_same_thread=False)
+        self._init_index()
+
+    def _init_index(self):
+        """创建索引表并加载到内存"""
+        with self._file_lock, self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, filename TEXT NOT NULL, size_bytes INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL, hit_count INTEGER NOT NULL DEFAULT 0, "
+                f"sample_rate INTEGER NOT NULL DEFAULT {SYNTHESIS_SAMPLE_RATE})"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+            if "sample_rate" not in columns:
+                # 旧版本索引没有采样率字段，旧条目均为TTS采样率
+                self._conn.execute(
+                    f"ALTER TABLE entries ADD COLUMN sample_rate INTEGER NOT NULL DEFAULT {SYNTHESIS_SAMPLE_RATE}"
+                )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_filename ON entries (filename)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+
+            self._drop_legacy_files()
+
+            for name, value in self._conn.execute("SELECT name, value FROM stats"):
+                if name in self._stats:
+                    self._stats[name] = value
+
+            self._reload_entries()
+            self._evict_locked()
+
+    def _drop_legacy_files(self):
+        """删除旧版本的缓存文件（缓存目录下的 <md5>.wav）及其索引条目
+
+        旧缓存的键值在更换发音人和加入传输格式之前计算，新的键值永远不会命中这些文件，
+        登记到索引中只会占用容量上限，因此直接删除。调用方需持有文件锁。
+        """
+        rows = self._conn.execute(
+            "SELECT key, filename FROM entries WHERE filename NOT LIKE ?", (f"{self.OBJECTS_DIRNAME}%",)
+        ).fetchall()
+        if rows:
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+            self._conn.commit()
+
+        removed = 0
+        for filename in os.listdir(self.cache_dir):
+            if not LEGACY_FILENAME_PATTERN.fullmatch(filename):
+                continue
+            try:
+                os.remove(self._path(filename))
+                removed += 1
+            except OSError:
+                pass
+        if rows or removed:
+            print(f"🗂️ 已清理旧版本缓存: {len(rows)} 个索引条目，{removed} 个文件")
+
+    def _reload_entries(self):
+        """从索引重建内存镜像（调用方需持有 self._lock）"""
+        self._entries.clear()
+        for key, filename, size_bytes, sample_rate in self._conn.execute(
+                "SELECT key, filename, size_bytes, sample_rate FROM entries ORDER BY last_access"):
+            self._entries[key] = (filename, size_bytes, sample_rate)
+        self._total_bytes = self._query_total_bytes()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._last_refresh = time.monotonic()
+
+    def _query_total_bytes(self):
+        """统计索引中所有不重复文件的总字节数"""
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM "
+            "(SELECT MAX(size_bytes) AS size_bytes FROM entries GROUP BY filename)"
+        ).fetchone()[0]
+
+    def _refresh_if_stale(self):
+        """每隔 refresh_interval 秒检查其他进程是否修改了索引（调用方需持有 self._lock）"""
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = time.monotonic()
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            # 重建镜像以索引中的访问顺序为准，先写回本进程缓冲的命中
+            self._flush_access_locked()
+            self._reload_entries()
+
+    def _path(self, filename):
+        return os.path.join(self.cache_dir, filename)
+
+    def contains(self, key):
+        """判断条目是否存在（不更新LRU顺序和命中统计）"""
+        with self._lock:
+            if key in self._entries:
+                return True
+            # 只有内存镜像中没有时才可能是其他进程刚写入的条目
+            self._refresh_if_stale()
+            return key in self._entries
+
+    def _count_stat(self, name, value=1):
+        """累加统计（调用方需持有 self._lock）"""
+        self._stats[name] += value
+        self._unflushed_stats[name] += value
+
+    def _lookup(self, key):
+        """查找条目并更新LRU顺序与统计，返回 (路径, 采样率)，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # 只有内存镜像中没有时才可能是其他进程刚写入的条目
+                self._refresh_if_stale()
+                entry = self._entries.get(key)
+            if entry is None:
+                self._count_stat("misses")
+                return None
+
+            filename, size_bytes, sample_rate = entry
+            self._entries.move_to_end(key)
+            self._count_stat("hits")
+            self._count_stat("bytes_saved", size_bytes)
+            # 命中只记在内存中，定期批量写回，避免每次命中都提交一次索引
+            access = self._pending_access.setdefault(key, [0.0, 0])
+            access[0] = time.time()
+            access[1] += 1
+            if time.monotonic() - self._last_access_flush >= self.ACCESS_FLUSH_INTERVAL:
+                self._flush_access_locked()
+            return self._path(filename), sample_rate
+
+    def _flush_access_locked(self):
+        """把缓冲的访问时间和命中次数写回索引（调用方需持有 self._lock）"""
+        self._last_access_flush = time.monotonic()
+        if not self._pending_access:
+            return
+        self._conn.executemany(
+            "UPDATE entries SET last_access = MAX(last_access, ?), hit_count = hit_count + ? WHERE key = ?",
+            [(last_access, hits, key) for key, (last_access, hits) in self._pending_access.items()]
+        )
+        self._conn.commit()
+        self._pending_access.clear()
+
+    def load(self, key):
+        """读取缓存的PCM数据，返回 (int16数组, 采样率)，未命中返回None
+
+        .npy 条目以只读内存映射方式返回，不复制整个文件。
+        """
+        found = self._lookup(key)
+        if found is None:
+            return None
+        path, sample_rate = found
+        try:
+            return self._read_entry(path, sample_rate)
+        except (OSError, ValueError, EOFError, RuntimeError) as e:
+            # 文件可能刚被其他进程淘汰，只丢弃本进程镜像中的条目，不改动共享索引
+            print(f"⚠️ 缓存文件损坏或丢失，忽略条目 {key}: {e}")
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+    def _read_entry(self, path, sample_rate):
+        """按文件扩展名读取条目"""
+        if path.endswith(".npy"):
+            return np.load(path, mmap_mode="r"), sample_rate
+        if path.endswith(".flac"):
+            if not _HAS_SOUNDFILE:
+                raise RuntimeError("读取FLAC缓存需要安装 soundfile 库")
+            samples, file_rate = soundfile.read(path, dtype="int16")
+            if samples.ndim > 1:
+                samples = samples.mean(axis=1).astype(np.int16)
+            return samples, file_rate
+        return read_wav_pcm(path)
+
+    def _write_entry(self, path, samples, sample_rate):
+        """按当前存储格式写入条目"""
+        if self.storage_format == "npy":
+            # np.save 会自动补 .npy 后缀，使用文件对象保持路径不变
+            with open(path, "wb") as f:
+                np.save(f, samples)
+        elif self.storage_format == "flac":
+            soundfile.write(path, samples, sample_rate, format="FLAC", subtype="PCM_16")
+        else:
+            write_wav_pcm(path, samples, sample_rate)
+
+    def _object_filename(self, samples, sample_rate):
+        """按音频内容计算对象文件的相对路径"""
+        digest = hashlib.sha256(samples.tobytes())
+        digest.update(str(sample_rate).encode("ascii"))
+        content_hash = digest.hexdigest()
+        return os.path.join(self.OBJECTS_DIRNAME, content_hash[:2], f"{content_hash}.{self.storage_format}")
+
+    def _write_object(self, filename, samples, sample_rate):
+        """原子地写入对象文件：已存在则直接复用"""
+        path = self._path(filename)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            self._write_entry(temp_path, samples, sample_rate)
+            # 多个进程同时写入相同内容时，无论谁最后重命名结果都一样
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def put(self, key, samples, sample_rate=SYNTHESIS_SAMPLE_RATE):
+        """写入PCM数据并登记索引，必要时淘汰旧条目"""
+        samples = np.ascontiguousarray(samples, dtype=np.int16)
+        filename = self._object_filename(samples, sample_rate)
+        self._write_object(filename, samples, sample_rate)
+        now = time.time()
+
+        with self._file_lock, self._lock:
+            # 加锁后再取大小：文件可能在写入与加锁之间被其他进程淘汰
+            if not os.path.exists(self._path(filename)):
+                self._write_object(filename, samples, sample_rate)
+            size_bytes = os.path.getsize(self._path(filename))
+            previous = self._conn.execute("SELECT filename FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, filename, size_bytes, created_at, last_access, sample_rate) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, filename, size_bytes, now, now, sample_rate)
+            )
+            self._conn.commit()
+            # 存储格式或内容变化时删除不再被引用的旧文件
+            if previous is not None and previous[0] != filename:
+                self._delete_file_if_unreferenced(previous[0])
+
+            self._entries.pop(key, None)
+            self._entries[key] = (filename, size_bytes, sample_rate)
+            self._evict_locked()
+
+    def _delete_file_if_unreferenced(self, filename):
+        """没有任何条目引用该文件时将其删除，返回是否删除（调用方需持有文件锁）"""
+        if self._conn.execute("SELECT 1 FROM entries WHERE filename = ? LIMIT 1", (filename,)).fetchone():
+            return False
+        try:
+            os.remove(self._path(filename))
+        except OSError:
+            pass
+        return True
+
+    def remove(self, key):
+        """删除一个条目，文件不再被引用时一并删除"""
+        with self._file_lock, self._lock:
+            self._entries.pop(key, None)
+            row = self._conn.execute("SELECT filename FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+            self._delete_file_if_unreferenced(row[0])
+            self._total_bytes = self._query_total_bytes()
+
+    def _evict_locked(self):
+        """总字节数超过上限时按LRU顺序淘汰（调用方需持有文件锁和 self._lock）
+
+        总量和访问顺序以共享索引为准，其他进程写入的条目也会参与淘汰。
+        """
+        # 先写回缓冲的访问时间，保证淘汰顺序反映本进程的命中
+        self._flush_access_locked()
+        total_bytes = self._query_total_bytes()
+        if total_bytes > self.max_bytes:
+            evicted = 0
+            candidates = self._conn.execute(
+                "SELECT key, filename, size_bytes FROM entries ORDER BY last_access"
+            ).fetchall()
+            for key, filename, size_bytes in candidates:
+                if total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._entries.pop(key, None)
+                evicted += 1
+                if self._delete_file_if_unreferenced(filename):
+                    total_bytes -= size_bytes
+            self._conn.commit()
+            self._count_stat("evictions", evicted)
+            print(f"🧹 缓存超出容量上限，已淘汰 {evicted} 个条目")
+        self._total_bytes = total_bytes
+
+    def flush_stats(self):
+        """将本进程的统计增量和缓冲的访问时间写入索引"""
+        with self._lock:
+            self._flush_access_locked()
+            deltas = [(name, value) for name, value in self._unflushed_stats.items() if value]
+            if not deltas:
+                return
+            self._conn.executemany("INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)",
+                                   [(name,) for name, _ in deltas])
+            self._conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                                   [(value, name) for name, value in deltas])
+            self._conn.commit()
+            self._unflushed_stats = dict.fromkeys(self._stats, 0)
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                total_bytes=self._total_bytes,
+                max_bytes=self.max_bytes,
+                storage_format=self.storage_format,
+                hit_rate=(self._stats["hits"] / lookups) if lookups else 0.0
+            )
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            keys = list(self._entries.keys())
+        for key in keys:
+            self.remove(key)
+
+    def close(self):
+        """保存统计并关闭索引"""
+        self.flush_stats()
+        with self._lock:
+            self._conn.close()
+
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def default_storage_format():
+    """未指定存储格式时使用的格式：安装 soundfile 时为FLAC，否则为 .npy"""
+    return "flac" if _HAS_SOUNDFILE else "npy"
+
+
+def get_audio_cache(cache_dir="audio_cache", max_bytes=DEFAULT_CACHE_MAX_BYTES, storage_format=None):
+    """获取指定目录和存储格式的共享缓存实例，同一进程内相同的组合只打开一次索引
+
+    同一目录以不同格式打开时返回各自的实例：新条目按各自的格式写入，
+    已有条目无论格式如何都能读取。
+    """
+    storage_format = storage_format or default_storage_format()
+    cache_id = (os.path.abspath(cache_dir), storage_format)
+    with _shared_caches_lock:
+        cache = _shared_caches.get(cache_id)
+        if cache is None:
+            cache = AudioCache(cache_dir, max_bytes, storage_format)
+            _shared_caches[cache_id] = cache
+        else:
+            cache.max_bytes = max_bytes
+        return cache
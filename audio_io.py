@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+音频内存I/O模块
+在内存中完成TTS音频的解码与格式转换，避免临时文件的创建和删除
+
+提取出的长音轨通过 memmap_wav 以 numpy.memmap 方式访问，截取任意区间的开销只与区间长度有关；
+压缩格式或需要转换采样率时由 iter_pcm_chunks 经ffmpeg管道分块读取。
+"""
+
+import io
+import os
+import struct
+import subprocess
+import threading
+
+import numpy as np
+
+# 讯飞TTS返回音频的采样率（auf: audio/L16;rate=16000）
+SYNTHESIS_SAMPLE_RATE = 16000
+
+
+class StreamingMp3Decoder:
+    """流式MP3解码器
+
+    启动一个ffmpeg进程，WebSocket每收到一块MP3数据就写入其标准输入，
+    后台线程持续读取标准输出中的PCM数据，最终得到 int16 单声道 NumPy 数组。
+    """
+
+    def __init__(self, sample_rate=SYNTHESIS_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.error = None
+        self._pcm_chunks = []
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'mp3', '-i', 'pipe:0',
+            '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ac', '1', '-ar', str(sample_rate),
+            'pipe:1'
+        ]
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _read_output(self):
+        """后台读取解码后的PCM数据"""
+        try:
+            while True:
+                chunk = self._process.stdout.read(65536)
+                if not chunk:
+                    break
+                self._pcm_chunks.append(chunk)
+        except Exception as e:
+            self.error = f"读取解码输出失败: {e}"
+
+    def feed(self, data):
+        """写入一块MP3数据"""
+        if self.error:
+            return
+        try:
+            self._process.stdin.write(data)
+        except Exception as e:
+            self.error = f"写入解码器失败: {e}"
+
+    def finish(self, timeout=30):
+        """结束输入并返回解码结果，失败时抛出异常"""
+        try:
+            self._process.stdin.close()
+        except Exception:
+            pass
+        self._reader.join(timeout)
+        try:
+            returncode = self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            raise Exception("MP3解码超时")
+
+        if self.error:
+            raise Exception(self.error)
+        if returncode != 0:
+            raise Exception(f"ffmpeg解码失败，返回码: {returncode}")
+
+        return pcm_bytes_to_array(b''.join(self._pcm_chunks))
+
+    def abort(self):
+        """放弃解码并结束进程"""
+        try:
+            self._process.kill()
+        except Exception:
+            pass
+
+
+def pcm_bytes_to_array(data):
+    """将 s16le 字节数据转换为 int16 数组（忽略末尾不完整的采样）"""
+    usable = len(data) - (len(data) % 2)
+    return np.frombuffer(data[:usable], dtype=np.int16).copy()
+
+
+def decode_mp3_bytes(data, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """一次性在内存中解码MP3数据，返回 int16 单声道数组"""
+    try:
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'mp3', '-i', 'pipe:0',
+            '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ac', '1', '-ar', str(sample_rate),
+            'pipe:1'
+        ]
+        result = subprocess.run(cmd, input=data, capture_output=True)
+        if result.returncode != 0:
+            raise Exception(result.stderr.decode('utf-8', errors='replace'))
+        return pcm_bytes_to_array(result.stdout)
+    except Exception as ffmpeg_error:
+        # 备用方案：使用pydub从内存缓冲区解码
+        from pydub import AudioSegment
+        try:
+            audio = AudioSegment.from_file(io.BytesIO(data), format="mp3")
+        except Exception:
+            raise Exception(f"MP3解码失败: {ffmpeg_error}")
+        return audio_segment_to_pcm(audio, sample_rate)
+
+
+def audio_segment_to_pcm(audio, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """将 AudioSegment 转换为指定采样率的 int16 单声道数组"""
+    audio = audio.set_frame_rate(sample_rate).set_channels(1).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16).copy()
+
+
+def pcm_to_audio_segment(samples, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """将 int16 单声道数组包装为 AudioSegment"""
+    from pydub import AudioSegment
+    samples = np.ascontiguousarray(samples, dtype=np.int16)
+    return AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+
+
+def read_wav_header(path):
+    """
+    解析16位PCM WAV文件头
+
+    Returns:
+        (sample_rate, channels, data_offset, frames)：data_offset 为采样数据在文件中的字节偏移
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"不是WAV文件: {path}")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"WAV文件缺少data块: {path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    if fmt is None:
+        raise ValueError(f"WAV文件缺少fmt块: {path}")
+    format_tag, channels, sample_rate, _, _, bits_per_sample = fmt
+    # 1 为PCM，0xFFFE 为 WAVE_FORMAT_EXTENSIBLE（ffmpeg 输出多声道时使用）
+    if format_tag not in (1, 0xFFFE) or bits_per_sample != 16:
+        raise ValueError(f"仅支持16位PCM WAV: {path}")
+    # 流式写出的WAV可能没有回填 data 块大小，以文件实际大小为准
+    data_size = min(chunk_size, file_size - data_offset)
+    return sample_rate, channels, data_offset, data_size // (2 * channels)
+
+
+def memmap_wav(path):
+    """
+    以内存映射方式打开16位PCM WAV文件
+
+    Returns:
+        (samples, sample_rate)：samples 为 (帧数, 声道数) 的只读 int16 numpy.memmap，
+        切片时只读取对应区间的数据
+    """
+    sample_rate, channels, data_offset, frames = read_wav_header(path)
+    if frames == 0:
+        return np.zeros((0, channels), dtype=np.int16), sample_rate
+    samples = np.memmap(path, dtype='<i2', mode='r', offset=data_offset, shape=(frames, channels))
+    return samples, sample_rate
+
+
+def read_pcm_region(path, start_time, end_time):
+    """读取WAV文件中 [start_time, end_time) 秒区间的 (帧数, 声道数) int16 数组，开销与区间长度成正比"""
+    samples, sample_rate = memmap_wav(path)
+    start = max(0, int(round(start_time * sample_rate)))
+    end = min(len(samples), int(round(end_time * sample_rate)))
+    return np.array(samples[start:max(start, end)]), sample_rate
+
+
+def iter_pcm_chunks(path, chunk_frames, sample_rate=None, channels=None):
+    """
+    分块读取音频文件，逐块产出 (帧数, 声道数) 的 int16 数组
+
+    16位PCM WAV且无需转换时直接切片内存映射；其他格式（或需要转换采样率/声道数）时
+    启动ffmpeg把音频解码为PCM，从管道中按块读取，内存占用与文件长度无关。
+    """
+    try:
+        samples, source_rate = memmap_wav(path)
+    except ValueError:
+        samples, source_rate = None, None
+
+    if samples is not None and sample_rate in (None, source_rate) and channels in (None, samples.shape[1]):
+        for offset in range(0, len(samples), chunk_frames):
+            yield np.array(samples[offset:offset + chunk_frames])
+        return
+
+    if sample_rate is None or channels is None:
+        raise ValueError("读取非16位PCM WAV音频时需要指定 sample_rate 和 channels")
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', path,
+        '-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(sample_rate), '-ac', str(channels),
+        'pipe:1'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    chunk_bytes = chunk_frames * channels * 2
+    completed = False
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % (channels * 2)
+            yield np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, channels)
+        completed = True
+    finally:
+        process.stdout.close()
+        if not completed:
+            # 调用方提前停止读取时结束ffmpeg进程
+            process.kill()
+        process.wait()
+    if process.returncode != 0:
+        raise Exception(f"ffmpeg解码音频失败: {path}")
+
+
+def read_wav_pcm(path):
+    """读取16位PCM WAV文件，返回 (int16数组, 采样率)；多声道数据按声道平均为单声道"""
+    samples, sample_rate = memmap_wav(path)
+    if samples.shape[1] > 1:
+        return samples.mean(axis=1).astype(np.int16), sample_rate
+    return np.array(samples[:, 0]), sample_rate
+
+
+def write_wav_pcm(path, samples, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """将 int16 单声道数组写入WAV文件"""
+    import wave
+    samples = np.ascontiguousarray(samples, dtype=np.int16)
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+
+
+def pcm_duration(samples, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """计算PCM数组时长（秒）"""
+    return len(samples) / float(sample_rate)
+
+
+def resample_pcm(samples, src_rate, dst_rate):
+    """线性插值重采样 int16 单声道数组"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    dst_length = int(round(len(samples) * dst_rate / float(src_rate)))
+    src_positions = np.linspace(0, len(samples) - 1, dst_length)
+    resampled = np.interp(src_positions, np.arange(len(samples)), samples.astype(np.float32))
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+配音混音模块
+把已对齐的合成语音按字幕时间叠加到原视频音频（背景）上。
+整条音轨只分配一次 float32 缓冲区，语音按偏移直接累加，最后统一转换为 int16，
+避免逐条字幕重建整条音轨。
+
+背景压低（ducking）由整条时间轴的增益包络完成：对所有语音区间取并集，
+在区间前后加上起始/释放斜坡，与背景衰减合并后对背景只做一次乘法。
+
+长视频使用流式分块混音（iter_dubbing_chunks）：按固定窗口读取背景WAV，
+每个窗口只混入与之重叠的语音，逐块写出，峰值内存与视频时长无关。
+"""
+
+import wave
+
+import numpy as np
+
+from audio_io import SYNTHESIS_SAMPLE_RATE, audio_segment_to_pcm, memmap_wav
+
+# 原音频作为背景时衰减的分贝数
+BACKGROUND_GAIN_DB = -25.0
+# 合成语音期间背景再压低的分贝数
+DUCKING_GAIN_DB = -8.0
+# 压低背景的起始斜坡（语音开始前）和释放斜坡（语音结束后）时长（毫秒）
+DUCKING_ATTACK_MS = 50
+DUCKING_RELEASE_MS = 200
+# 合成语音首尾渐变的最大时长（毫秒）
+SEGMENT_FADE_MS = 50
+# 流式混音每个窗口的时长（秒）
+MIX_CHUNK_SECONDS = 10
+
+
+def db_to_gain(db):
+    """分贝转换为线性增益"""
+    return float(10 ** (db / 20.0))
+
+
+def audio_segment_to_float(audio):
+    """将 AudioSegment 转换为 (帧数, 声道数) 的 float32 数组，取值范围 [-1, 1]"""
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    samples *= 1.0 / (1 << (8 * audio.sample_width - 1))
+    return samples.reshape(-1, audio.channels)
+
+
+def float_to_int16(mix):
+    """将 float32 混音结果限幅后转换为 int16"""
+    return np.clip(np.round(mix * 32768.0), -32768, 32767).astype(np.int16)
+
+
+def _apply_fade(voice, sample_rate):
+    """为合成语音添加首尾线性渐变，改善与背景的衔接（就地修改）"""
+    duration_ms = len(voice) * 1000 // sample_rate
+    fade_ms = min(SEGMENT_FADE_MS, duration_ms // 20)
+    if fade_ms <= 10:
+        return voice
+    fade_length = fade_ms * sample_rate // 1000
+    ramp = np.linspace(0.0, 1.0, fade_length, dtype=np.float32)
+    voice[:fade_length] *= ramp
+    voice[-fade_length:] *= ramp[::-1]
+    return voice
+
+
+def prepare_voice(samples, sample_rate):
+    """将合成语音（int16 单声道，已是混音采样率）转换为 float32 数组，并添加首尾渐变"""
+    voice = samples.astype(np.float32) * (1.0 / 32768.0)
+    return _apply_fade(voice, sample_rate)
+
+
+def ducking_intervals(voice_spans, total_frames, attack_frames, release_frames):
+    """
+    计算需要压低背景的区间（语音区间的并集）
+
+    voice_spans 为 [(起始帧, 帧数), ...]；相邻区间的间隔不足以完成释放+起始斜坡时合并，
+    避免背景在两句话之间短暂弹起。返回 (区间数, 2) 的 int64 数组，按起始帧排序。
+    """
+    spans = sorted((start, min(start + length, total_frames))
+                   for start, length in voice_spans if length > 0 and start < total_frames)
+    merged = []
+    for start, end in spans:
+        if merged and start - merged[-1][1] < attack_frames + release_frames:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return np.array(merged, dtype=np.int64).reshape(-1, 2)
+
+
+def ducking_envelope(intervals, window_start, window_length, ducking_gain, attack_frames, release_frames):
+    """
+    计算窗口内的背景增益包络
+
+    区间内增益为 ducking_gain，区间开始前 attack_frames 帧内线性下降，
+    结束后 release_frames 帧内线性恢复到1。intervals 需由 ducking_intervals 生成（互不重叠）。
+    """
+    envelope = np.ones(window_length, dtype=np.float32)
+    window_end = window_start + window_length
+    # 只处理（含斜坡）与窗口重叠的区间
+    first = np.searchsorted(intervals[:, 1] + release_frames, window_start, side='right')
+    last = np.searchsorted(intervals[:, 0] - attack_frames, window_end, side='left')
+    for start, end in intervals[first:last]:
+        span_start = max(start - attack_frames, window_start)
+        span_end = min(end + release_frames, window_end)
+        frames = np.arange(span_start, span_end, dtype=np.float64)
+        rise = (frames - (start - attack_frames)) / attack_frames if attack_frames > 0 else frames >= start
+        fall = ((end + release_frames) - frames) / release_frames if release_frames > 0 else frames < end
+        depth = np.clip(np.minimum(rise, fall), 0.0, 1.0)
+        envelope[span_start - window_start:span_end - window_start] = 1.0 - (1.0 - ducking_gain) * depth
+    return envelope
+
+
+def _add_voices(window, window_start, voice_segments):
+    """把与窗口重叠的语音叠加到窗口（就地修改），voice_segments 为 [(起始帧, float32 单声道语音数组), ...]"""
+    window_end = window_start + len(window)
+    for start, voice in voice_segments:
+        overlap_start = max(start, window_start)
+        overlap_end = min(start + len(voice), window_end)
+        if overlap_start >= overlap_end:
+            continue
+        window[overlap_start - window_start:overlap_end - window_start] += \
+            voice[overlap_start - start:overlap_end - start, np.newaxis]
+
+
+def mix_dubbing_track(voice_segments, total_duration, sample_rate, channels=1, background=None,
+                      background_gain_db=BACKGROUND_GAIN_DB, ducking_gain_db=DUCKING_GAIN_DB,
+                      attack_ms=DUCKING_ATTACK_MS, release_ms=DUCKING_RELEASE_MS):
+    """
+    混合背景音与合成语音
+
+    Args:
+        voice_segments: [(开始时间秒, float32 单声道语音数组), ...]，语音需已是 sample_rate 采样率
+        total_duration: 输出总时长（秒）
+        sample_rate: 输出采样率
+        channels: 输出声道数
+        background: (帧数, channels) 的 float32 背景音数组，None 表示静音背景；
+            不足总时长时循环填充，超出时截断
+        attack_ms / release_ms: 压低背景的起始/释放斜坡时长
+
+    Returns:
+        numpy.ndarray: (帧数, channels) 的 float32 混音结果
+    """
+    total_frames = int(round(total_duration * sample_rate))
+    mix = np.zeros((total_frames, channels), dtype=np.float32)
+    # 按起始帧排序后叠加，与 iter_dubbing_chunks 的累加顺序一致（float32 加法与顺序有关）
+    voice_frames = sorted(((int(round(start_time * sample_rate)), voice) for start_time, voice in voice_segments),
+                          key=lambda item: item[0])
+
+    if background is not None and len(background) > 0:
+        for offset in range(0, total_frames, len(background)):
+            count = min(len(background), total_frames - offset)
+            mix[offset:offset + count] = background[:count]
+        attack_frames = attack_ms * sample_rate // 1000
+        release_frames = release_ms * sample_rate // 1000
+        intervals = ducking_intervals([(start, len(voice)) for start, voice in voice_frames],
+                                      total_frames, attack_frames, release_frames)
+        # 按窗口计算包络，限制临时数组的大小
+        chunk_frames = max(1, int(MIX_CHUNK_SECONDS * sample_rate))
+        for window_start in range(0, total_frames, chunk_frames):
+            window = mix[window_start:window_start + chunk_frames]
+            gain = ducking_envelope(intervals, window_start, len(window), db_to_gain(ducking_gain_db),
+                                    attack_frames, release_frames)
+            gain *= db_to_gain(background_gain_db)
+            window *= gain[:, np.newaxis]
+
+    _add_voices(mix, 0, voice_frames)
+    return mix
+
+
+def mix_audio_segments(synthesized_segments, segments, total_duration, background_audio=None,
+                       attack_ms=DUCKING_ATTACK_MS, release_ms=DUCKING_RELEASE_MS):
+    """
+    以 AudioSegment 为输入的混音入口
+
+    Args:
+        synthesized_segments: 与 segments 对应的合成语音 AudioSegment 列表，None 表示跳过
+        segments: [(text, start_time, end_time), ...]
+        background_audio: 原视频音频 AudioSegment，None 表示静音背景
+
+    Returns:
+        (mix, sample_rate)：mix 为 (帧数, 声道数) 的 float32 数组
+    """
+    if background_audio is not None:
+        sample_rate = background_audio.frame_rate
+        background = audio_segment_to_float(background_audio)
+        channels = background.shape[1]
+    else:
+        sample_rate = SYNTHESIS_SAMPLE_RATE
+        background = None
+        channels = 1
+
+    voice_segments = []
+    for (_, start_time, _), synth_segment in zip(segments, synthesized_segments):
+        if synth_segment is None or len(synth_segment) == 0:
+            continue
+        voice = prepare_voice(audio_segment_to_pcm(synth_segment, sample_rate), sample_rate)
+        voice_segments.append((start_time, voice))
+
+    mix = mix_dubbing_track(voice_segments, total_duration, sample_rate, channels, background,
+                            attack_ms=attack_ms, release_ms=release_ms)
+    return mix, sample_rate
+
+
+class WavBackgroundReader:
+    """按窗口读取16位PCM WAV背景音（内存映射），读到末尾时从头循环（与内存混音的循环填充一致）"""
+
+    def __init__(self, path):
+        self._samples, self.sample_rate = memmap_wav(path)
+        self.frames, self.channels = self._samples.shape
+        self._position = 0
+
+    def read(self, frame_count):
+        """读取 frame_count 帧，返回 (frame_count, channels) 的 float32 数组"""
+        window = np.zeros((frame_count, self.channels), dtype=np.float32)
+        if self.frames == 0:
+            return window
+        filled = 0
+        while filled < frame_count:
+            count = min(frame_count - filled, self.frames - self._position)
+            window[filled:filled + count] = self._samples[self._position:self._position + count]
+            filled += count
+            self._position = (self._position + count) % self.frames
+        window *= 1.0 / 32768.0
+        return window
+
+    def close(self):
+        # 释放内存映射，Windows 下映射未关闭时无法删除文件
+        self._samples = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_dubbing_chunks(synthesized_segments, segments, total_duration, sample_rate, channels=1,
+                        background_reader=None, chunk_seconds=MIX_CHUNK_SECONDS,
+                        background_gain_db=BACKGROUND_GAIN_DB, ducking_gain_db=DUCKING_GAIN_DB,
+                        attack_ms=DUCKING_ATTACK_MS, release_ms=DUCKING_RELEASE_MS):
+    """
+    流式分块混音，逐个产出 (帧数, channels) 的 float32 窗口
+
+    合成语音在进入第一个重叠窗口时才转换为混音采样率，离开最后一个重叠窗口后即释放，
+    内存中只保留当前窗口和正在播放的语音。输出与 mix_dubbing_track 逐采样一致：
+    压低区间按重采样后的实际帧数计算（重采样结果可能比按时长换算少一两帧），
+    因此起始斜坡和区间合并可能影响到本窗口的语音（起始帧在窗口结束后 起始+释放斜坡 以内）会提前转换。
+
+    Args:
+        synthesized_segments: 与 segments 对应的合成语音 AudioSegment 列表，None 表示跳过
+        segments: [(text, start_time, end_time), ...]
+        background_reader: WavBackgroundReader，None 表示静音背景
+    """
+    total_frames = int(round(total_duration * sample_rate))
+    chunk_frames = max(1, int(chunk_seconds * sample_rate))
+    background_gain = db_to_gain(background_gain_db)
+    ducking_gain = db_to_gain(ducking_gain_db)
+    attack_frames = attack_ms * sample_rate // 1000
+    release_frames = release_ms * sample_rate // 1000
+
+    lookahead_frames = attack_frames + release_frames
+
+    # 按开始时间依次激活语音
+    pending = sorted(((int(round(start_time * sample_rate)), synth_segment)
+                      for (_, start_time, _), synth_segment in zip(segments, synthesized_segments)
+                      if synth_segment is not None and len(synth_segment) > 0),
+                     key=lambda item: item[0])
+    next_index = 0
+    active = []
+    # 已激活语音的 (起始帧, 帧数)，结束得足够早、不再影响后续窗口包络的会被丢弃
+    voice_spans = []
+
+    for window_start in range(0, total_frames, chunk_frames):
+        window_length = min(chunk_frames, total_frames - window_start)
+        window_end = window_start + window_length
+
+        while next_index < len(pending) and pending[next_index][0] < window_end + lookahead_frames:
+            start, synth_segment = pending[next_index]
+            voice = prepare_voice(audio_segment_to_pcm(synth_segment, sample_rate), sample_rate)
+            active.append((start, voice))
+            voice_spans.append((start, len(voice)))
+            next_index += 1
+
+        if background_reader is not None:
+            voice_spans = [(start, length) for start, length in voice_spans
+                           if start + length >= window_start - lookahead_frames]
+            intervals = ducking_intervals(voice_spans, total_frames, attack_frames, release_frames)
+            window = background_reader.read(window_length)
+            gain = ducking_envelope(intervals, window_start, window_length, ducking_gain,
+                                    attack_frames, release_frames)
+            gain *= background_gain
+            window *= gain[:, np.newaxis]
+        else:
+            window = np.zeros((window_length, channels), dtype=np.float32)
+
+        _add_voices(window, window_start, active)
+        active = [(start, voice) for start, voice in active if start + len(voice) > window_end]
+        yield window
+
+
+def write_wav_chunks(path, chunks, sample_rate, channels):
+    """把混音窗口逐块写入16位WAV文件，返回写入的帧数"""
+    frames_written = 0
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        for chunk in chunks:
+            wf.writeframes(float_to_int16(chunk).tobytes())
+            frames_written += len(chunk)
+    return frames_written
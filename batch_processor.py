@@ -11,6 +11,7 @@
 
 import os
 import sys
+import multiprocessing
 import json
 import threading
 import re
@@ -27,6 +28,8 @@ import voice_get_text
 # 移除冗余模块，统一使用 unified_speech_synthesis
 import unified_speech_synthesis
 import generateWav
+from media_probe import get_media_probe
+from render_planner import NO_SUBTITLE_MODE, cleanup_subtitles, conversion_languages, prepare_subtitles
 
 # 导入配置管理器
 
@@ -164,6 +167,15 @@ class BatchProcessThread(QThread):
             total_files = len(self.file_list)
             completed_files = 0
             
+            # 批量探测所有文件的媒体信息，后续处理步骤直接命中探测缓存
+            media_infos = get_media_probe().probe_many(self.file_list)
+            total_media_duration = sum(info['duration'] for info in media_infos.values() if info)
+            print(f"📊 已探测 {len(media_infos)} 个文件，总时长 {total_media_duration / 60:.1f} 分钟")
+            no_audio_files = [os.path.basename(path) for path, info in media_infos.items()
+                              if info and not info['has_audio']]
+            if no_audio_files:
+                print(f"⚠️ 以下文件没有音频轨道: {', '.join(no_audio_files)}")
+            
             if self.concurrent_count == 1:
                 # 单线程处理
                 for i, video_file in enumerate(self.file_list):
@@ -298,9 +310,13 @@ class BatchProcessThread(QThread):
             clean_name = re.sub(r'[^\w\-_]', '_', base_name)
             audio_filename = f'{clean_name}_extractedAudio.wav'
             
-            wav_path = generateWav.run(video_file, file_output_dir, audio_filename)
+            # 一次解码同时生成识别用的16kHz音轨和全采样率背景音轨
+            wav_path = generateWav.run(video_file, file_output_dir, audio_filename, with_background=True)
             if not wav_path or not os.path.exists(wav_path):
                 return False, "音频提取失败 - 请检查视频文件是否包含音频轨道"
+            background_audio_path = generateWav.background_track_path(wav_path)
+            if not os.path.exists(background_audio_path):
+                background_audio_path = wav_path
             
             # 2. 语音识别
             self.step_progress.emit("步骤 2/3", f"正在识别语音，需要较长时间...")
@@ -310,6 +326,7 @@ class BatchProcessThread(QThread):
             subtitle_file = video_to_txt.run(wav_path, file_output_dir, subtitle_filename)
             
             if not subtitle_file or not os.path.exists(subtitle_file):
+                generateWav.remove_background_track(wav_path)
                 return False, "语音识别失败 - 请检查API配置或音频质量"
             
             # 读取并发送原始字幕
@@ -387,6 +404,55 @@ class BatchProcessThread(QThread):
             print(f"   最终视频: {final_video_path}")
             print(f"   所有路径存在性检查: 音频={os.path.exists(wav_path)}, 字幕={os.path.exists(subtitle_file)}")
             
+            # 准备字幕：与音频替换在同一次 ffmpeg 调用中嵌入到原视频
+            subtitle_mode = voice_params.get('subtitle_mode', NO_SUBTITLE_MODE)
+            generate_bilingual = voice_params.get('generate_bilingual', False)
+            use_bilingual = generate_bilingual and actual_conversion_type in ["中文转英文", "英文转中文"]
+            subtitle_to_embed = None
+            render_subtitles = None
+            
+            if subtitle_mode != NO_SUBTITLE_MODE:
+                try:
+                    # 检查是否需要双语字幕
+                    if use_bilingual:
+                        self.step_progress.emit("步骤 3/3", "正在生成双语字幕...")
+                        
+                        # 创建双语字幕文件
+                        subtitle_to_embed = self._create_bilingual_subtitle(
+                            subtitle_file, 
+                            subtitle_content, 
+                            actual_conversion_type,
+                            file_output_dir,
+                            clean_name
+                        )
+                        if not subtitle_to_embed:
+                            print(f"❌ 双语字幕创建失败")
+                    else:
+                        # 单语字幕：优先使用转换后字幕
+                        subtitle_to_embed = subtitle_file
+                        if actual_conversion_type in ["中文转英文", "英文转中文"]:
+                            # 尝试找到转换后字幕
+                            possible_translated_files = [
+                                os.path.join(file_output_dir, f"{clean_name}_translated.srt"),
+                                os.path.join(os.path.dirname(subtitle_file), f"{os.path.splitext(os.path.basename(subtitle_file))[0]}_translated.srt")
+                            ]
+                            
+                            for translated_file in possible_translated_files:
+                                if os.path.exists(translated_file):
+                                    subtitle_to_embed = translated_file
+                                    break
+                    
+                    if subtitle_to_embed:
+                        subtitle_language = conversion_languages(actual_conversion_type)[
+                            0 if subtitle_to_embed == subtitle_file else 1]
+                        render_subtitles = prepare_subtitles([(subtitle_to_embed, subtitle_language)], subtitle_mode,
+                                                             voice_params.get('subtitle_style'))
+                except Exception as e:
+                    print(f"准备字幕时发生错误: {str(e)}")
+                    self.step_progress.emit("警告", f"字幕准备失败: {str(e)}")
+            else:
+                print("用户选择不嵌入字幕，跳过字幕嵌入步骤")
+            
             # 使用统一语音合成模块
             generated_video_path = None
             try:
@@ -401,7 +467,7 @@ class BatchProcessThread(QThread):
                 print(f"   video_file: {video_file}")
                 print(f"   subtitle_file: {subtitle_file}")
                 print(f"   output_path: {final_video_path}")
-                print(f"   existing_audio_path: {wav_path}")
+                print(f"   existing_audio_path: {background_audio_path}")
                 
                 generated_video_path = synthesis.process_video(
                     video_file=video_file,
@@ -412,7 +478,8 @@ class BatchProcessThread(QThread):
                     speed=speed,
                     volume=volume,
                     progress_callback=progress_callback,
-                    existing_audio_path=wav_path  # 传递已提取的音频路径，避免重复提取
+                    existing_audio_path=background_audio_path,  # 传递已提取的背景音轨，避免重复提取
+                    subtitles=render_subtitles  # 字幕与音频替换一次完成
                 )
                 
                 # 如果需要翻译，尝试获取转换后字幕
@@ -467,123 +534,40 @@ class BatchProcessThread(QThread):
                         print(f"生成转换后字幕也失败: {translate_error}")
                 
                 return False, error_msg
-            
-            # 4. 字幕嵌入处理
-            if generated_video_path and os.path.exists(generated_video_path):
+            finally:
+                cleanup_subtitles(render_subtitles)
+                # 背景音轨只在合成阶段使用
+                generateWav.remove_background_track(wav_path)
+            
+            # 4. 单次渲染未能嵌入字幕时，回退为单独的字幕嵌入
+            if render_subtitles and render_subtitles['rendered']:
+                print(f"✅ 音频替换与字幕嵌入已一次完成: {generated_video_path}")
+            elif subtitle_to_embed and generated_video_path and os.path.exists(generated_video_path):
                 self.step_progress.emit("步骤 4/6", "正在嵌入字幕到视频...")
-                
-                # 检查是否需要嵌入字幕
-                subtitle_mode = voice_params.get('subtitle_mode', '不嵌入字幕')
-                generate_bilingual = voice_params.get('generate_bilingual', False)
-                
-                if subtitle_mode != '不嵌入字幕':
-                    try:
-                        import addSrt
-                        
-                        # 准备字幕文件路径
-                        original_subtitle = subtitle_file
-                        final_output_path = generated_video_path
-                        
-                        # 检查是否需要双语字幕
-                        if generate_bilingual and actual_conversion_type in ["中文转英文", "英文转中文"]:
-                            self.step_progress.emit("步骤 5/6", "正在生成双语字幕...")
-                            
-                            # 创建双语字幕文件
-                            bilingual_subtitle_path = self._create_bilingual_subtitle(
-                                original_subtitle, 
-                                subtitle_content, 
-                                actual_conversion_type,
-                                file_output_dir,
-                                clean_name
-                            )
-                            
-                            if bilingual_subtitle_path:
-                                # 使用双语字幕嵌入
-                                subtitled_video_path = os.path.join(
-                                    file_output_dir, 
-                                    f"{clean_name}_{conversion_suffix}_with_bilingual_subtitles{original_ext}"
-                                )
-                                
-                                if subtitle_mode == "硬字幕（烧录到视频）":
-                                    success = addSrt.run(
-                                        generated_video_path, 
-                                        bilingual_subtitle_path, 
-                                        subtitled_video_path, 
-                                        hard_subtitle=True,
-                                        style_options=voice_params.get('subtitle_style')
-                                    )
-                                else:
-                                    success = addSrt.run(
-                                        generated_video_path, 
-                                        bilingual_subtitle_path, 
-                                        subtitled_video_path, 
-                                        hard_subtitle=False,
-                                        style_options=voice_params.get('subtitle_style')
-                                    )
-                                
-                                if success and os.path.exists(subtitled_video_path):
-                                    final_output_path = subtitled_video_path
-                                    print(f"✅ 双语字幕嵌入成功: {subtitled_video_path}")
-                                else:
-                                    print(f"❌ 双语字幕嵌入失败，使用原视频")
-                            else:
-                                print(f"❌ 双语字幕创建失败")
-                        
-                        else:
-                            # 单语字幕嵌入
-                            self.step_progress.emit("步骤 5/6", "正在嵌入单语字幕...")
-                            
-                            # 选择要嵌入的字幕（优先使用转换后字幕）
-                            subtitle_to_embed = original_subtitle
-                            if actual_conversion_type in ["中文转英文", "英文转中文"]:
-                                # 尝试找到转换后字幕
-                                possible_translated_files = [
-                                    os.path.join(file_output_dir, f"{clean_name}_translated.srt"),
-                                    os.path.join(os.path.dirname(subtitle_file), f"{os.path.splitext(os.path.basename(subtitle_file))[0]}_translated.srt")
-                                ]
-                                
-                                for translated_file in possible_translated_files:
-                                    if os.path.exists(translated_file):
-                                        subtitle_to_embed = translated_file
-                                        break
-                            
-                            subtitled_video_path = os.path.join(
-                                file_output_dir, 
-                                f"{clean_name}_{conversion_suffix}_with_subtitles{original_ext}"
-                            )
-                            
-                            if subtitle_mode == "硬字幕（烧录到视频）":
-                                success = addSrt.run(
-                                    generated_video_path, 
-                                    subtitle_to_embed, 
-                                    subtitled_video_path, 
-                                    hard_subtitle=True,
-                                    style_options=voice_params.get('subtitle_style')
-                                )
-                            else:
-                                success = addSrt.run(
-                                    generated_video_path, 
-                                    subtitle_to_embed, 
-                                    subtitled_video_path, 
-                                    hard_subtitle=False,
-                                    style_options=voice_params.get('subtitle_style')
-                                )
-                            
-                            if success and os.path.exists(subtitled_video_path):
-                                final_output_path = subtitled_video_path
-                                print(f"✅ 字幕嵌入成功: {subtitled_video_path}")
-                            else:
-                                print(f"❌ 字幕嵌入失败，使用原视频")
-                        
-                        # 更新最终输出路径
-                        generated_video_path = final_output_path
-                        
-                    except Exception as e:
-                        print(f"字幕嵌入过程中发生错误: {str(e)}")
-                        self.step_progress.emit("警告", f"字幕嵌入失败: {str(e)}")
-                
-                else:
-                    print("用户选择不嵌入字幕，跳过字幕嵌入步骤")
+                try:
+                    subtitle_suffix = "with_bilingual_subtitles" if use_bilingual else "with_subtitles"
+                    subtitled_video_path = os.path.join(
+                        file_output_dir, 
+                        f"{clean_name}_{conversion_suffix}_{subtitle_suffix}{original_ext}"
+                    )
+                    
+                    success = addSrt.run(
+                        generated_video_path, 
+                        subtitle_to_embed, 
+                        subtitled_video_path, 
+                        hard_subtitle=subtitle_mode == "硬字幕（烧录到视频）",
+                        style_options=voice_params.get('subtitle_style')
+                    )
+                    
+                    if success and os.path.exists(subtitled_video_path):
+                        generated_video_path = subtitled_video_path
+                        print(f"✅ 字幕嵌入成功: {subtitled_video_path}")
+                    else:
+                        print(f"❌ 字幕嵌入失败，使用原视频")
+                    
+                except Exception as e:
+                    print(f"字幕嵌入过程中发生错误: {str(e)}")
+                    self.step_progress.emit("警告", f"字幕嵌入失败: {str(e)}")
             
             # 验证输出文件
             final_output = generated_video_path if generated_video_path and os.path.exists(generated_video_path) else final_video_path
@@ -2712,6 +2696,7 @@ def show_batch_dialog(parent=None):
     dialog.exec_()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     dialog = BatchProcessDialog()
     dialog.show()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+合成缓存预热模块
+批量读取SRT字幕，把其中每条不重复的字幕提前合成到音频缓存中，
+之后正式处理视频时合成阶段基本全部命中缓存。
+
+用法:
+    python cache_prewarm.py 字幕目录或文件 [...] --conversion 英文转英文 --voice x4_EnUs_Laura_education \
+        --media 视频目录或文件 [...]
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from media_probe import VIDEO_EXTENSIONS, collect_media_files, get_media_probe
+from timeline_planner import compute_slots
+from unified_speech_synthesis import UnifiedSpeechSynthesis
+
+CONVERSION_TYPES = ("中文转中文", "中文转英文", "英文转中文", "英文转英文")
+QUALITY_LEVELS = ("标准质量", "高质量", "超清质量")
+
+
+def collect_subtitle_files(paths):
+    """展开文件和目录参数，返回去重后的SRT文件列表（目录递归查找）"""
+    subtitle_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(".srt"):
+                        subtitle_files.append(os.path.join(root, filename))
+        elif os.path.isfile(path):
+            subtitle_files.append(path)
+        else:
+            print(f"⚠️ 字幕路径不存在，已跳过: {path}")
+
+    seen = set()
+    unique_files = []
+    for subtitle_file in subtitle_files:
+        key = os.path.abspath(subtitle_file)
+        if key not in seen:
+            seen.add(key)
+            unique_files.append(subtitle_file)
+    return unique_files
+
+
+def _media_stem(path):
+    """与处理流程生成字幕文件名时相同的清洗规则"""
+    return re.sub(r'[^\w\-_]', '_', os.path.splitext(os.path.basename(path))[0])
+
+
+def find_media_file(subtitle_file, media_files=()):
+    """
+    查找字幕对应的视频：文件名相同，或字幕名为 <视频名>_xxx.srt（如识别生成的 <视频名>_subtitle.srt）
+
+    在 media_files 和字幕所在目录中查找，找不到时返回None
+    """
+    subtitle_dir = os.path.dirname(os.path.abspath(subtitle_file))
+    candidates = list(media_files)
+    try:
+        candidates += [os.path.join(subtitle_dir, filename) for filename in sorted(os.listdir(subtitle_dir))
+                       if filename.lower().endswith(VIDEO_EXTENSIONS)]
+    except OSError:
+        pass
+
+    subtitle_stem = _media_stem(subtitle_file)
+    best_match = None
+    for media_file in candidates:
+        media_stem = _media_stem(media_file)
+        if media_stem == subtitle_stem:
+            return media_file
+        if subtitle_stem.startswith(media_stem + "_") and (
+                best_match is None or len(media_stem) > len(_media_stem(best_match))):
+            best_match = media_file
+    return best_match
+
+
+def prewarm_cache(subtitle_paths, conversion_type="英文转英文", voice_type=None, speed=50, volume=50,
+                  quality="高质量", max_rate=None, max_workers=None, progress_callback=None, synthesis=None,
+                  media_paths=None):
+    """
+    将字幕中的所有不重复文本预先合成到缓存
+
+    请求速率由进程内共享的自适应限流器控制，会逐步提高到接口允许的最大速率。
+    每条字幕的语速与正式处理一样由语速模型根据可用时长选择，保证缓存键一致；
+    最后一条字幕的可用时长取决于视频总时长，因此需要找到字幕对应的视频（见 find_media_file）。
+
+    Args:
+        subtitle_paths: SRT文件或目录列表
+        conversion_type: 转换类型，需要翻译时先翻译再合成，与正式处理的缓存键一致
+        max_rate: 限流器每秒请求数上限，None 表示使用默认值；只在本次预热期间生效
+        max_workers: 合成线程数，默认为 UnifiedSpeechSynthesis.MAX_SYNTHESIS_WORKERS
+        progress_callback: 进度回调 (progress, message)，progress 范围 0-100
+        synthesis: 复用已有的 UnifiedSpeechSynthesis 实例
+        media_paths: 视频文件或目录列表，用于确定每个字幕文件对应视频的总时长
+
+    Returns:
+        dict: 预热统计
+    """
+    synthesis = synthesis or UnifiedSpeechSynthesis()
+    if not synthesis.enable_cache or synthesis.audio_cache is None:
+        raise Exception("❌ 音频缓存不可用，无法预热")
+    rate_limiter = synthesis.rate_limiter
+    original_max_rate = rate_limiter.max_rate
+    if max_rate is not None:
+        rate_limiter.set_max_rate(max_rate)
+    try:
+        with synthesis.speech_rate_job():
+            return _prewarm(synthesis, subtitle_paths, conversion_type, voice_type, speed, volume, quality,
+                            max_workers, progress_callback, media_paths)
+    finally:
+        # 限流器为进程内共享，预热结束后恢复原上限，不影响之后的正式合成
+        if max_rate is not None:
+            rate_limiter.set_max_rate(original_max_rate)
+
+
+def _prewarm(synthesis, subtitle_paths, conversion_type, voice_type, speed, volume, quality,
+             max_workers, progress_callback, media_paths):
+    """prewarm_cache 的主体"""
+    source_lang, target_lang, default_voice = synthesis._resolve_conversion(conversion_type)
+    voice_type = voice_type or default_voice
+    max_workers = max_workers or synthesis.MAX_SYNTHESIS_WORKERS
+
+    subtitle_files = collect_subtitle_files(subtitle_paths)
+    media_files = collect_media_files(media_paths or [])
+    media_probe = get_media_probe()
+    print(f"📂 共找到 {len(subtitle_files)} 个字幕文件")
+
+    # 读取全部字幕，记录每条字幕的文本和可用时长
+    cues = []
+    for subtitle_file in subtitle_files:
+        try:
+            segments = synthesis.parse_subtitle_file(subtitle_file)
+        except Exception as e:
+            print(f"⚠️ 解析字幕失败，已跳过 {subtitle_file}: {e}")
+            continue
+        # 与 process_video 一样用视频总时长计算最后一条字幕的可用时长
+        media_file = find_media_file(subtitle_file, media_files)
+        total_duration = media_probe.get_duration(media_file) if media_file else None
+        if total_duration is None:
+            print(f"⚠️ 未找到 {os.path.basename(subtitle_file)} 对应的视频时长，最后一条字幕可能无法命中预热缓存")
+        cues.extend(zip((text for text, _, _ in segments), compute_slots(segments, total_duration)))
+    total_cues = len(cues)
+
+    # 需要翻译时以译文去重，并与正式处理时的缓存键保持一致
+    if source_lang:
+        source_texts = list(dict.fromkeys(text for text, _ in cues))
+        print(f"🌐 正在翻译 {len(source_texts)} 条字幕...")
+        with ThreadPoolExecutor(max_workers=synthesis.TRANSLATE_WORKERS) as executor:
+            translations = dict(zip(source_texts, executor.map(
+                lambda text: synthesis.translate_text(text, source_lang, target_lang), source_texts)))
+        cues = [(translations[text], slot) for text, slot in cues]
+
+    # 与正式处理一样按语速模型为每条字幕选择语速，按 (文本, 语速) 去重
+    unique_requests = list(dict.fromkeys(
+        (text, synthesis.choose_speed(text, voice_type, speed, slot)) for text, slot in cues if text.strip()
+    ))
+    pending_requests = [(text, segment_speed) for text, segment_speed in unique_requests
+                        if not synthesis.is_cached(text, voice_type, segment_speed, volume, quality)]
+    already_cached = len(unique_requests) - len(pending_requests)
+    dedupe_ratio = 1 - len(unique_requests) / total_cues if total_cues else 0.0
+
+    print(f"📊 字幕总数: {total_cues}，不重复请求: {len(unique_requests)}（去重率 {dedupe_ratio*100:.1f}%），"
+          f"已缓存: {already_cached}，待合成: {len(pending_requests)}")
+
+    stats = {
+        "subtitle_files": len(subtitle_files),
+        "total_cues": total_cues,
+        "unique_requests": len(unique_requests),
+        "dedupe_ratio": dedupe_ratio,
+        "already_cached": already_cached,
+        "synthesized": 0,
+        "failed": 0,
+        "elapsed_seconds": 0.0
+    }
+    if not pending_requests:
+        if progress_callback:
+            progress_callback(100, "所有字幕均已缓存")
+        return stats
+
+    start_time = time.perf_counter()
+    progress_lock = threading.Lock()
+    completed = [0]
+
+    def synthesize_one(text, segment_speed):
+        return synthesis.synthesize_pcm(text, voice_type, segment_speed, volume, quality) is not None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(synthesize_one, text, segment_speed): text
+                   for text, segment_speed in pending_requests}
+        for future in as_completed(futures):
+            try:
+                success = future.result()
+            except Exception as e:
+                print(f"⚠️ 预热失败: {futures[future][:50]}... {e}")
+                success = False
+
+            with progress_lock:
+                stats["synthesized" if success else "failed"] += 1
+                completed[0] += 1
+                count = completed[0]
+
+            elapsed = time.perf_counter() - start_time
+            message = (f"已预热 {count}/{len(pending_requests)}，速率 {count / elapsed:.2f} 条/秒，"
+                       f"限流 {synthesis.rate_limiter.current_rate:.2f}/s")
+            if progress_callback:
+                progress_callback(int(count / len(pending_requests) * 100), message)
+            elif count % 10 == 0 or count == len(pending_requests):
+                print(f"🔥 {message}")
+
+    stats["elapsed_seconds"] = time.perf_counter() - start_time
+    print(f"✅ 缓存预热完成：新合成 {stats['synthesized']} 条，失败 {stats['failed']} 条，"
+          f"耗时 {stats['elapsed_seconds']:.1f} 秒")
+    synthesis._report_cache_stats()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量预热语音合成缓存")
+    parser.add_argument("paths", nargs="+", help="SRT字幕文件或目录（递归查找 .srt）")
+    parser.add_argument("--conversion", default="英文转英文", choices=CONVERSION_TYPES, help="转换类型")
+    parser.add_argument("--voice", default=None, help="发音人，默认按转换类型选择")
+    parser.add_argument("--speed", type=int, default=50, help="语速 (0-100)")
+    parser.add_argument("--volume", type=int, default=50, help="音量 (0-100)")
+    parser.add_argument("--quality", default="高质量", choices=QUALITY_LEVELS, help="音质")
+    parser.add_argument("--max-rate", type=float, default=None, help="每秒请求数上限")
+    parser.add_argument("--workers", type=int, default=None, help="合成线程数")
+    parser.add_argument("--media", nargs="*", default=None,
+                        help="字幕对应的视频文件或目录（按文件名匹配），默认在字幕所在目录查找")
+    args = parser.parse_args(argv)
+
+    stats = prewarm_cache(args.paths, args.conversion, args.voice, args.speed, args.volume,
+                          args.quality, args.max_rate, args.workers, media_paths=args.media)
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -11,6 +11,7 @@
 """
 
 import sys
+import multiprocessing
 import os
 import json
 import time
@@ -37,11 +38,12 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 
 # 导入原有功能模块
-import addNewSound
 import video_to_txt
 import unified_speech_synthesis
 import generateWav
 import batch_processor
+from media_probe import INTERACTIVE_PROBE_TIMEOUT, get_media_probe
+from render_planner import NO_SUBTITLE_MODE, cleanup_subtitles, plan_subtitles
 import app_icon
 
 # --- 统一路径管理器 ---
@@ -77,10 +79,6 @@ class SubtitlePathManager:
         """获取提取的音频文件路径"""
         return os.path.normpath(os.path.join(self.base_path, f'{self.file_prefix}_extractedAudio.wav')).replace('\\', '/')
     
-    def get_video_without_audio_path(self):
-        """获取无声视频文件路径"""
-        return os.path.normpath(os.path.join(self.base_path, f'{self.file_prefix}_videoWithoutAudio.mp4')).replace('\\', '/')
-    
     def get_output_video_path(self, base_name, conversion_suffix):
         """获取输出视频文件路径"""
         name, ext = os.path.splitext(base_name)
@@ -95,6 +93,12 @@ class SubtitlePathManager:
         self.temp_files.append(temp_path)
         return temp_path
     
+    def track_temp_file(self, file_path):
+        """登记一个已生成的临时文件，由 cleanup_temp_files 统一清理"""
+        if file_path and file_path not in self.temp_files:
+            self.temp_files.append(file_path)
+        return file_path
+    
     def get_extracted_audio_filename(self):
         """获取提取音频的文件名"""
         return f'{self.file_prefix}_extractedAudio.wav'
@@ -103,10 +107,6 @@ class SubtitlePathManager:
         """获取原始字幕的文件名"""
         return f'{self.file_prefix}_subtitle.srt'
     
-    def get_silent_video_filename(self):
-        """获取无声视频的文件名"""
-        return f'{self.file_prefix}_videoWithoutAudio.mp4'
-    
     def ensure_directory_exists(self):
         """确保基础目录存在"""
         try:
@@ -488,83 +488,35 @@ class VideoPreviewDialog(QDialog):
             self.file_name_label.setText(file_name)
             self.size_label.setText(f"{size_mb:.1f} MB")
             
-            # 方法1：尝试使用FFprobe（更可靠）
-            try:
-                import subprocess
-                import json
-                
-                cmd = [
-                    'ffprobe', '-v', 'quiet', '-print_format', 'json', 
-                    '-show_format', '-show_streams', self.video_path
-                ]
+            # 使用共享的媒体探测缓存（同一文件只运行一次ffprobe），在界面线程中使用较短的超时
+            media_info = get_media_probe().probe(self.video_path, timeout=INTERACTIVE_PROBE_TIMEOUT)
+            if media_info and media_info['has_video']:
+                duration = media_info['duration']
+                fps = media_info['fps']
                 
-                # 修复编码问题：使用bytes模式并处理编码
-                result = subprocess.run(
-                    cmd, 
-                    capture_output=True, 
-                    text=False,  # 使用bytes模式
-                    timeout=10,
-                    creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
-                )
+                minutes = int(duration // 60)
+                seconds = int(duration % 60)
+                self.duration_label.setText(f"{minutes}:{seconds:02d}")
+                self.resolution_label.setText(f"{media_info['width']}x{media_info['height']}")
+                self.fps_label.setText(f"{fps:.1f} FPS" if fps > 0 else "未知")
                 
-                if result.returncode == 0 and result.stdout:
-                    # 处理编码问题
-                    try:
-                        stdout_text = result.stdout.decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            stdout_text = result.stdout.decode('gbk')
-                        except UnicodeDecodeError:
-                            stdout_text = result.stdout.decode('utf-8', errors='ignore')
-                    
-                    data = json.loads(stdout_text)
+                # 音频信息
+                if media_info['has_audio']:
+                    sample_rate = media_info['sample_rate']
+                    channels = media_info['channels']
+                    codec_name = media_info['audio_codec'] or '未知'
                     
-                    # 查找视频流
-                    video_stream = None
-                    audio_stream = None
-                    
-                    for stream in data.get('streams', []):
-                        if stream.get('codec_type') == 'video' and video_stream is None:
-                            video_stream = stream
-                        elif stream.get('codec_type') == 'audio' and audio_stream is None:
-                            audio_stream = stream
-                    
-                    if video_stream:
-                        # 视频信息
-                        duration = float(data.get('format', {}).get('duration', 0))
-                        fps = video_stream.get('r_frame_rate', '0/1')
-                        if '/' in fps:
-                            num, den = fps.split('/')
-                            fps = float(num) / float(den) if float(den) != 0 else 0
-                        
-                        width = video_stream.get('width', 0)
-                        height = video_stream.get('height', 0)
-                        
-                        minutes = int(duration // 60)
-                        seconds = int(duration % 60)
-                        self.duration_label.setText(f"{minutes}:{seconds:02d}")
-                        self.resolution_label.setText(f"{width}x{height}")
-                        self.fps_label.setText(f"{fps:.1f} FPS" if fps > 0 else "未知")
-                        
-                        # 音频信息
-                        if audio_stream:
-                            sample_rate = audio_stream.get('sample_rate', '未知')
-                            channels = audio_stream.get('channels', '未知')
-                            codec_name = audio_stream.get('codec_name', '未知')
-                            
-                            self.sample_rate_label.setText(f"{sample_rate} Hz" if sample_rate != '未知' else sample_rate)
-                            self.channels_label.setText(f"{channels} 声道" if channels != '未知' else channels)
-                            self.audio_codec_label.setText(codec_name.upper())
-                        else:
-                            self.sample_rate_label.setText("无音频轨道")
-                            self.channels_label.setText("无音频轨道")
-                            self.audio_codec_label.setText("无音频轨道")
-                        
-                        video_info_success = True
-                        print("✅ 使用FFprobe成功获取视频信息")
-                        
-            except Exception as ffprobe_error:
-                print(f"⚠️ FFprobe获取视频信息失败: {ffprobe_error}")
+                    self.sample_rate_label.setText(f"{sample_rate} Hz" if sample_rate else '未知')
+                    self.channels_label.setText(f"{channels} 声道" if channels else '未知')
+                    self.audio_codec_label.setText(codec_name.upper())
+                else:
+                    self.sample_rate_label.setText("无音频轨道")
+                    self.channels_label.setText("无音频轨道")
+                    self.audio_codec_label.setText("无音频轨道")
+                
+                print("✅ 使用FFprobe成功获取视频信息")
+            else:
+                print("⚠️ FFprobe获取视频信息失败")
                 
             # 获取父窗口的转换设置
             if hasattr(self.parent(), 'conversion_combo'):
@@ -1437,11 +1389,19 @@ class ProcessThread(QThread):
             
             # 使用路径管理器获取音频文件路径 - 传递自定义文件名
             expected_audio_path = self.path_manager.get_audio_path()
+            # 一次解码同时生成识别用的16kHz音轨和全采样率背景音轨
             wav_path = generateWav.run(
                 self.video_path, 
                 self.save_path,
-                self.path_manager.get_extracted_audio_filename()
+                self.path_manager.get_extracted_audio_filename(),
+                with_background=True
             )
+            background_audio_path = generateWav.background_track_path(wav_path)
+            if os.path.exists(background_audio_path):
+                # 全采样率背景音轨只在合成阶段使用，处理结束后删除
+                self.path_manager.track_temp_file(background_audio_path)
+            else:
+                background_audio_path = wav_path
             
             # 验证音频文件是否成功生成
             audio_info = self.path_manager.get_file_info(wav_path)
@@ -1450,25 +1410,7 @@ class ProcessThread(QThread):
             
             print(f"音频文件已生成: {wav_path} ({audio_info['size_mb']:.2f}MB)")
             
-            # --- 步骤 2: 生成无声视频 ---
-            if not self._check_pause_state(): return
-            self.progress.emit(20, "正在生成无声视频...")
-            
-            expected_video_path = self.path_manager.get_video_without_audio_path()
-            video_without_sound = addNewSound.del_audio(
-                self.video_path, 
-                self.save_path,
-                self.path_manager.get_silent_video_filename()
-            )
-            
-            # 验证无声视频文件
-            video_info = self.path_manager.get_file_info(video_without_sound)
-            if not video_info['exists']:
-                raise FileNotFoundError(f"无声视频生成失败: {video_without_sound}")
-            
-            print(f"无声视频已生成: {video_without_sound} ({video_info['size_mb']:.2f}MB)")
-            
-            # --- 步骤 3: 语音识别 ---
+            # --- 步骤 2: 语音识别 ---
             if not self._check_pause_state(): return
             self.progress.emit(40, "正在识别语音...")
             video_to_txt.run(
@@ -1509,7 +1451,7 @@ class ProcessThread(QThread):
                     self.voice_params['voice_type'] = voice_type
                     print(f"🧠 智能转换：检测到 {detected_lang} -> {actual_conversion_type}，选择发音人：{voice_type}")
             
-            # --- 步骤 4: 合成新语音 ---
+            # --- 步骤 3: 合成新语音 ---
             if not self._is_running: return
             self.progress.emit(60, f"正在进行{actual_conversion_type}...")
             
@@ -1548,14 +1490,7 @@ class ProcessThread(QThread):
                 if self._is_running:
                     self.progress.emit(progress, message)
             
-            generated_video_path = synthesis.process_video(
-                video_without_sound, subtitle_file, final_video_path,
-                conversion_type=actual_conversion_type, voice_type=voice_type, 
-                speed=speed, volume=volume, progress_callback=progress_callback,
-                existing_audio_path=wav_path, quality=quality  # 传递质量参数
-            )
-            
-            # 创建转换后字幕
+            # 创建转换后字幕（最终渲染时与音频一起嵌入，需在合成前准备好）
             if actual_conversion_type in ["中文转英文", "英文转中文"]:
                 converted_subtitle_file = self.createTranslatedSubtitle(
                     subtitle_file, 
@@ -1565,14 +1500,6 @@ class ProcessThread(QThread):
             else:
                 converted_subtitle_file = subtitle_file
             
-            # 确定最终视频路径
-            if generated_video_path and os.path.exists(generated_video_path):
-                final_video_path = generated_video_path
-            
-            # 步骤5: 处理字幕
-            if not self._is_running: return
-            self.progress.emit(80, "处理字幕...")
-            
             # 读取并发送转换后字幕
             if converted_subtitle_file and os.path.exists(converted_subtitle_file):
                 converted_text, _ = self.file_helper.read_subtitle_file(converted_subtitle_file)
@@ -1581,13 +1508,34 @@ class ProcessThread(QThread):
                 self.subtitle_ready.emit(original_text, "converted")
                 converted_subtitle_file = subtitle_file
             
-            # 步骤6: 嵌入字幕
-            if not self._is_running: return
-            self.progress.emit(90, "嵌入字幕到视频...")
+            # 从语音参数中获取字幕模式，如果没有则使用默认值
+            subtitle_mode = self.voice_params.get('subtitle_mode', '硬字幕（烧录到视频）')
+            style_options = self.voice_params.get('subtitle_style')
+            render_subtitles = plan_subtitles(subtitle_file, converted_subtitle_file, actual_conversion_type,
+                                              subtitle_mode, final_video_path, style_options)
             
-            if converted_subtitle_file and os.path.exists(converted_subtitle_file):
-                # 从语音参数中获取字幕模式，如果没有则使用默认值
-                subtitle_mode = self.voice_params.get('subtitle_mode', '硬字幕（烧录到视频）')
+            # 单次渲染：原视频 + 混音音频 + 字幕，一次 ffmpeg 调用生成最终文件
+            try:
+                generated_video_path = synthesis.process_video(
+                    self.video_path, subtitle_file, final_video_path,
+                    conversion_type=actual_conversion_type, voice_type=voice_type, 
+                    speed=speed, volume=volume, progress_callback=progress_callback,
+                    existing_audio_path=background_audio_path, quality=quality,  # 传递质量参数
+                    subtitles=render_subtitles
+                )
+            finally:
+                cleanup_subtitles(render_subtitles)
+            
+            # 确定最终视频路径
+            if generated_video_path and os.path.exists(generated_video_path):
+                final_video_path = generated_video_path
+            
+            # 单次渲染未能嵌入字幕时，回退为单独的字幕嵌入
+            if not self._is_running: return
+            if render_subtitles and render_subtitles['rendered']:
+                print(f"✅ 音频替换与字幕嵌入已一次完成: {final_video_path}")
+            elif subtitle_mode != NO_SUBTITLE_MODE and converted_subtitle_file and os.path.exists(converted_subtitle_file):
+                self.progress.emit(90, "嵌入字幕到视频...")
                 self.embedSubtitles(final_video_path, subtitle_file, converted_subtitle_file, actual_conversion_type, subtitle_mode)
             
             self.progress.emit(100, "处理完成！")
@@ -1595,6 +1543,8 @@ class ProcessThread(QThread):
             
         except Exception as e:
             self.finished.emit(False, f"处理失败：{str(e)}")
+        finally:
+            self.path_manager.cleanup_temp_files()
     
     def createTranslatedSubtitle(self, original_subtitle_file, target_lang, conversion_suffix):
         """创建翻译后的字幕文件 - 使用增强的路径管理和错误处理"""
@@ -1908,6 +1858,9 @@ class ProcessThread(QThread):
 
 class EnhancedMainWindow(QMainWindow):
     """增强版主窗口 v1.0"""
+    # 预估处理时间时每分钟视频折算的等效文件大小（MB），估算公式的系数按该码率标定
+    ESTIMATE_MB_PER_MINUTE = 10
+    
     def __init__(self):
         super().__init__()
         
@@ -3725,7 +3678,12 @@ class EnhancedMainWindow(QMainWindow):
                 return "无法估算"
             
             # 获取文件大小和基础信息
-            file_size_mb = os.path.getsize(self.video_path) / (1024 * 1024)
+            # 能获取时长时按时长折算等效大小，避免码率差异（如高码率短片）导致估算偏差
+            media_duration = get_media_probe().get_duration(self.video_path, timeout=INTERACTIVE_PROBE_TIMEOUT)
+            if media_duration:
+                file_size_mb = media_duration / 60 * self.ESTIMATE_MB_PER_MINUTE
+            else:
+                file_size_mb = os.path.getsize(self.video_path) / (1024 * 1024)
             
             # 基础参数
             conversion_type = self.conversion_combo.currentText()
@@ -3864,7 +3822,7 @@ class EnhancedMainWindow(QMainWindow):
         # 从界面读取字幕嵌入与样式（覆盖config.json）
         if hasattr(self, 'subtitle_embed_checkbox'):
             if not self.subtitle_embed_checkbox.isChecked():
-                subtitle_mode = '不嵌入字幕'
+                subtitle_mode = NO_SUBTITLE_MODE
             else:
                 subtitle_mode = self.subtitle_mode_combo_main.currentText()
         else:
@@ -4292,5 +4250,7 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    # 打包后的程序启动变速进程池时需要
+    multiprocessing.freeze_support()
     main()
  
\ No newline at end of file
@@ -136,7 +136,46 @@ def changeCoding(wavPath, outputPath=None):
         # 如果转换失败，返回原文件
     return wavPath
 
-def run(video_path, save_path, output_filename=None):
+def background_track_path(wavPath):
+    """返回与识别用音频对应的全采样率背景音轨路径"""
+    base, ext = os.path.splitext(wavPath)
+    return f"{base}_background{ext}"
+
+def remove_background_track(wavPath):
+    """删除 run(..., with_background=True) 生成的背景音轨（全采样率，体积较大）"""
+    backgroundPath = background_track_path(wavPath)
+    try:
+        if os.path.exists(backgroundPath):
+            os.remove(backgroundPath)
+    except Exception as e:
+        print(f"删除背景音轨失败 {backgroundPath}: {e}")
+
+def extractAudioTracks(videoPath, asrPath, backgroundPath):
+    """
+    一次解码同时输出两条音轨：16kHz单声道识别音轨和原采样率/声道的背景音轨
+
+    ffmpeg 只解复用、解码一次原音频，再分别编码到两个输出文件，
+    避免先提取全采样率WAV再二次转换，背景音也不再使用降采样后的识别音轨。
+    """
+    videoPath = videoPath.replace('\\', '/')
+    asrPath = asrPath.replace('\\', '/')
+    backgroundPath = backgroundPath.replace('\\', '/')
+    
+    cmd = [
+        'ffmpeg', '-y', '-i', videoPath,
+        '-map', '0:a:0', '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', asrPath,
+        '-map', '0:a:0', '-vn', '-acodec', 'pcm_s16le', backgroundPath
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg提取音轨失败: {result.stderr}")
+    
+    for path in (asrPath, backgroundPath):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            raise Exception(f"音频文件生成失败或为空: {path}")
+    return asrPath, backgroundPath
+
+def run(video_path, save_path, output_filename=None, with_background=False):
     """
     主函数：从视频中提取音频并转换格式
     
@@ -144,11 +183,27 @@ def run(video_path, save_path, output_filename=None):
         video_path: 视频文件路径
         save_path: 保存目录路径
         output_filename: 可选的输出文件名，如果不提供则自动生成
+        with_background: 是否同时输出全采样率背景音轨（路径见 background_track_path），
+            两条音轨由同一次ffmpeg解码生成
     
     Returns:
-        str: 最终音频文件路径
+        str: 最终音频文件路径（16kHz单声道，用于语音识别）
     """
     try:
+        if with_background:
+            if not output_filename:
+                import re
+                video_name = os.path.splitext(os.path.basename(video_path))[0]
+                clean_name = re.sub(r'[^\w\-_]', '_', video_name)
+                output_filename = f'{clean_name}_extractedAudio.wav'
+            wav_path = os.path.join(save_path, output_filename).replace('\\', '/')
+            os.makedirs(save_path, exist_ok=True)
+            try:
+                extractAudioTracks(video_path, wav_path, background_track_path(wav_path))
+                return wav_path
+            except Exception as e:
+                print(f"单次解码提取音轨失败，改为分步提取: {e}")
+        
         # 步骤1: 提取音频
         wav_path = videoToWav(video_path, save_path, output_filename)
         
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+媒体信息探测模块
+每个文件只运行一次 ffprobe -show_format -show_streams，按 (路径, 大小, 修改时间) 缓存解析结果，
+内存中和缓存目录下的 media_probe.sqlite 各保存一份，流水线和界面共享同一份结果。
+
+用法:
+    python media_probe.py 视频文件或目录 [...]
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.wmv')
+
+# ffprobe 超时（秒）：流水线中可以多等一会儿，界面线程中调用时使用较短的超时，避免长时间卡住界面
+DEFAULT_PROBE_TIMEOUT = 30
+INTERACTIVE_PROBE_TIMEOUT = 10
+
+
+def _parse_rate(rate):
+    """解析 ffprobe 的分数形式帧率（如 30000/1001）"""
+    try:
+        if '/' in str(rate):
+            num, den = str(rate).split('/')
+            return float(num) / float(den) if float(den) != 0 else 0.0
+        return float(rate)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def summarize_probe(data):
+    """从 ffprobe 的JSON输出中提取常用字段"""
+    format_info = data.get('format', {})
+    video_stream = None
+    audio_stream = None
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and video_stream is None:
+            video_stream = stream
+        elif stream.get('codec_type') == 'audio' and audio_stream is None:
+            audio_stream = stream
+
+    duration = float(format_info.get('duration') or 0)
+    if duration <= 0:
+        stream_durations = [float(stream.get('duration') or 0) for stream in data.get('streams', [])]
+        duration = max(stream_durations, default=0.0)
+
+    info = {
+        'duration': duration,
+        'format_name': format_info.get('format_name'),
+        'bit_rate': int(format_info.get('bit_rate') or 0),
+        'has_video': video_stream is not None,
+        'has_audio': audio_stream is not None,
+        'video_codec': None,
+        'width': 0,
+        'height': 0,
+        'fps': 0.0,
+        'audio_codec': None,
+        'sample_rate': None,
+        'channels': None,
+    }
+    if video_stream:
+        info.update({
+            'video_codec': video_stream.get('codec_name'),
+            'width': int(video_stream.get('width') or 0),
+            'height': int(video_stream.get('height') or 0),
+            'fps': _parse_rate(video_stream.get('r_frame_rate', '0/1')),
+        })
+    if audio_stream:
+        info.update({
+            'audio_codec': audio_stream.get('codec_name'),
+            'sample_rate': int(audio_stream.get('sample_rate') or 0) or None,
+            'channels': audio_stream.get('channels'),
+        })
+    return info
+
+
+def run_ffprobe(path, timeout=DEFAULT_PROBE_TIMEOUT):
+    """运行 ffprobe 并返回解析后的JSON，失败时抛出异常"""
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path]
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        timeout=timeout,
+        creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise Exception(f"ffprobe 探测失败: {path}")
+    try:
+        stdout_text = result.stdout.decode('utf-8')
+    except UnicodeDecodeError:
+        stdout_text = result.stdout.decode('gbk', errors='ignore')
+    return json.loads(stdout_text)
+
+
+class MediaProbe:
+    """带缓存的媒体信息探测（线程安全，多进程共享磁盘缓存）"""
+
+    DB_FILENAME = "media_probe.sqlite"
+    # 批量探测的并发数
+    BULK_WORKERS = 4
+
+    def __init__(self, cache_dir="audio_cache"):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        # (绝对路径, 大小, 修改时间) -> 摘要
+        self._memory = {}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, self.DB_FILENAME),
+                                     timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "data TEXT NOT NULL, probed_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _file_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def probe(self, path, timeout=DEFAULT_PROBE_TIMEOUT):
+        """
+        获取媒体信息摘要（见 summarize_probe），文件未变化时直接使用缓存
+
+        Args:
+            timeout: 需要运行 ffprobe 时的超时（秒），界面线程中传入 INTERACTIVE_PROBE_TIMEOUT
+
+        Returns:
+            dict: 媒体信息；文件不存在或探测失败时返回None
+        """
+        try:
+            key = self._file_key(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            info = self._memory.get(key)
+            if info is not None:
+                return dict(info)
+            row = self._conn.execute(
+                "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?", key
+            ).fetchone()
+        if row is not None:
+            info = summarize_probe(json.loads(row[0]))
+        else:
+            try:
+                data = run_ffprobe(path, timeout=timeout)
+            except Exception as e:
+                print(f"⚠️ 获取媒体信息失败: {e}")
+                return None
+            info = summarize_probe(data)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO probes (path, size, mtime_ns, data, probed_at) VALUES (?, ?, ?, ?, ?)",
+                    key + (json.dumps(data), time.time())
+                )
+                self._conn.commit()
+
+        info['size'] = key[1]
+        with self._lock:
+            self._memory[key] = info
+        return dict(info)
+
+    def get_duration(self, path, timeout=DEFAULT_PROBE_TIMEOUT):
+        """获取媒体时长（秒），无法获取时返回None"""
+        info = self.probe(path, timeout)
+        if info is None or info['duration'] <= 0:
+            return None
+        return info['duration']
+
+    def probe_many(self, paths, max_workers=None):
+        """批量探测，返回 {路径: 媒体信息或None}；已缓存的文件不会重复运行 ffprobe"""
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=max_workers or self.BULK_WORKERS) as executor:
+            return dict(zip(paths, executor.map(self.probe, paths)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_probes = {}
+_shared_probes_lock = threading.Lock()
+
+
+def get_media_probe(cache_dir="audio_cache"):
+    """获取指定缓存目录的共享媒体探测实例
+
+    探测结果以本机绝对路径为键，默认放在本地 audio_cache 目录，
+    不跟随可指向共享存储的 audio_cache_dir 配置，保证界面和流水线命中同一份缓存。
+    """
+    probe_path = os.path.abspath(cache_dir)
+    with _shared_probes_lock:
+        media_probe = _shared_probes.get(probe_path)
+        if media_probe is None:
+            media_probe = MediaProbe(cache_dir)
+            _shared_probes[probe_path] = media_probe
+        return media_probe
+
+
+def collect_media_files(paths, extensions=VIDEO_EXTENSIONS):
+    """展开文件和目录参数，返回媒体文件列表（目录递归查找）"""
+    media_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                media_files.extend(os.path.join(root, filename) for filename in sorted(filenames)
+                                   if filename.lower().endswith(extensions))
+        elif os.path.isfile(path):
+            media_files.append(path)
+    return media_files
+
+
+if __name__ == "__main__":
+    import sys
+    media_probe = get_media_probe()
+    results = media_probe.probe_many(collect_media_files(sys.argv[1:]))
+    for media_path, media_info in results.items():
+        if media_info is None:
+            print(f"❌ {media_path}: 探测失败")
+            continue
+        audio = (f"{media_info['audio_codec']} {media_info['sample_rate']}Hz {media_info['channels']}ch"
+                 if media_info['has_audio'] else "无音频")
+        print(f"🎬 {media_path}: {media_info['duration']:.1f}s {media_info['width']}x{media_info['height']} "
+              f"{media_info['fps']:.2f}fps, {audio}")
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+最终渲染规划模块
+根据原视频、混音音频和字幕模式生成一条 ffmpeg 命令，一次完成音频替换和字幕嵌入：
+- 软字幕：视频流直接复制，字幕作为 mov_text 轨道封装
+- 硬字幕：字幕经 subtitles 滤镜烧录，视频只编码一次（libx264，crf/preset 取自输出质量）
+- 不嵌入字幕：视频流直接复制
+不再生成无声视频等中间文件。
+"""
+
+import os
+import shutil
+import tempfile
+
+HARD_SUBTITLE_MODE = "硬字幕（烧录到视频）"
+NO_SUBTITLE_MODE = "不嵌入字幕"
+
+# 硬字幕在工作目录中的文件名，滤镜参数中只出现这个相对路径，避免盘符冒号和中文路径的转义问题
+BURN_SUBTITLE_FILENAME = "subtitles.srt"
+
+SUBTITLE_LANGUAGES = {"中文": "chi", "英文": "eng"}
+
+# 界面中的字幕位置 -> force_style 的 Alignment（libass 按旧版SSA编号解析：1-3 底部，5-7 顶部，9-11 中部）
+SUBTITLE_ALIGNMENTS = {
+    "底部居中": 2, "顶部居中": 6, "中部居中": 10,
+    "左下": 1, "右下": 3, "左上": 5, "右上": 7, "左中": 9, "右中": 11,
+}
+
+
+def conversion_languages(conversion_type):
+    """返回转换类型对应的 (原字幕语言, 转换后字幕语言) ISO 639-2 代码"""
+    source, _, target = conversion_type.partition("转")
+    source_lang = SUBTITLE_LANGUAGES.get(source, "und")
+    return source_lang, SUBTITLE_LANGUAGES.get(target, source_lang)
+
+
+def _ass_color(color):
+    """#RRGGBB -> ASS 颜色 &H00BBGGRR"""
+    color = str(color).lstrip('#')
+    if len(color) != 6:
+        return None
+    return f"&H00{color[4:6]}{color[2:4]}{color[0:2]}".upper()
+
+
+def ass_force_style(style_options):
+    """把界面的字幕样式转换为 subtitles 滤镜的 force_style 参数，没有样式时返回空字符串"""
+    if not style_options:
+        return ""
+    styles = []
+    if style_options.get('font_family'):
+        styles.append(f"FontName={style_options['font_family']}")
+    if style_options.get('font_size'):
+        styles.append(f"FontSize={int(style_options['font_size'])}")
+    primary_color = _ass_color(style_options.get('font_color', ''))
+    if primary_color:
+        styles.append(f"PrimaryColour={primary_color}")
+    outline_color = _ass_color(style_options.get('outline_color', ''))
+    if outline_color:
+        styles.append(f"OutlineColour={outline_color}")
+    if style_options.get('outline_width') is not None:
+        styles.append(f"Outline={int(style_options['outline_width'])}")
+    alignment = SUBTITLE_ALIGNMENTS.get(style_options.get('position'))
+    if alignment:
+        styles.append(f"Alignment={alignment}")
+    # 单引号会提前结束滤镜参数的引用
+    return ",".join(styles).replace("'", "")
+
+
+def prepare_subtitles(tracks, subtitle_mode, style_options=None):
+    """
+    准备最终渲染用的字幕
+
+    Args:
+        tracks: [(字幕文件, 语言代码), ...]，软字幕时每项封装为一条轨道，硬字幕时烧录第一项
+        subtitle_mode: 字幕模式（"硬字幕（烧录到视频）"、"不嵌入字幕" 或软字幕）
+        style_options: 硬字幕样式（见 ass_force_style）
+
+    Returns:
+        dict: 字幕渲染参数，传给 build_render_command；不需要嵌入字幕时返回None。
+              渲染成功后 'rendered' 会被置为 True，用完后调用 cleanup_subtitles
+    """
+    tracks = [(os.path.abspath(path), language) for path, language in tracks
+              if path and os.path.exists(path) and os.path.getsize(path) > 0]
+    if subtitle_mode == NO_SUBTITLE_MODE or not tracks:
+        return None
+
+    if subtitle_mode == HARD_SUBTITLE_MODE:
+        work_dir = tempfile.mkdtemp(prefix="render_subtitle_")
+        shutil.copy2(tracks[0][0], os.path.join(work_dir, BURN_SUBTITLE_FILENAME))
+        return {
+            'mode': 'hard',
+            'tracks': tracks[:1],
+            'work_dir': work_dir,
+            'force_style': ass_force_style(style_options),
+            'rendered': False,
+        }
+    return {
+        'mode': 'soft',
+        'tracks': tracks,
+        'work_dir': None,
+        'force_style': "",
+        'rendered': False,
+    }
+
+
+def plan_subtitles(original_subtitle_file, converted_subtitle_file, conversion_type, subtitle_mode,
+                   output_file, style_options=None):
+    """
+    按界面的字幕规则准备最终渲染用的字幕
+
+    中英互译时生成双语字幕：硬字幕烧录合并后的双语字幕，软字幕封装原文和译文两条轨道，
+    合并后的双语字幕另存为 <输出文件名>_<转换后缀>_bilingual.srt；其他情况嵌入转换后字幕。
+    """
+    if subtitle_mode == NO_SUBTITLE_MODE:
+        return None
+
+    original_lang, translated_lang = conversion_languages(conversion_type)
+    has_converted = bool(converted_subtitle_file) and os.path.exists(converted_subtitle_file)
+    if not (conversion_type in ("中文转英文", "英文转中文") and has_converted
+            and os.path.abspath(converted_subtitle_file) != os.path.abspath(original_subtitle_file)):
+        subtitle_file = converted_subtitle_file if has_converted else original_subtitle_file
+        return prepare_subtitles([(subtitle_file, translated_lang)], subtitle_mode, style_options)
+
+    from addSrt import create_bilingual_subtitle_file
+
+    video_dir = os.path.dirname(output_file)
+    video_name = os.path.splitext(os.path.basename(output_file))[0]
+    conversion_suffix = conversion_type.replace("转", "_to_").replace("中文", "cn").replace("英文", "en")
+    bilingual_subtitle_file = os.path.join(video_dir, f"{video_name}_{conversion_suffix}_bilingual.srt")
+    if not create_bilingual_subtitle_file(original_subtitle_file, converted_subtitle_file,
+                                          bilingual_subtitle_file, conversion_type):
+        print("⚠️ 双语字幕文件创建失败，改为嵌入转换后字幕")
+        return prepare_subtitles([(converted_subtitle_file, translated_lang)], subtitle_mode, style_options)
+
+    if subtitle_mode == HARD_SUBTITLE_MODE:
+        tracks = [(bilingual_subtitle_file, translated_lang)]
+    else:
+        tracks = [(original_subtitle_file, original_lang), (converted_subtitle_file, translated_lang)]
+    subtitles = prepare_subtitles(tracks, subtitle_mode, style_options)
+    if subtitles is not None:
+        subtitles['bilingual_subtitle_file'] = bilingual_subtitle_file
+    return subtitles
+
+
+def cleanup_subtitles(subtitles):
+    """删除硬字幕的临时工作目录"""
+    if subtitles and subtitles.get('work_dir') and os.path.exists(subtitles['work_dir']):
+        shutil.rmtree(subtitles['work_dir'], ignore_errors=True)
+
+
+def build_render_command(video_file, output_path, audio_file=None, pipe_format=None, subtitles=None, duration=None,
+                         crf=None, preset=None):
+    """
+    生成一次完成音频替换和字幕嵌入的 ffmpeg 命令
+
+    Args:
+        video_file: 原视频（只取其视频流）
+        output_path: 输出文件
+        audio_file: 混音后的音频文件，与 pipe_format 二选一
+        pipe_format: (采样率, 声道数)，音频以 s16le 从标准输入读入
+        subtitles: prepare_subtitles 的返回值，None 表示不嵌入字幕
+        duration: 视频总时长（秒），封装软字幕轨道时用于限定输出时长
+        crf / preset: 硬字幕重新编码视频时 libx264 的 -crf / -preset，None 表示使用 ffmpeg 默认值
+
+    Returns:
+        tuple: (命令参数列表, 工作目录)，工作目录为None时使用当前目录
+    """
+    # 硬字幕时 ffmpeg 在字幕工作目录中运行，其余路径一律使用绝对路径
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", os.path.abspath(video_file)]
+    if pipe_format is not None:
+        sample_rate, channels = pipe_format
+        cmd += ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0"]
+    else:
+        cmd += ["-i", os.path.abspath(audio_file)]
+
+    soft_tracks = subtitles['tracks'] if subtitles and subtitles['mode'] == 'soft' else []
+    for subtitle_file, _ in soft_tracks:
+        cmd += ["-i", subtitle_file]
+
+    cmd += ["-map", "0:v:0", "-map", "1:a:0"]
+    for index in range(len(soft_tracks)):
+        cmd += ["-map", f"{index + 2}:s:0"]
+
+    work_dir = None
+    if subtitles and subtitles['mode'] == 'hard':
+        work_dir = subtitles['work_dir']
+        subtitle_filter = f"subtitles={BURN_SUBTITLE_FILENAME}"
+        if subtitles['force_style']:
+            subtitle_filter += f":force_style='{subtitles['force_style']}'"
+        cmd += ["-vf", subtitle_filter, "-c:v", "libx264"]
+        if crf is not None:
+            cmd += ["-crf", str(crf)]
+        if preset:
+            cmd += ["-preset", preset]
+    else:
+        cmd += ["-c:v", "copy"]
+    cmd += ["-c:a", "aac"]
+
+    if soft_tracks:
+        cmd += ["-c:s", "mov_text"]
+        for index, (_, language) in enumerate(soft_tracks):
+            cmd += [f"-metadata:s:s:{index}", f"language={language}"]
+        cmd += ["-disposition:s:0", "default"]
+
+    # -shortest 会把字幕轨道也算在内，在最后一条字幕处截断视频，有软字幕轨道时改用总时长
+    if not soft_tracks:
+        cmd += ["-shortest"]
+    elif duration:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += [os.path.abspath(output_path)]
+    return cmd, work_dir
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+语速预测模块
+根据历史合成结果，为每个发音人学习 “字数 + 接口语速 → 音频时长” 的模型：
+    log(每字时长) = alpha + beta * 接口语速
+合成前据此选择讯飞 speed 参数，使原始合成音频尽量落在字幕可用时长内，减少事后变速。
+
+观测数据保存在缓存目录下的 speech_rate.sqlite 中，多个进程共享同一份模型。
+模型只在两次任务之间重新拟合（见 SpeechRateModel.job）；每条字幕选定的语速也记录在同一数据库中，
+同一字幕再次处理时沿用之前的语速，缓存键保持稳定。记录超过 SPEED_CHOICE_MAX_AGE 后过期，
+未校准的默认模型做出的选择在模型积累足够样本后重新选择。
+
+查看模型和预测精度:
+    python speech_rate_model.py [缓存目录]
+"""
+
+import contextlib
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# 接口语速每增加50，语速约提高一倍
+DEFAULT_BETA = -math.log(2) / 50
+# 接口语速为50时的默认语速（字/秒）：中文按汉字计，英文按字母和数字计
+DEFAULT_UNITS_PER_SECOND = {"zh": 4.5, "en": 13.0}
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_ALNUM_PATTERN = re.compile(r'[A-Za-z0-9]')
+
+
+def count_speech_units(text):
+    """统计文本的发音单位数：汉字按字计，英文按字母和数字计"""
+    return len(_CJK_PATTERN.findall(text)) + len(_ALNUM_PATTERN.findall(text))
+
+
+def _voice_language(voice_type):
+    return "en" if voice_type.startswith("x4_") else "zh"
+
+
+class SpeechRateModel:
+    """按发音人拟合的语速模型（线程安全，多进程共享观测数据）"""
+
+    DB_FILENAME = "speech_rate.sqlite"
+    # 样本数不足时只拟合 alpha，beta 使用默认值
+    MIN_FIT_SAMPLES = 8
+    # 拟合时使用最近的样本数
+    MAX_FIT_SAMPLES = 2000
+    # beta 的合理范围，防止数据异常时得到反向或过陡的模型
+    BETA_RANGE = (-0.04, -0.002)
+    # 记录的语速选择保留多久（秒），过期后按当前模型重新选择
+    SPEED_CHOICE_MAX_AGE = 30 * 24 * 3600
+
+    def __init__(self, cache_dir="audio_cache"):
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+        # voice -> (alpha, beta, 样本数)
+        self._params = {}
+        # 正在进行的任务数，为0时开始新任务才会重新拟合
+        self._active_jobs = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, self.DB_FILENAME),
+                                     timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS observations ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, voice TEXT NOT NULL, units INTEGER NOT NULL, "
+                "api_speed INTEGER NOT NULL, duration REAL NOT NULL, predicted REAL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_observations_voice ON observations (voice, id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS speed_choices ("
+                "key TEXT PRIMARY KEY, voice TEXT NOT NULL, base_speed INTEGER NOT NULL, "
+                "slot_ms INTEGER NOT NULL, speed INTEGER NOT NULL, created_at REAL NOT NULL, "
+                "model_samples INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(speed_choices)")]
+            if "model_samples" not in columns:
+                # 旧版本没有记录模型样本数，旧记录按未校准模型的选择处理
+                self._conn.execute("ALTER TABLE speed_choices ADD COLUMN model_samples INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("DELETE FROM speed_choices WHERE created_at < ?",
+                               (time.time() - self.SPEED_CHOICE_MAX_AGE,))
+            self._conn.commit()
+
+    def _default_params(self, voice_type):
+        units_per_second = DEFAULT_UNITS_PER_SECOND[_voice_language(voice_type)]
+        return -math.log(units_per_second) - DEFAULT_BETA * 50, DEFAULT_BETA, 0
+
+    def _fit(self, voice_type):
+        """用最近的观测重新拟合该发音人的参数（调用方需持有锁）"""
+        rows = self._conn.execute(
+            "SELECT units, api_speed, duration FROM observations WHERE voice = ? ORDER BY id DESC LIMIT ?",
+            (voice_type, self.MAX_FIT_SAMPLES)
+        ).fetchall()
+        if not rows:
+            self._params[voice_type] = self._default_params(voice_type)
+            return
+
+        data = np.array(rows, dtype=np.float64)
+        speeds = data[:, 1]
+        log_seconds_per_unit = np.log(data[:, 2] / data[:, 0])
+
+        if len(rows) >= self.MIN_FIT_SAMPLES and np.ptp(speeds) >= 5:
+            design = np.column_stack([np.ones_like(speeds), speeds])
+            (alpha, beta), *_ = np.linalg.lstsq(design, log_seconds_per_unit, rcond=None)
+            beta = float(np.clip(beta, *self.BETA_RANGE))
+            alpha = float(np.mean(log_seconds_per_unit - beta * speeds))
+        else:
+            beta = DEFAULT_BETA
+            alpha = float(np.mean(log_seconds_per_unit - beta * speeds))
+        self._params[voice_type] = (alpha, beta, len(rows))
+
+    def _get_params(self, voice_type):
+        """获取参数，首次使用时拟合（调用方需持有锁）"""
+        if voice_type not in self._params:
+            self._fit(voice_type)
+        return self._params[voice_type]
+
+    def refit(self):
+        """丢弃已拟合的参数，下次预测时用最新的观测（包括其他进程记录的）重新拟合"""
+        with self._lock:
+            self._params.clear()
+
+    @contextlib.contextmanager
+    def job(self):
+        """
+        一次合成任务的上下文
+
+        任务期间模型参数保持不变，任务中新增的观测在下一个任务开始时才参与拟合，
+        同一任务内前后字幕的语速选择不会因为中途重新拟合而不一致。
+        并发的任务全部结束后，下一个任务开始时才重新拟合。
+        """
+        with self._lock:
+            if self._active_jobs == 0:
+                self.refit()
+            self._active_jobs += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active_jobs -= 1
+
+    def predict_duration(self, text, voice_type, api_speed):
+        """预测合成音频时长（秒），无法预测时返回None"""
+        units = count_speech_units(text)
+        if units == 0:
+            return None
+        with self._lock:
+            alpha, beta, _ = self._get_params(voice_type)
+        return units * math.exp(alpha + beta * api_speed)
+
+    def observe(self, text, voice_type, api_speed, duration):
+        """记录一次实际合成结果，同时记录合成前的预测值用于统计精度"""
+        units = count_speech_units(text)
+        if units == 0 or duration <= 0:
+            return
+        predicted = self.predict_duration(text, voice_type, api_speed)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO observations (voice, units, api_speed, duration, predicted, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (voice_type, units, int(api_speed), float(duration), predicted, time.time())
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _speed_choice_key(text, voice_type, base_speed, slot_duration):
+        return hashlib.md5(f"{text}_{voice_type}_{int(base_speed)}_{int(round(slot_duration * 1000))}"
+                           .encode('utf-8')).hexdigest()
+
+    def _is_choice_stale(self, voice_type, created_at, model_samples):
+        """
+        判断记录的语速选择是否需要重新选择（调用方需持有锁）
+
+        超过 SPEED_CHOICE_MAX_AGE 的记录过期；样本不足 MIN_FIT_SAMPLES 时模型只是默认值，
+        这期间做出的选择在模型校准后作废。
+        """
+        if time.time() - created_at > self.SPEED_CHOICE_MAX_AGE:
+            return True
+        return model_samples < self.MIN_FIT_SAMPLES <= self._get_params(voice_type)[2]
+
+    def get_speed_choice(self, text, voice_type, base_speed, slot_duration):
+        """查询之前为这条字幕（文本 + 发音人 + 用户语速 + 可用时长）选定的语速，没有记录或已过期时返回None"""
+        key = self._speed_choice_key(text, voice_type, base_speed, slot_duration)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT speed, created_at, model_samples FROM speed_choices WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_choice_stale(voice_type, row[1], row[2]):
+                return None
+        return row[0]
+
+    def remember_speed_choice(self, text, voice_type, base_speed, slot_duration, speed):
+        """
+        记录为这条字幕选定的语速，返回最终生效的语速
+
+        已有未过期的记录（例如另一个进程同时选定）时保留先写入的一条并返回它，保证同一字幕始终使用同一语速；
+        过期的记录被新的选择替换。
+        """
+        key = self._speed_choice_key(text, voice_type, base_speed, slot_duration)
+        with self._lock:
+            model_samples = self._get_params(voice_type)[2]
+            row = self._conn.execute(
+                "SELECT created_at, model_samples FROM speed_choices WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._is_choice_stale(voice_type, row[0], row[1]):
+                self._conn.execute("DELETE FROM speed_choices WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT OR IGNORE INTO speed_choices "
+                "(key, voice, base_speed, slot_ms, speed, created_at, model_samples) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, voice_type, int(base_speed), int(round(slot_duration * 1000)), int(speed), time.time(),
+                 model_samples)
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT speed FROM speed_choices WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else speed
+
+    def get_model(self):
+        """获取各发音人的模型参数"""
+        with self._lock:
+            voices = [row[0] for row in self._conn.execute("SELECT DISTINCT voice FROM observations")]
+            model = {}
+            for voice_type in voices:
+                alpha, beta, samples = self._get_params(voice_type)
+                model[voice_type] = {
+                    "alpha": alpha,
+                    "beta": beta,
+                    "samples": samples,
+                    "units_per_second_at_50": math.exp(-(alpha + beta * 50))
+                }
+            return model
+
+    def get_accuracy_stats(self):
+        """统计各发音人预测时长的精度（基于最近的观测）"""
+        stats = {}
+        with self._lock:
+            voices = [row[0] for row in self._conn.execute("SELECT DISTINCT voice FROM observations")]
+            for voice_type in voices:
+                rows = self._conn.execute(
+                    "SELECT predicted, duration FROM observations "
+                    "WHERE voice = ? AND predicted IS NOT NULL ORDER BY id DESC LIMIT ?",
+                    (voice_type, self.MAX_FIT_SAMPLES)
+                ).fetchall()
+                if not rows:
+                    continue
+                data = np.array(rows, dtype=np.float64)
+                relative_error = np.abs(data[:, 0] - data[:, 1]) / data[:, 1]
+                stats[voice_type] = {
+                    "samples": len(rows),
+                    "mean_abs_error_pct": float(np.mean(relative_error) * 100),
+                    "median_abs_error_pct": float(np.median(relative_error) * 100),
+                    "within_10pct": float(np.mean(relative_error <= 0.1))
+                }
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+
+
+def get_speech_rate_model(cache_dir="audio_cache"):
+    """获取指定缓存目录的共享语速模型实例"""
+    model_path = os.path.abspath(cache_dir)
+    with _shared_models_lock:
+        model = _shared_models.get(model_path)
+        if model is None:
+            model = SpeechRateModel(cache_dir)
+            _shared_models[model_path] = model
+        return model
+
+
+if __name__ == "__main__":
+    import sys
+    speech_rate_model = get_speech_rate_model(sys.argv[1] if len(sys.argv) > 1 else "audio_cache")
+    accuracy = speech_rate_model.get_accuracy_stats()
+    print(f"{'发音人':<28}{'样本数':>8}{'字/秒@50':>10}{'beta':>10}{'平均误差%':>10}{'10%内占比':>10}")
+    for voice, params in speech_rate_model.get_model().items():
+        voice_accuracy = accuracy.get(voice, {})
+        print(f"{voice:<30}{params['samples']:>8}{params['units_per_second_at_50']:>10.2f}{params['beta']:>10.4f}"
+              f"{voice_accuracy.get('mean_abs_error_pct', float('nan')):>10.1f}"
+              f"{voice_accuracy.get('within_10pct', float('nan')) * 100:>10.1f}")
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""audio_cache 单元测试"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+import audio_cache
+from audio_cache import AudioCache, InterProcessLock, get_audio_cache
+
+
+def _samples(seed, length=1000):
+    return np.random.default_rng(seed).integers(-32768, 32767, length).astype(np.int16)
+
+
+def test_legacy_wav_files_and_index_entries_are_dropped(tmp_path):
+    legacy_name = "0123456789abcdef0123456789abcdef.wav"
+    (tmp_path / legacy_name).write_bytes(b"RIFF" + b"\x00" * 100)
+    (tmp_path / "notes.wav").write_bytes(b"user file")
+
+    # 旧版本代码登记过的条目也要清理
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+    cache.put("current", _samples(0))
+    cache.close()
+    conn = sqlite3.connect(str(tmp_path / AudioCache.INDEX_FILENAME))
+    conn.execute("INSERT INTO entries (key, filename, size_bytes, created_at, last_access) "
+                 "VALUES ('0123456789abcdef0123456789abcdef', ?, 104, 0, 0)", (legacy_name,))
+    conn.commit()
+    conn.close()
+
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+    assert not cache.contains("0123456789abcdef0123456789abcdef")
+    assert cache.contains("current")
+    assert not (tmp_path / legacy_name).exists()
+    assert (tmp_path / "notes.wav").exists()
+    assert cache.get_stats()["entries"] == 1
+    cache.close()
+
+
+class _Clock:
+    """替换 audio_cache 中的 time 模块，使访问时间严格递增"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(audio_cache, "time", clock)
+    return clock
+
+
+def _index_rows(cache_dir):
+    conn = sqlite3.connect(os.path.join(cache_dir, AudioCache.INDEX_FILENAME))
+    try:
+        return {key: (last_access, hit_count) for key, last_access, hit_count in
+                conn.execute("SELECT key, last_access, hit_count FROM entries")}
+    finally:
+        conn.close()
+
+
+def _entry_size(tmp_path):
+    probe = AudioCache(str(tmp_path / "probe"), storage_format="npy")
+    probe.put("probe", _samples(99))
+    size = probe.get_stats()["total_bytes"]
+    probe.close()
+    return size
+
+
+def test_lru_eviction_keeps_total_within_byte_budget(tmp_path, clock):
+    entry_size = _entry_size(tmp_path)
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=3 * entry_size, storage_format="npy")
+    for key in "abc":
+        cache.put(key, _samples(ord(key)))
+    assert cache.get_stats()["total_bytes"] == 3 * entry_size
+
+    # 命中 a 之后，最久未使用的是 b
+    assert cache.load("a") is not None
+    cache.put("d", _samples(ord("d")))
+    assert [cache.contains(key) for key in "abcd"] == [True, False, True, True]
+    stats = cache.get_stats()
+    assert stats["total_bytes"] <= 3 * entry_size
+    assert stats["evictions"] == 1
+    # 被淘汰条目的对象文件一并删除
+    object_files = [name for _, _, names in os.walk(tmp_path / "cache" / AudioCache.OBJECTS_DIRNAME)
+                    for name in names]
+    assert len(object_files) == 3
+    cache.close()
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+    cache.put("a", _samples(1))
+    size = cache.get_stats()["total_bytes"]
+    cache.put("b", _samples(1))
+    assert cache.get_stats()["total_bytes"] == size
+    cache.remove("a")
+    np.testing.assert_array_equal(cache.load("b")[0], _samples(1))
+    cache.close()
+
+
+def test_hits_are_buffered_until_flush(tmp_path, clock):
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+    cache.put("a", _samples(1))
+    stored_access, _ = _index_rows(str(tmp_path))["a"]
+
+    for _ in range(3):
+        assert cache.load("a") is not None
+    # 命中只记在内存中，不立即提交索引
+    assert _index_rows(str(tmp_path))["a"] == (stored_access, 0)
+
+    cache.flush_stats()
+    last_access, hit_count = _index_rows(str(tmp_path))["a"]
+    assert last_access > stored_access and hit_count == 3
+    cache.close()
+
+
+def test_hits_flush_after_interval(tmp_path, clock):
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+    cache.put("a", _samples(1))
+    cache.load("a")
+    clock.sleep(AudioCache.ACCESS_FLUSH_INTERVAL)
+    cache.load("a")
+    assert _index_rows(str(tmp_path))["a"][1] == 2
+    cache.close()
+
+
+@pytest.mark.parametrize("storage_format", [
+    pytest.param("flac", marks=pytest.mark.skipif(not audio_cache._HAS_SOUNDFILE, reason="需要 soundfile")),
+    "npy",
+    "wav",
+])
+def test_storage_format_round_trip(tmp_path, storage_format):
+    samples = _samples(5, 22050)
+    cache = AudioCache(str(tmp_path), storage_format=storage_format)
+    cache.put("key", samples, sample_rate=22050)
+    cache.close()
+
+    # 重新打开后从索引恢复条目
+    cache = AudioCache(str(tmp_path), storage_format=storage_format)
+    loaded, sample_rate = cache.load("key")
+    assert sample_rate == 22050
+    assert loaded.dtype == np.int16
+    np.testing.assert_array_equal(loaded, samples)
+    cache.close()
+
+
+def test_npy_entries_are_memory_mapped(tmp_path):
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+    cache.put("key", _samples(1))
+    loaded, _ = cache.load("key")
+    assert isinstance(loaded, np.memmap) and not loaded.flags.writeable
+    cache.close()
+
+
+def test_failed_write_leaves_no_partial_object(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path), storage_format="npy")
+
+    def write_half(path, samples, sample_rate):
+        with open(path, "wb") as f:
+            f.write(b"\x93NUMPY")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cache, "_write_entry", write_half)
+    with pytest.raises(OSError):
+        cache.put("key", _samples(1))
+    assert not cache.contains("key")
+    leftovers = [name for _, _, names in os.walk(tmp_path / AudioCache.OBJECTS_DIRNAME) for name in names]
+    assert leftovers == []
+    cache.close()
+
+
+def test_entries_written_by_another_instance_are_visible(tmp_path):
+    writer = AudioCache(str(tmp_path), storage_format="npy")
+    reader = AudioCache(str(tmp_path), storage_format="npy", refresh_interval=0)
+    assert reader.load("key") is None
+    writer.put("key", _samples(1))
+    np.testing.assert_array_equal(reader.load("key")[0], _samples(1))
+    writer.close()
+    reader.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="使用 fcntl 检查锁状态")
+def test_inter_process_lock_excludes_other_processes(tmp_path):
+    lock_path = str(tmp_path / "cache.lock")
+    probe = ("import fcntl, sys\n"
+             "f = open(sys.argv[1], 'a+b')\n"
+             "try:\n"
+             "    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)\n"
+             "except OSError:\n"
+             "    sys.exit(1)\n")
+
+    def other_process_can_lock():
+        return subprocess.run([sys.executable, "-c", probe, lock_path]).returncode == 0
+
+    lock = InterProcessLock(lock_path)
+    with lock:
+        assert not other_process_can_lock()
+    assert other_process_can_lock()
+
+
+def test_inter_process_lock_serializes_threads(tmp_path):
+    lock = InterProcessLock(str(tmp_path / "cache.lock"))
+    inside = []
+    overlaps = []
+
+    def worker():
+        for _ in range(50):
+            with lock:
+                inside.append(1)
+                overlaps.append(len(inside) > 1)
+                inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(overlaps) == 200 and not any(overlaps)
+
+
+def test_get_audio_cache_keys_instances_by_storage_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_cache, "_shared_caches", {})
+    cache_dir = str(tmp_path)
+    npy_cache = get_audio_cache(cache_dir, storage_format="npy")
+    assert get_audio_cache(cache_dir, max_bytes=1234, storage_format="npy") is npy_cache
+    assert npy_cache.max_bytes == 1234
+
+    wav_cache = get_audio_cache(cache_dir, storage_format="wav")
+    assert wav_cache is not npy_cache and wav_cache.storage_format == "wav"
+    assert get_audio_cache(cache_dir).storage_format == audio_cache.default_storage_format()
+
+    # 不同格式的实例共享同一份索引
+    wav_cache.put("key", _samples(1))
+    npy_cache.refresh_interval = 0
+    np.testing.assert_array_equal(npy_cache.load("key")[0], _samples(1))
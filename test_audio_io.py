@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""audio_io 单元测试"""
+
+import shutil
+import struct
+import subprocess
+import wave
+
+import numpy as np
+import pytest
+
+from audio_io import (SYNTHESIS_SAMPLE_RATE, StreamingMp3Decoder, decode_mp3_bytes, iter_pcm_chunks, memmap_wav,
+                      pcm_bytes_to_array, read_pcm_region, read_wav_header)
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="需要 ffmpeg")
+
+
+def _dominant_frequency(samples, sample_rate):
+    spectrum = np.abs(np.fft.rfft(samples.astype(np.float64) * np.hanning(len(samples))))
+    return np.fft.rfftfreq(len(samples), 1.0 / sample_rate)[int(np.argmax(spectrum))]
+
+
+@pytest.fixture(scope="module")
+def mp3_sine():
+    """用 ffmpeg 生成 1 秒 440Hz 的 MP3（与讯飞 lame 输出相同的 16kHz 单声道）"""
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("需要 ffmpeg")
+    result = subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+        "-i", f"sine=frequency=440:sample_rate={SYNTHESIS_SAMPLE_RATE}:duration=1",
+        "-ac", "1", "-f", "mp3", "pipe:1"
+    ], capture_output=True, check=True)
+    return result.stdout
+
+
+def test_pcm_bytes_to_array_drops_incomplete_sample():
+    data = np.array([1, -2, 32767], dtype=np.int16).tobytes()
+    np.testing.assert_array_equal(pcm_bytes_to_array(data + b"\x01"), [1, -2, 32767])
+    assert pcm_bytes_to_array(b"").dtype == np.int16
+
+
+@requires_ffmpeg
+def test_decode_mp3_bytes(mp3_sine):
+    samples = decode_mp3_bytes(mp3_sine)
+    assert samples.dtype == np.int16
+    # MP3 编码器会在首尾补帧，时长允许几十毫秒的误差
+    assert abs(len(samples) - SYNTHESIS_SAMPLE_RATE) < 0.1 * SYNTHESIS_SAMPLE_RATE
+    assert _dominant_frequency(samples, SYNTHESIS_SAMPLE_RATE) == pytest.approx(440, abs=2)
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("chunk_size", [1, 417, 4096])
+def test_streaming_decoder_matches_one_shot_decode(mp3_sine, chunk_size):
+    decoder = StreamingMp3Decoder()
+    for offset in range(0, len(mp3_sine), chunk_size):
+        decoder.feed(mp3_sine[offset:offset + chunk_size])
+    np.testing.assert_array_equal(decoder.finish(), decode_mp3_bytes(mp3_sine))
+
+
+@requires_ffmpeg
+def test_streaming_decoder_reports_invalid_input():
+    decoder = StreamingMp3Decoder()
+    decoder.feed(b"not an mp3 stream" * 64)
+    with pytest.raises(Exception, match="ffmpeg解码失败"):
+        decoder.finish()
+
+
+@requires_ffmpeg
+def test_streaming_decoder_abort_stops_process(mp3_sine):
+    decoder = StreamingMp3Decoder()
+    decoder.feed(mp3_sine[:1000])
+    decoder.abort()
+    assert decoder._process.wait(timeout=5) != 0
+
+
+def _write_wav(path, samples, sample_rate, extensible=False, extra_chunk=b"", data_size=None):
+    """手工写出WAV：可选 WAVE_FORMAT_EXTENSIBLE 的 fmt 块、data 前的附加块（奇数长度需补齐）和错误的 data 大小"""
+    frames, channels = samples.shape
+    block_align = channels * 2
+    fmt = struct.pack("<HHIIHH", 0xFFFE if extensible else 1, channels, sample_rate,
+                      sample_rate * block_align, block_align, 16)
+    if extensible:
+        fmt += struct.pack("<HHI16s", 22, 16, 0, b"\x01\x00\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71")
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    if extra_chunk:
+        chunks += b"LIST" + struct.pack("<I", len(extra_chunk)) + extra_chunk + b"\x00" * (len(extra_chunk) & 1)
+    data = samples.astype("<i2").tobytes()
+    chunks += b"data" + struct.pack("<I", len(data) if data_size is None else data_size) + data
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+
+
+@pytest.fixture
+def stereo_samples():
+    rng = np.random.default_rng(3)
+    return rng.integers(-32768, 32767, (10007, 2)).astype(np.int16)
+
+
+@pytest.mark.parametrize("layout, expected_offset", [
+    ({}, 44),
+    ({"extensible": True}, 68),
+    # 17 字节的附加块补齐到 18 字节
+    ({"extra_chunk": b"INFOISFT\x05\x00\x00\x00test\x00"}, 70),
+    # 流式写出、未回填 data 大小
+    ({"data_size": 0xFFFFFFFF}, 44),
+])
+def test_memmap_wav_round_trip(tmp_path, stereo_samples, layout, expected_offset):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path, stereo_samples, 22050, **layout)
+    assert read_wav_header(path) == (22050, 2, expected_offset, len(stereo_samples))
+    samples, sample_rate = memmap_wav(path)
+    assert sample_rate == 22050
+    np.testing.assert_array_equal(samples, stereo_samples)
+
+
+def test_read_wav_header_matches_wave_module(tmp_path, stereo_samples):
+    path = str(tmp_path / "audio.wav")
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(48000)
+        wf.writeframes(stereo_samples.tobytes())
+    assert read_wav_header(path) == (48000, 2, 44, len(stereo_samples))
+
+
+def test_read_wav_header_rejects_other_formats(tmp_path):
+    path = tmp_path / "audio.wav"
+    path.write_bytes(b"RIFF\x00\x00\x00\x00AVI ")
+    with pytest.raises(ValueError):
+        read_wav_header(str(path))
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(1)
+        wf.setframerate(8000)
+        wf.writeframes(b"\x80" * 100)
+    with pytest.raises(ValueError):
+        read_wav_header(str(path))
+
+
+def test_memmap_wav_empty_data(tmp_path):
+    path = str(tmp_path / "empty.wav")
+    _write_wav(path, np.zeros((0, 2), dtype=np.int16), 16000)
+    samples, sample_rate = memmap_wav(path)
+    assert samples.shape == (0, 2) and sample_rate == 16000
+
+
+def test_read_pcm_region(tmp_path, stereo_samples):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path, stereo_samples, 1000, extra_chunk=b"abc")
+    region, sample_rate = read_pcm_region(path, 2.5, 4.0015)
+    assert sample_rate == 1000
+    np.testing.assert_array_equal(region, stereo_samples[2500:4002])
+    # 超出范围时截断，结束早于开始时返回空数组
+    assert len(read_pcm_region(path, 9.5, 20.0)[0]) == len(stereo_samples) - 9500
+    assert read_pcm_region(path, 5.0, 4.0)[0].shape == (0, 2)
+
+
+@pytest.mark.parametrize("chunk_frames", [1, 997, 10007, 20000])
+def test_iter_pcm_chunks_memmap_round_trip(tmp_path, stereo_samples, chunk_frames):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path, stereo_samples, 16000, extensible=True)
+    chunks = list(iter_pcm_chunks(path, chunk_frames))
+    assert all(len(chunk) == chunk_frames for chunk in chunks[:-1])
+    np.testing.assert_array_equal(np.concatenate(chunks), stereo_samples)
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("chunk_frames", [333, 4096])
+def test_iter_pcm_chunks_converts_through_ffmpeg(tmp_path, stereo_samples, chunk_frames):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path, stereo_samples, 16000)
+    # 指定不同的声道数时经ffmpeg转换
+    chunks = list(iter_pcm_chunks(path, chunk_frames, sample_rate=16000, channels=1))
+    mono = np.concatenate(chunks)
+    assert mono.shape == (len(stereo_samples), 1)
+    assert all(len(chunk) <= chunk_frames for chunk in chunks)
+
+
+def test_iter_pcm_chunks_requires_format_for_non_wav(tmp_path):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(b"\xff\xfb" + b"\x00" * 100)
+    with pytest.raises(ValueError):
+        list(iter_pcm_chunks(str(path), 1024))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""audio_mixer 单元测试"""
+
+import wave
+
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from audio_io import pcm_to_audio_segment
+from audio_mixer import (WavBackgroundReader, db_to_gain, ducking_envelope, ducking_intervals, float_to_int16,
+                         iter_dubbing_chunks, mix_audio_segments, mix_dubbing_track)
+
+ATTACK = 10
+RELEASE = 40
+
+
+def _envelope(intervals, length, ducking_gain=0.5, window_start=0):
+    return ducking_envelope(intervals, window_start, length, ducking_gain, ATTACK, RELEASE)
+
+
+def test_intervals_merge_overlapping_and_close_spans():
+    spans = [(500, 100), (100, 100), (150, 20), (620, 30)]
+    intervals = ducking_intervals(spans, 10000, ATTACK, RELEASE)
+    # (100,200) 包含 (150,170)；600 与 620 的间隔小于起始+释放斜坡，合并
+    assert intervals.tolist() == [[100, 200], [500, 650]]
+
+
+def test_intervals_keep_spans_separated_by_full_ramps():
+    intervals = ducking_intervals([(100, 100), (200 + ATTACK + RELEASE, 50)], 10000, ATTACK, RELEASE)
+    assert len(intervals) == 2
+
+
+def test_intervals_clip_to_total_frames_and_skip_empty():
+    intervals = ducking_intervals([(900, 500), (50, 0), (1200, 10)], 1000, ATTACK, RELEASE)
+    assert intervals.tolist() == [[900, 1000]]
+    assert ducking_intervals([], 1000, ATTACK, RELEASE).shape == (0, 2)
+
+
+def test_envelope_ramps():
+    intervals = np.array([[100, 200]])
+    envelope = _envelope(intervals, 400)
+    assert envelope.dtype == np.float32
+    assert np.all(envelope[:100 - ATTACK] == 1.0)
+    # 起始斜坡线性下降，区间内保持压低
+    attack = envelope[100 - ATTACK:101]
+    assert np.all(np.diff(attack) < 0)
+    assert attack[ATTACK // 2] == pytest.approx(0.75)
+    assert np.all(envelope[100:201] == pytest.approx(0.5))
+    # 释放斜坡线性恢复
+    release = envelope[200:200 + RELEASE + 1]
+    assert np.all(np.diff(release) > 0)
+    assert release[RELEASE // 2] == pytest.approx(0.75)
+    assert np.all(envelope[200 + RELEASE:] == 1.0)
+
+
+def test_envelope_is_independent_of_window_split():
+    intervals = ducking_intervals([(100, 100), (350, 80), (990, 40)], 1200, ATTACK, RELEASE)
+    whole = _envelope(intervals, 1200)
+    pieces = np.concatenate([_envelope(intervals, 77, window_start=start)[:min(77, 1200 - start)]
+                             for start in range(0, 1200, 77)])
+    np.testing.assert_array_equal(whole, pieces)
+
+
+def test_envelope_without_ramps():
+    envelope = ducking_envelope(np.array([[10, 20]]), 0, 30, 0.25, 0, 0)
+    assert np.all(envelope[:10] == 1.0)
+    assert np.all(envelope[10:20] == 0.25)
+    assert np.all(envelope[20:] == 1.0)
+
+
+def test_mix_silent_background_places_voices():
+    voice = np.full(100, 0.25, dtype=np.float32)
+    mix = mix_dubbing_track([(0.01, voice), (0.015, voice)], 0.05, 10000, channels=2)
+    assert mix.shape == (500, 2)
+    assert np.all(mix[:100] == 0.0)
+    assert np.all(mix[100:150] == 0.25)
+    # 两条语音重叠的部分相加
+    assert np.all(mix[150:200] == 0.5)
+    assert np.all(mix[200:250] == 0.25)
+    assert np.all(mix[250:] == 0.0)
+
+
+def test_mix_ducks_and_loops_background():
+    sample_rate = 1000
+    background = np.full((300, 1), 0.5, dtype=np.float32)
+    voice = np.zeros(100, dtype=np.float32)
+    mix = mix_dubbing_track([(0.4, voice)], 1.0, sample_rate, background=background,
+                            background_gain_db=-6.0, ducking_gain_db=-12.0, attack_ms=10, release_ms=40)
+    background_level = 0.5 * db_to_gain(-6.0)
+    assert mix.shape == (1000, 1)
+    # 背景不足总时长时循环填充
+    assert mix[0, 0] == pytest.approx(background_level)
+    assert mix[999, 0] == pytest.approx(background_level)
+    assert mix[450, 0] == pytest.approx(background_level * db_to_gain(-12.0))
+
+
+def test_float_mix_clips_only_when_converting():
+    voice = np.full(10, 0.8, dtype=np.float32)
+    mix = mix_dubbing_track([(0.0, voice), (0.0, voice), (0.0, -voice * 4)], 0.01, 1000)
+    # float32 累加不会溢出，限幅只发生在转换为 int16 时
+    assert mix[0, 0] == pytest.approx(-1.6)
+    assert float_to_int16(mix)[0, 0] == -32768
+    assert float_to_int16(np.array([[1.6]], dtype=np.float32))[0, 0] == 32767
+    assert float_to_int16(np.array([[0.5]], dtype=np.float32))[0, 0] == 16384
+
+
+@pytest.mark.parametrize("chunk_seconds", [0.05, 0.37, 10])
+def test_streaming_mix_matches_in_memory_mix(tmp_path, chunk_seconds):
+    rng = np.random.default_rng(7)
+    sample_rate, channels, total_duration = 44100, 2, 3.0
+    background = rng.integers(-20000, 20000, (int(sample_rate * 2.5), channels)).astype(np.int16)
+    background_path = str(tmp_path / "background.wav")
+    with wave.open(background_path, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(background.tobytes())
+
+    # 16kHz 语音重采样到 44.1kHz 后的帧数与按时长换算的帧数不同；字幕顺序打乱且有重叠
+    starts = [1.2, 0.1, 0.45, 2.31, 2.9]
+    segments = [("", start, start + 0.5) for start in starts]
+    voices = [pcm_to_audio_segment(rng.integers(-30000, 30000, int(16000 * rng.uniform(0.1, 0.6)))
+                                   .astype(np.int16), 16000) for _ in starts]
+
+    mix, _ = mix_audio_segments(voices, segments, total_duration,
+                                AudioSegment(data=background.tobytes(), sample_width=2,
+                                             frame_rate=sample_rate, channels=channels))
+    with WavBackgroundReader(background_path) as reader:
+        streamed = np.concatenate(list(iter_dubbing_chunks(voices, segments, total_duration, sample_rate,
+                                                           channels, reader, chunk_seconds=chunk_seconds)))
+    np.testing.assert_array_equal(float_to_int16(streamed), float_to_int16(mix))
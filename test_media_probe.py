@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""media_probe 单元测试（用假的 ffprobe 输出，不需要 ffmpeg）"""
+
+import os
+
+import pytest
+
+import media_probe
+from media_probe import DEFAULT_PROBE_TIMEOUT, INTERACTIVE_PROBE_TIMEOUT, MediaProbe, summarize_probe
+
+FFPROBE_OUTPUT = {
+    "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "12.480000", "bit_rate": "1250000"},
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080, "r_frame_rate": "30000/1001"},
+        {"codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2},
+        {"codec_type": "audio", "codec_name": "mp3", "sample_rate": "44100", "channels": 1},
+    ],
+}
+
+
+def test_summarize_probe_uses_first_streams():
+    info = summarize_probe(FFPROBE_OUTPUT)
+    assert info == {
+        'duration': 12.48,
+        'format_name': "mov,mp4,m4a,3gp,3g2,mj2",
+        'bit_rate': 1250000,
+        'has_video': True,
+        'has_audio': True,
+        'video_codec': "h264",
+        'width': 1920,
+        'height': 1080,
+        'fps': pytest.approx(29.97, abs=0.01),
+        'audio_codec': "aac",
+        'sample_rate': 48000,
+        'channels': 2,
+    }
+
+
+def test_summarize_probe_without_format_duration_or_audio():
+    info = summarize_probe({
+        "format": {"duration": None},
+        "streams": [
+            {"codec_type": "video", "codec_name": "vp9", "duration": "3.5", "r_frame_rate": "25/0"},
+            {"codec_type": "subtitle", "duration": "4.0"},
+        ],
+    })
+    # 容器没有时长时取最长的流
+    assert info['duration'] == 4.0
+    assert info['fps'] == 0.0
+    assert not info['has_audio'] and info['sample_rate'] is None and info['audio_codec'] is None
+    assert info['bit_rate'] == 0
+
+
+def test_summarize_probe_empty_output():
+    info = summarize_probe({})
+    assert info['duration'] == 0.0
+    assert not info['has_video'] and not info['has_audio']
+
+
+@pytest.fixture
+def fake_ffprobe(monkeypatch):
+    """记录 ffprobe 调用次数和超时参数"""
+    calls = []
+
+    def run_ffprobe(path, timeout=DEFAULT_PROBE_TIMEOUT):
+        calls.append((path, timeout))
+        return FFPROBE_OUTPUT
+
+    monkeypatch.setattr(media_probe, "run_ffprobe", run_ffprobe)
+    return calls
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"\x00" * 100)
+    return path
+
+
+def test_probe_is_cached_until_size_or_mtime_changes(tmp_path, video_file, fake_ffprobe):
+    probe = MediaProbe(str(tmp_path / "cache"))
+    first = probe.probe(str(video_file))
+    assert first['duration'] == 12.48 and first['size'] == 100
+    assert probe.probe(str(video_file)) == first
+    assert len(fake_ffprobe) == 1
+
+    # 大小变化
+    video_file.write_bytes(b"\x00" * 200)
+    assert probe.probe(str(video_file))['size'] == 200
+    assert len(fake_ffprobe) == 2
+
+    # 大小不变、只有修改时间变化
+    stat = os.stat(video_file)
+    os.utime(video_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    probe.probe(str(video_file))
+    assert len(fake_ffprobe) == 3
+    probe.close()
+
+
+def test_probe_cache_is_shared_through_sqlite(tmp_path, video_file, fake_ffprobe, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    writer = MediaProbe(cache_dir)
+    expected = writer.probe(str(video_file))
+    writer.close()
+
+    # 新实例（例如另一个进程）从磁盘缓存读取，相对路径和绝对路径命中同一条目
+    reader = MediaProbe(cache_dir)
+    monkeypatch.chdir(tmp_path)
+    assert reader.probe("video.mp4") == expected
+    assert reader.get_duration(str(video_file)) == 12.48
+    assert len(fake_ffprobe) == 1
+    reader.close()
+
+
+def test_probe_passes_timeout_and_does_not_cache_failures(tmp_path, video_file, monkeypatch):
+    timeouts = []
+
+    def run_ffprobe(path, timeout=DEFAULT_PROBE_TIMEOUT):
+        timeouts.append(timeout)
+        raise Exception("ffprobe 探测失败")
+
+    monkeypatch.setattr(media_probe, "run_ffprobe", run_ffprobe)
+    probe = MediaProbe(str(tmp_path / "cache"))
+    assert probe.probe(str(video_file), timeout=INTERACTIVE_PROBE_TIMEOUT) is None
+    assert probe.get_duration(str(video_file)) is None
+    assert timeouts == [INTERACTIVE_PROBE_TIMEOUT, DEFAULT_PROBE_TIMEOUT]
+    assert probe.probe(str(tmp_path / "missing.mp4")) is None
+    probe.close()
+
+
+def test_probe_many_deduplicates_paths(tmp_path, video_file, fake_ffprobe):
+    probe = MediaProbe(str(tmp_path / "cache"))
+    missing = str(tmp_path / "missing.mp4")
+    results = probe.probe_many([str(video_file), missing, str(video_file)])
+    assert list(results) == [str(video_file), missing]
+    assert results[missing] is None
+    assert len(fake_ffprobe) == 1
+    probe.close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""render_planner 单元测试"""
+
+import os
+
+import pytest
+
+from render_planner import (BURN_SUBTITLE_FILENAME, HARD_SUBTITLE_MODE, NO_SUBTITLE_MODE, ass_force_style,
+                            build_render_command, cleanup_subtitles, conversion_languages, prepare_subtitles)
+
+SOFT_SUBTITLE_MODE = "软字幕（可选择）"
+
+
+@pytest.fixture
+def subtitle_files(tmp_path):
+    paths = []
+    for name in ("original.srt", "converted.srt"):
+        path = tmp_path / name
+        path.write_text("1\n00:00:00,000 --> 00:00:01,000\nhello\n", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def _value(cmd, option):
+    return cmd[cmd.index(option) + 1]
+
+
+def test_no_subtitles_copies_video_and_uses_shortest():
+    cmd, work_dir = build_render_command("video.mp4", "out.mp4", audio_file="mix.wav", duration=12.5)
+    assert work_dir is None
+    assert cmd[:5] == ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+    assert _value(cmd, "-c:v") == "copy"
+    assert "-vf" not in cmd and "-crf" not in cmd
+    assert "-shortest" in cmd and "-t" not in cmd
+    assert [os.path.isabs(path) for path in (cmd[cmd.index("-i") + 1], cmd[-1])] == [True, True]
+
+
+def test_pipe_input_reads_s16le_from_stdin():
+    cmd, _ = build_render_command("video.mp4", "out.mp4", pipe_format=(44100, 2))
+    pipe_args = cmd[cmd.index("-f"):cmd.index("pipe:0") + 1]
+    assert pipe_args == ["-f", "s16le", "-ar", "44100", "-ac", "2", "-i", "pipe:0"]
+    assert cmd[cmd.index("-map"):cmd.index("-map") + 4] == ["-map", "0:v:0", "-map", "1:a:0"]
+
+
+def test_soft_subtitles_map_mov_text_tracks_and_limit_duration(subtitle_files):
+    subtitles = prepare_subtitles([(subtitle_files[0], "eng"), (subtitle_files[1], "chi")], SOFT_SUBTITLE_MODE)
+    cmd, work_dir = build_render_command("video.mp4", "out.mp4", audio_file="mix.wav", subtitles=subtitles,
+                                         duration=12.5, crf=18, preset="slow")
+    assert work_dir is None
+    inputs = [cmd[index + 1] for index, arg in enumerate(cmd) if arg == "-i"]
+    assert inputs[2:] == subtitle_files
+    maps = [cmd[index + 1] for index, arg in enumerate(cmd) if arg == "-map"]
+    assert maps == ["0:v:0", "1:a:0", "2:s:0", "3:s:0"]
+    assert _value(cmd, "-c:s") == "mov_text"
+    assert _value(cmd, "-metadata:s:s:0") == "language=eng"
+    assert _value(cmd, "-metadata:s:s:1") == "language=chi"
+    assert _value(cmd, "-disposition:s:0") == "default"
+    # 软字幕不重新编码视频，crf/preset 不生效
+    assert _value(cmd, "-c:v") == "copy"
+    assert "-crf" not in cmd and "-preset" not in cmd
+    # -shortest 会在最后一条字幕处截断，改用总时长
+    assert "-shortest" not in cmd
+    assert _value(cmd, "-t") == "12.500"
+
+
+def test_hard_subtitles_burn_in_work_dir_with_force_style(subtitle_files):
+    style = {"font_family": "Arial", "font_size": 24, "font_color": "#FF8000", "position": "顶部居中"}
+    subtitles = prepare_subtitles([(subtitle_files[1], "chi")], HARD_SUBTITLE_MODE, style)
+    try:
+        cmd, work_dir = build_render_command("video.mp4", "out.mp4", pipe_format=(48000, 2), subtitles=subtitles,
+                                             duration=12.5, crf=20, preset="medium")
+        assert work_dir == subtitles['work_dir']
+        assert os.path.exists(os.path.join(work_dir, BURN_SUBTITLE_FILENAME))
+        assert _value(cmd, "-vf") == ("subtitles=subtitles.srt:force_style="
+                                      "'FontName=Arial,FontSize=24,PrimaryColour=&H000080FF,Alignment=6'")
+        assert _value(cmd, "-c:v") == "libx264"
+        assert _value(cmd, "-crf") == "20"
+        assert _value(cmd, "-preset") == "medium"
+        assert "-c:s" not in cmd
+        assert "-shortest" in cmd
+        # 在字幕工作目录中运行，其余路径必须是绝对路径
+        assert os.path.isabs(cmd[-1]) and os.path.isabs(_value(cmd, "-i"))
+    finally:
+        cleanup_subtitles(subtitles)
+    assert not os.path.exists(work_dir)
+
+
+def test_hard_subtitles_without_style_or_quality(subtitle_files):
+    subtitles = prepare_subtitles([(subtitle_files[0], "eng")], HARD_SUBTITLE_MODE)
+    try:
+        cmd, _ = build_render_command("video.mp4", "out.mp4", audio_file="mix.wav", subtitles=subtitles)
+        assert _value(cmd, "-vf") == "subtitles=subtitles.srt"
+        assert "-crf" not in cmd and "-preset" not in cmd
+    finally:
+        cleanup_subtitles(subtitles)
+
+
+def test_prepare_subtitles_skips_missing_and_disabled(subtitle_files, tmp_path):
+    assert prepare_subtitles([(subtitle_files[0], "eng")], NO_SUBTITLE_MODE) is None
+    assert prepare_subtitles([(str(tmp_path / "missing.srt"), "eng")], SOFT_SUBTITLE_MODE) is None
+    empty = tmp_path / "empty.srt"
+    empty.write_text("", encoding="utf-8")
+    assert prepare_subtitles([(str(empty), "eng")], SOFT_SUBTITLE_MODE) is None
+
+
+def test_force_style_strips_quotes_and_uses_legacy_alignment():
+    assert ass_force_style(None) == ""
+    assert ass_force_style({"font_family": "Bob's Font", "position": "中部居中", "outline_width": 2}) == \
+        "FontName=Bobs Font,Outline=2,Alignment=10"
+
+
+@pytest.mark.parametrize("conversion_type, expected", [
+    ("中文转英文", ("chi", "eng")),
+    ("英文转中文", ("eng", "chi")),
+    ("英文转英文", ("eng", "eng")),
+    ("智能转换", ("und", "und")),
+])
+def test_conversion_languages(conversion_type, expected):
+    assert conversion_languages(conversion_type) == expected
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""speech_rate_model 单元测试"""
+
+import math
+import sqlite3
+
+import numpy as np
+import pytest
+
+import speech_rate_model
+from speech_rate_model import DEFAULT_BETA, DEFAULT_UNITS_PER_SECOND, SpeechRateModel, count_speech_units
+
+VOICE = "xiaoyan"
+TEXT = "今天天气很好"  # 6 个汉字
+
+
+@pytest.fixture
+def model(tmp_path):
+    model = SpeechRateModel(str(tmp_path))
+    yield model
+    model.close()
+
+
+def _observe_true_model(model, alpha, beta, speeds, voice_type=VOICE, noise=0.0):
+    """按 log(每字时长) = alpha + beta * 语速 生成观测"""
+    rng = np.random.default_rng(0)
+    for speed in speeds:
+        duration = len(TEXT) * math.exp(alpha + beta * speed) * (1 + noise * rng.standard_normal())
+        model.observe(TEXT, voice_type, speed, duration)
+
+
+def test_count_speech_units():
+    assert count_speech_units("你好，世界！") == 4
+    assert count_speech_units("Hello, 2024 world") == 14
+    assert count_speech_units("中文 and English") == 2 + 10
+    assert count_speech_units("……") == 0
+
+
+@pytest.mark.parametrize("voice_type, language", [("xiaoyan", "zh"), ("x4_EnUs_Laura_education", "en")])
+def test_default_model_before_any_observation(model, voice_type, language):
+    units_per_second = DEFAULT_UNITS_PER_SECOND[language]
+    assert model.predict_duration("今天天气很好" if language == "zh" else "hello", voice_type, 50) == \
+        pytest.approx((6 if language == "zh" else 5) / units_per_second)
+    # 语速提高50，时长减半
+    assert model.predict_duration(TEXT, voice_type, 100) == \
+        pytest.approx(model.predict_duration(TEXT, voice_type, 50) / 2)
+    assert model.predict_duration("！？", voice_type, 50) is None
+
+
+def test_fit_recovers_alpha_and_beta(model):
+    alpha, beta = -1.2, -0.015
+    _observe_true_model(model, alpha, beta, range(30, 90, 2), noise=0.01)
+    model.refit()
+    params = model.get_model()[VOICE]
+    assert params["samples"] == 30
+    assert params["beta"] == pytest.approx(beta, rel=0.1)
+    assert model.predict_duration(TEXT, VOICE, 60) == pytest.approx(len(TEXT) * math.exp(alpha + beta * 60),
+                                                                    rel=0.02)
+
+
+def test_fit_with_few_samples_uses_default_beta(model):
+    _observe_true_model(model, -1.0, -0.03, [40, 60, 80])
+    model.refit()
+    params = model.get_model()[VOICE]
+    assert params["beta"] == DEFAULT_BETA
+    assert params["samples"] == 3
+
+
+def test_fit_clamps_beta_to_range(model):
+    # 数据显示语速越高越慢，拟合结果仍限制在合理范围内
+    _observe_true_model(model, -2.0, 0.01, range(20, 100, 5))
+    model.refit()
+    assert model.get_model()[VOICE]["beta"] == SpeechRateModel.BETA_RANGE[1]
+
+
+def test_observe_ignores_empty_text_and_durations(model):
+    model.observe("！？", VOICE, 50, 1.0)
+    model.observe(TEXT, VOICE, 50, 0.0)
+    assert model.get_model() == {}
+
+
+def test_accuracy_report_compares_prediction_with_duration(model):
+    default_duration = model.predict_duration(TEXT, VOICE, 50)
+    model.observe(TEXT, VOICE, 50, default_duration)
+    model.observe(TEXT, VOICE, 50, default_duration / 0.8)
+    stats = model.get_accuracy_stats()[VOICE]
+    assert stats["samples"] == 2
+    assert stats["mean_abs_error_pct"] == pytest.approx(10.0)
+    assert stats["median_abs_error_pct"] == pytest.approx(10.0)
+    assert stats["within_10pct"] == pytest.approx(0.5)
+
+
+def test_job_keeps_parameters_fixed_until_next_job(model):
+    with model.job():
+        before = model.predict_duration(TEXT, VOICE, 50)
+        _observe_true_model(model, -0.5, DEFAULT_BETA, [50] * 10)
+        assert model.predict_duration(TEXT, VOICE, 50) == before
+        # 并发任务进行中开始的任务也不重新拟合
+        with model.job():
+            assert model.predict_duration(TEXT, VOICE, 50) == before
+    with model.job():
+        expected = len(TEXT) * math.exp(-0.5 + DEFAULT_BETA * 50)
+        assert model.predict_duration(TEXT, VOICE, 50) == pytest.approx(expected)
+
+
+def test_speed_choice_is_kept_until_it_expires(model, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(speech_rate_model.time, "time", lambda: now[0])
+    assert model.get_speed_choice(TEXT, VOICE, 50, 1.2) is None
+    assert model.remember_speed_choice(TEXT, VOICE, 50, 1.2, 60) == 60
+    # 先写入的记录优先，其他可用时长的记录互不影响
+    assert model.remember_speed_choice(TEXT, VOICE, 50, 1.2, 70) == 60
+    assert model.get_speed_choice(TEXT, VOICE, 50, 1.3) is None
+
+    now[0] += SpeechRateModel.SPEED_CHOICE_MAX_AGE + 1
+    assert model.get_speed_choice(TEXT, VOICE, 50, 1.2) is None
+    assert model.remember_speed_choice(TEXT, VOICE, 50, 1.2, 70) == 70
+
+
+def test_uncalibrated_choice_is_replaced_after_calibration(model):
+    model.remember_speed_choice(TEXT, VOICE, 50, 1.2, 60)
+    _observe_true_model(model, -1.0, DEFAULT_BETA, range(40, 40 + SpeechRateModel.MIN_FIT_SAMPLES))
+    assert model.get_speed_choice(TEXT, VOICE, 50, 1.2) == 60
+
+    model.refit()
+    assert model.get_speed_choice(TEXT, VOICE, 50, 1.2) is None
+    assert model.remember_speed_choice(TEXT, VOICE, 50, 1.2, 55) == 55
+    # 校准后的选择在模型继续更新时保持不变
+    _observe_true_model(model, -1.0, DEFAULT_BETA, [50, 60])
+    model.refit()
+    assert model.get_speed_choice(TEXT, VOICE, 50, 1.2) == 55
+
+
+def test_old_speed_choice_table_is_migrated_and_purged(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / SpeechRateModel.DB_FILENAME))
+    conn.execute("CREATE TABLE speed_choices (key TEXT PRIMARY KEY, voice TEXT NOT NULL, "
+                 "base_speed INTEGER NOT NULL, slot_ms INTEGER NOT NULL, speed INTEGER NOT NULL, "
+                 "created_at REAL NOT NULL)")
+    conn.execute("INSERT INTO speed_choices VALUES ('expired', ?, 50, 1200, 60, 0)", (VOICE,))
+    key = SpeechRateModel._speed_choice_key(TEXT, VOICE, 50, 1.2)
+    conn.execute("INSERT INTO speed_choices VALUES (?, ?, 50, 1200, 60, strftime('%s', 'now'))", (key, VOICE))
+    conn.commit()
+    conn.close()
+
+    model = SpeechRateModel(str(tmp_path))
+    try:
+        assert model.get_speed_choice(TEXT, VOICE, 50, 1.2) == 60
+        keys = [row[0] for row in model._conn.execute("SELECT key FROM speed_choices")]
+        assert keys == [key]
+    finally:
+        model.close()
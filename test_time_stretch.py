@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""time_stretch 单元测试"""
+
+import numpy as np
+import pytest
+
+from time_stretch import build_atempo_filters, wsola_stretch
+
+SAMPLE_RATE = 16000
+
+
+def _sine(frequency, duration, sample_rate=SAMPLE_RATE):
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    return np.round(np.sin(2 * np.pi * frequency * t) * 12000).astype(np.int16)
+
+
+def _dominant_frequency(samples, sample_rate=SAMPLE_RATE):
+    x = np.asarray(samples, dtype=np.float64) * np.hanning(len(samples))
+    spectrum = np.abs(np.fft.rfft(x))
+    return np.fft.rfftfreq(len(x), 1.0 / sample_rate)[int(np.argmax(spectrum))]
+
+
+@pytest.mark.parametrize("length", [1, 511, 16000, 37123])
+@pytest.mark.parametrize("speed", [0.5, 0.7, 1.3, 1.8, 2.5])
+def test_wsola_output_length_is_exact(length, speed):
+    samples = np.random.default_rng(length).integers(-8000, 8000, length).astype(np.int16)
+    stretched = wsola_stretch(samples, speed, SAMPLE_RATE)
+    assert stretched.dtype == np.int16
+    assert len(stretched) == int(round(length / speed))
+
+
+@pytest.mark.parametrize("speed", [0.7, 1.3, 1.8])
+@pytest.mark.parametrize("frequency", [220.0, 440.0, 1000.0])
+def test_wsola_preserves_pitch(frequency, speed):
+    stretched = wsola_stretch(_sine(frequency, 2.0), speed, SAMPLE_RATE)
+    # 去掉首尾半帧的边界效应；频率分辨率约 0.5Hz，允许 2%
+    trimmed = stretched[512:-512]
+    assert _dominant_frequency(trimmed) == pytest.approx(frequency, rel=0.02)
+
+
+def test_wsola_identity_and_empty_input():
+    samples = _sine(440.0, 0.5)
+    assert np.array_equal(wsola_stretch(samples, 1.0, SAMPLE_RATE), samples)
+    assert len(wsola_stretch(np.zeros(0, dtype=np.int16), 1.5, SAMPLE_RATE)) == 0
+
+
+def test_wsola_keeps_level_within_int16():
+    samples = np.full(8000, 32767, dtype=np.int16)
+    stretched = wsola_stretch(samples, 1.5, SAMPLE_RATE)
+    assert stretched.max() <= 32767
+    assert stretched.min() >= -32768
+
+
+@pytest.mark.parametrize("tempo, expected", [
+    (1.5, ["atempo=1.500000"]),
+    (3.0, ["atempo=2.0", "atempo=1.500000"]),
+    (0.3, ["atempo=0.5", "atempo=0.600000"]),
+])
+def test_build_atempo_filters_chains_within_range(tempo, expected):
+    assert build_atempo_filters(tempo) == expected
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""timeline_planner 单元测试"""
+
+import pytest
+
+from timeline_planner import DEFAULT_MIN_GAP, compute_slots, plan_target_duration, plan_timeline
+
+
+def test_slot_extends_to_next_cue_minus_gap():
+    segments = [("a", 0.0, 1.0), ("b", 2.0, 3.0), ("c", 5.0, 6.0)]
+    slots = compute_slots(segments, total_duration=10.0)
+    assert slots[0] == pytest.approx(2.0 - DEFAULT_MIN_GAP)
+    assert slots[1] == pytest.approx(3.0 - DEFAULT_MIN_GAP)
+
+
+def test_last_slot_runs_to_total_duration():
+    segments = [("a", 0.0, 1.0), ("b", 2.0, 3.0)]
+    assert compute_slots(segments, total_duration=10.0)[-1] == pytest.approx(8.0)
+
+
+def test_last_slot_without_total_duration_is_cue_length():
+    segments = [("a", 0.0, 1.0), ("b", 2.0, 3.5)]
+    assert compute_slots(segments)[-1] == pytest.approx(1.5)
+
+
+def test_last_slot_never_shorter_than_cue():
+    # 视频时长比最后一条字幕还短时，至少保留字幕本身的时长
+    assert compute_slots([("a", 0.0, 5.0)], total_duration=3.0) == [pytest.approx(5.0)]
+
+
+def test_overlapping_cues_keep_their_own_length():
+    segments = [("a", 0.0, 3.0), ("b", 1.0, 2.0)]
+    slots = compute_slots(segments, total_duration=10.0)
+    assert slots[0] == pytest.approx(3.0)
+    assert slots[1] == pytest.approx(9.0)
+
+
+def test_zero_length_cue_close_to_next_gets_empty_slot():
+    segments = [("a", 5.0, 5.0), ("b", 5.02, 6.0)]
+    assert compute_slots(segments, total_duration=10.0)[0] == 0.0
+
+
+def test_custom_min_gap():
+    segments = [("a", 0.0, 1.0), ("b", 2.0, 3.0)]
+    assert compute_slots(segments, total_duration=3.0, min_gap=0.5)[0] == pytest.approx(1.5)
+
+
+def test_empty_timeline():
+    assert compute_slots([]) == []
+    plan, stats = plan_timeline([], [])
+    assert plan == []
+    assert stats == {"segments": 0, "stretched": 0, "max_ratio": 1.0}
+
+
+@pytest.mark.parametrize("raw_duration, slot_duration, expected", [
+    (1.0, 2.0, 1.0),   # 放得下：保持原时长
+    (2.0, 2.0, 2.0),   # 恰好填满
+    (3.0, 2.0, 2.0),   # 超出：压缩到可用时长
+    (3.0, 0.0, 3.0),   # 可用时长为0：不变速
+])
+def test_plan_target_duration(raw_duration, slot_duration, expected):
+    assert plan_target_duration(raw_duration, slot_duration) == pytest.approx(expected)
+
+
+def test_plan_timeline_only_stretches_overflowing_cues():
+    segments = [("a", 0.0, 1.0), ("b", 2.0, 3.0), ("c", 4.0, 5.0)]
+    plan, stats = plan_timeline(segments, [1.5, None, 4.0], total_duration=6.0)
+
+    assert plan[0] == (pytest.approx(1.5), pytest.approx(1.0))
+    # 未合成的字幕按可用时长占位，不变速
+    assert plan[1] == (pytest.approx(2.0 - DEFAULT_MIN_GAP), 1.0)
+    # 最后一条可用到视频结束（2秒），4秒的音频需要2倍速
+    assert plan[2] == (pytest.approx(2.0), pytest.approx(2.0))
+    assert stats == {"segments": 3, "stretched": 1, "max_ratio": pytest.approx(2.0)}
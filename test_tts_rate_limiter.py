@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""tts_rate_limiter 单元测试"""
+
+import asyncio
+import threading
+
+import pytest
+
+import tts_rate_limiter
+from tts_rate_limiter import THROTTLE_ERROR_CODES, AdaptiveRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic，令牌补充结果与机器速度无关"""
+    now = [1000.0]
+    monkeypatch.setattr(tts_rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_success_increases_rate_and_concurrency_additively():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0, initial_concurrency=2)
+    assert limiter.try_acquire()
+    limiter.release(success=True)
+    stats = limiter.get_stats()
+    assert stats["rate"] == pytest.approx(4.25)
+    assert stats["concurrency_limit"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["success_count"] == 1
+
+    # 每次增加 1/当前值：2 -> 2.5 -> 2.9 -> 3.24
+    limiter.release(success=True)
+    assert limiter.get_stats()["concurrency_limit"] == 2
+    limiter.release(success=True)
+    assert limiter.get_stats()["concurrency_limit"] == 3
+
+
+def test_increase_is_capped_by_max_rate():
+    limiter = AdaptiveRateLimiter(initial_rate=9.9, max_rate=10.0)
+    for _ in range(5):
+        limiter.release(success=True)
+    assert limiter.current_rate == 10.0
+
+
+@pytest.mark.parametrize("error_code", [11202, 11203])
+def test_throttle_codes_halve_rate_and_concurrency(error_code):
+    assert error_code in THROTTLE_ERROR_CODES
+    limiter = AdaptiveRateLimiter(initial_rate=8.0, initial_concurrency=8)
+    assert limiter.try_acquire()
+    limiter.release(success=False, error_code=error_code)
+    stats = limiter.get_stats()
+    assert stats["rate"] == pytest.approx(4.0)
+    assert stats["concurrency_limit"] == 4
+    assert stats["throttle_count"] == 1
+    # 退避后清空令牌，下一个请求必须等待补充
+    assert not limiter.try_acquire()
+
+
+def test_decrease_is_floored_at_minimum():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, min_rate=0.5, initial_concurrency=1)
+    for _ in range(5):
+        limiter.release(success=False, error_code=11202)
+    stats = limiter.get_stats()
+    assert stats["rate"] == 0.5
+    assert stats["concurrency_limit"] == 1
+
+
+def test_other_failures_leave_rate_unchanged():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0)
+    limiter.release(success=False, error_code=10005)
+    limiter.release(success=False)
+    stats = limiter.get_stats()
+    assert stats["rate"] == 4.0
+    assert stats["success_count"] == stats["throttle_count"] == 0
+
+
+def test_token_bucket_refills_at_current_rate(clock):
+    limiter = AdaptiveRateLimiter(initial_rate=2.0, initial_concurrency=10)
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    clock[0] += 0.25
+    assert not limiter.try_acquire()
+    clock[0] += 0.25
+    assert limiter.try_acquire()
+
+    # 长时间空闲后最多积累 rate 个令牌
+    clock[0] += 60.0
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_concurrency_limit_blocks_until_release(clock):
+    limiter = AdaptiveRateLimiter(initial_rate=10.0, initial_concurrency=1)
+    assert limiter.try_acquire()
+    clock[0] += 10.0
+    assert not limiter.try_acquire()
+    limiter.release(success=False)
+    assert limiter.try_acquire()
+
+
+def test_set_max_rate_clamps_and_restores():
+    limiter = AdaptiveRateLimiter(initial_rate=8.0, max_rate=50.0)
+    limiter.set_max_rate(2.0)
+    assert limiter.current_rate == 2.0
+    limiter.release(success=True)
+    assert limiter.current_rate == 2.0
+
+    # 恢复上限后速率不会跳回原值，而是随成功请求逐步增加
+    limiter.set_max_rate(50.0)
+    assert limiter.current_rate == 2.0
+    limiter.release(success=True)
+    assert limiter.current_rate == pytest.approx(2.5)
+
+    # 上限不低于最小速率
+    limiter.set_max_rate(0.0)
+    assert limiter.max_rate == limiter.min_rate
+
+
+def test_acquire_times_out_and_reports_queue_depth():
+    limiter = AdaptiveRateLimiter(initial_rate=0.5, min_rate=0.5)
+    assert limiter.acquire(timeout=0.1)
+    assert not limiter.acquire(timeout=0.05)
+    assert limiter.queue_depth == 0
+
+
+def test_blocked_acquire_wakes_on_release():
+    limiter = AdaptiveRateLimiter(initial_rate=50.0, initial_concurrency=1)
+    assert limiter.acquire(timeout=1)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(limiter.acquire(timeout=5)))
+    waiter.start()
+    limiter.release(success=True)
+    waiter.join(timeout=5)
+    assert results == [True]
+
+
+def test_acquire_async():
+    limiter = AdaptiveRateLimiter(initial_rate=0.5, min_rate=0.5)
+
+    async def acquire_twice():
+        return await limiter.acquire_async(timeout=0.1), await limiter.acquire_async(timeout=0.05)
+
+    assert asyncio.run(acquire_twice()) == (True, False)
+    assert limiter.get_stats()["in_flight"] == 1
+    assert limiter.queue_depth == 0
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""unified_speech_synthesis 单元测试（不访问讯飞接口）"""
+
+import threading
+
+import numpy as np
+import pytest
+
+import unified_speech_synthesis
+from unified_speech_synthesis import SingleFlight, UnifiedSpeechSynthesis
+
+
+def test_single_flight_first_caller_leads_and_followers_share_result():
+    single_flight = SingleFlight()
+    future, is_leader = single_flight.begin("key")
+    followers = [single_flight.begin("key") for _ in range(3)]
+    assert is_leader
+    assert all(not follower_is_leader and follower is future for follower, follower_is_leader in followers)
+    assert single_flight.coalesced_count == 3
+    assert single_flight.in_flight_count == 1
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(followers[0][0].result(timeout=5)))
+    waiter.start()
+    single_flight.finish("key", future, result="audio")
+    waiter.join(timeout=5)
+    assert results == ["audio"]
+
+
+def test_single_flight_propagates_exceptions():
+    single_flight = SingleFlight()
+    future, _ = single_flight.begin("key")
+    follower, _ = single_flight.begin("key")
+    single_flight.finish("key", future, error=ValueError("boom"))
+    with pytest.raises(ValueError, match="boom"):
+        follower.result(timeout=1)
+
+
+def test_single_flight_releases_key_after_finish():
+    single_flight = SingleFlight()
+    future, _ = single_flight.begin("key")
+    other, other_is_leader = single_flight.begin("other")
+    assert other_is_leader and other is not future
+    single_flight.finish("key", future, result=None)
+    assert single_flight.in_flight_count == 1
+
+    # 完成后的同一键值重新由新的 leader 执行
+    next_future, is_leader = single_flight.begin("key")
+    assert is_leader and next_future is not future
+
+
+def _offline_synthesis(monkeypatch, cached_results, requests):
+    """不读取配置、不访问网络的合成实例：缓存读取按 cached_results 依次返回"""
+    synthesis = object.__new__(UnifiedSpeechSynthesis)
+    synthesis.speech_rate_model = None
+    synthesis.tts_audio_format = "raw"
+    lookups = iter(cached_results)
+    monkeypatch.setattr(synthesis, "_load_cached_pcm", lambda cache_key: next(lookups))
+
+    def request_pcm(*args):
+        requests.append(args)
+        return np.ones(10, dtype=np.int16)
+
+    monkeypatch.setattr(synthesis, "_request_pcm", request_pcm)
+    monkeypatch.setattr(unified_speech_synthesis, "_synthesis_single_flight", SingleFlight())
+    return synthesis
+
+
+def test_leader_rechecks_cache_before_calling_api(monkeypatch):
+    # 第一次查缓存未命中；成为 leader 时上一个 leader 已经写入缓存
+    cached = np.full(10, 7, dtype=np.int16)
+    requests = []
+    synthesis = _offline_synthesis(monkeypatch, [None, cached], requests)
+    samples = synthesis.synthesize_pcm("hello", "x4_EnUs_Laura_education")
+    assert requests == []
+    np.testing.assert_array_equal(samples, cached)
+    assert unified_speech_synthesis._synthesis_single_flight.in_flight_count == 0
+
+
+def test_leader_calls_api_on_cache_miss(monkeypatch):
+    requests = []
+    synthesis = _offline_synthesis(monkeypatch, [None, None], requests)
+    samples = synthesis.synthesize_pcm("hello", "x4_EnUs_Laura_education")
+    assert len(requests) == 1
+    assert len(samples) == 10
+
+
+def test_quality_presets_request_full_tts_sample_rate():
+    synthesis = object.__new__(UnifiedSpeechSynthesis)
+    for quality in ("标准质量", "高质量", "超清质量"):
+        assert synthesis._get_quality_settings(quality)["tts_sample_rate"] == 16000
+
+
+def test_cache_key_includes_tts_transport():
+    synthesis = object.__new__(UnifiedSpeechSynthesis)
+    synthesis.tts_audio_format = "raw"
+    raw_key = synthesis._get_cache_key("hello", "xiaoyan", 50, 50, "高质量")
+    assert raw_key == synthesis._get_cache_key("hello", "xiaoyan", 50, 50, "高质量")
+    assert raw_key != synthesis._get_cache_key("hello", "xiaoyan", 50, 50, "超清质量")
+    synthesis.tts_audio_format = "lame"
+    assert raw_key != synthesis._get_cache_key("hello", "xiaoyan", 50, 50, "高质量")
+
+
+class _RecordingLimiter:
+    def __init__(self, events):
+        self.events = events
+
+    def acquire(self, timeout=None):
+        self.events.append("acquire")
+        return True
+
+    def release(self, success=True, error_code=None):
+        self.events.append(("release", success))
+
+
+def test_url_is_signed_after_rate_limiter_wait():
+    # 签名URL带Date，排队等待限流名额期间不能提前生成
+    events = []
+    synthesis = object.__new__(UnifiedSpeechSynthesis)
+    synthesis.rate_limiter = _RecordingLimiter(events)
+
+    def create_session(*args):
+        events.append("sign")
+        raise RuntimeError("bad credentials")
+
+    synthesis._create_session = create_session
+    settings = synthesis._get_quality_settings("高质量")
+    assert synthesis._request_pcm("hello", "xiaoyan", 50, 50, "高质量", settings, "key") is None
+    assert events == ["acquire", "sign", ("release", False)]
+
+
+@pytest.mark.parametrize("stretch_engine", ["wsola", "atempo"])
+def test_synthesize_and_align_retries_failures_and_reports_each_segment(monkeypatch, stretch_engine):
+    synthesis = object.__new__(UnifiedSpeechSynthesis)
+    synthesis.stretch_engine = stretch_engine
+    synthesis.choose_speed = lambda text, voice_type, speed, slot: speed
+    monkeypatch.setattr(unified_speech_synthesis.time, "sleep", lambda seconds: None)
+    attempts = {}
+
+    def synthesize_pcm(text, voice_type, speed, volume, quality):
+        attempts[text] = attempts.get(text, 0) + 1
+        if text == "flaky" and attempts[text] == 1:
+            raise RuntimeError("network error")
+        if text == "broken":
+            return None
+        return np.ones(1600, dtype=np.int16)
+
+    synthesis.synthesize_pcm = synthesize_pcm
+    segments = [("ok", 0.0, 1.0), ("  ", 1.0, 2.0), ("flaky", 2.0, 3.0), ("broken", 3.0, 4.5)]
+    progress = []
+    results, raw_durations = synthesis._synthesize_and_align(
+        segments, [text for text, _, _ in segments], [1.0, 1.0, 1.0, 1.5], "xiaoyan", 50, 50, "高质量",
+        2, 2, 4, lambda: progress.append(1))
+
+    assert len(progress) == len(segments)
+    assert attempts == {"ok": 1, "flaky": 2, "broken": 4}
+    assert results[1] is None
+    assert [len(results[i]) for i in (0, 2, 3)] == [100, 100, 1500]
+    assert raw_durations == [pytest.approx(0.1), None, pytest.approx(0.1), None]
+
+
+def test_adaptive_speed_only_raises_speed_when_enabled(tmp_path):
+    from speech_rate_model import SpeechRateModel
+
+    synthesis = object.__new__(UnifiedSpeechSynthesis)
+    synthesis.speech_rate_model = SpeechRateModel(str(tmp_path))
+    try:
+        text = "这是一条需要在很短的时间内读完的很长的字幕"
+        synthesis.adaptive_speed = False
+        assert synthesis.choose_speed(text, "xiaoyan", 50, 1.0) == 50
+        synthesis.adaptive_speed = True
+        boosted = synthesis.choose_speed(text, "xiaoyan", 50, 1.0)
+        assert 50 < boosted <= 50 + synthesis.MAX_SPEED_BOOST
+    finally:
+        synthesis.speech_rate_model.close()
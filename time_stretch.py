@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+音频变速（时间伸缩）模块
+在内存中对 int16 单声道PCM做保持音调的变速，提供三种实现：
+- wsola: NumPy 实现的WSOLA，相关性搜索和重叠相加均为向量化运算（默认）
+- audiotsm: audiotsm 库的纯Python WSOLA（可选依赖）
+- atempo: 通过管道调用 ffmpeg atempo 滤镜
+
+speed 为播放速度倍率：大于1加速（变短），小于1减速（变长）。
+StretchProcessPool 在独立进程池中执行变速，绕开GIL，输入输出通过共享内存传递。
+
+基准测试:
+    python time_stretch.py
+"""
+
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from audio_io import SYNTHESIS_SAMPLE_RATE, pcm_bytes_to_array
+
+# 可选依赖：audiotsm（用于对比和兼容旧行为）。若缺失，则不提供该实现。
+try:
+    import audiotsm
+    _HAS_AUDIOTSM = True
+except Exception:
+    audiotsm = None
+    _HAS_AUDIOTSM = False
+
+DEFAULT_STRETCH_ENGINE = "wsola"
+
+
+def _to_int16(samples):
+    return np.clip(np.round(samples), -32768, 32767).astype(np.int16)
+
+
+def wsola_stretch(samples, speed, sample_rate=SYNTHESIS_SAMPLE_RATE, frame_length=None, tolerance=None):
+    """
+    NumPy WSOLA变速
+
+    每一帧在名义位置附近 ±tolerance 范围内寻找与上一帧自然延续最相似的位置，
+    再用汉宁窗重叠相加。相关性由 np.correlate 一次算出，重叠相加整体向量化完成。
+    输出长度严格等于 round(len(samples) / speed)。
+
+    Args:
+        samples: int16 单声道 PCM 数组（可为只读内存映射）
+        speed: 播放速度倍率
+        frame_length: 帧长（采样点），默认约32ms
+        tolerance: 搜索范围（采样点），默认帧长的1/4
+    """
+    x = np.asarray(samples, dtype=np.float32)
+    if speed <= 0 or len(x) == 0 or speed == 1.0:
+        return np.array(samples, dtype=np.int16)
+
+    if frame_length is None:
+        frame_length = 1 << int(round(np.log2(sample_rate * 0.032)))
+    frame_length -= frame_length % 2
+    synthesis_hop = frame_length // 2
+    tolerance = frame_length // 4 if tolerance is None else tolerance
+    analysis_hop = synthesis_hop * speed
+
+    output_length = int(round(len(x) / speed))
+    num_frames = max(1, int(np.ceil(output_length / synthesis_hop)) + 1)
+    nominal = np.round(np.arange(num_frames) * analysis_hop).astype(np.int64)
+
+    # 前端填充 tolerance 个零，后端留足搜索窗口与自然延续所需的长度
+    padded_length = int(nominal[-1]) + 2 * tolerance + synthesis_hop + frame_length + 1
+    x_pad = np.zeros(max(padded_length, len(x) + tolerance), dtype=np.float32)
+    x_pad[tolerance:tolerance + len(x)] = x
+
+    # 逐帧搜索最佳偏移（依赖上一帧的选择，相关计算本身在C层完成）
+    starts = np.empty(num_frames, dtype=np.int64)
+    starts[0] = tolerance
+    search_length = frame_length + 2 * tolerance
+    for k in range(1, num_frames):
+        continuation = starts[k - 1] + synthesis_hop
+        reference = x_pad[continuation:continuation + frame_length]
+        region = x_pad[nominal[k]:nominal[k] + search_length]
+        correlation = np.correlate(region, reference, mode="valid")
+        starts[k] = nominal[k] + int(np.argmax(correlation))
+
+    # 向量化重叠相加：帧移为半帧，前半帧与后半帧分别累加
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_length) / frame_length)).astype(np.float32)
+    frames = x_pad[starts[:, None] + np.arange(frame_length)] * window
+    output = np.zeros((num_frames + 1) * synthesis_hop, dtype=np.float32)
+    weights = np.zeros_like(output)
+    output[:num_frames * synthesis_hop] += frames[:, :synthesis_hop].reshape(-1)
+    output[synthesis_hop:] += frames[:, synthesis_hop:].reshape(-1)
+    weights[:num_frames * synthesis_hop] += np.tile(window[:synthesis_hop], num_frames)
+    weights[synthesis_hop:] += np.tile(window[synthesis_hop:], num_frames)
+    output = np.where(weights > 1e-3, output / np.maximum(weights, 1e-3), 0.0)
+
+    return _to_int16(output[:output_length])
+
+
+def audiotsm_stretch(samples, speed, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """使用 audiotsm 的WSOLA变速（内存数组读写）"""
+    if not _HAS_AUDIOTSM:
+        raise RuntimeError("未安装 audiotsm 库")
+    from audiotsm.io.array import ArrayReader, ArrayWriter
+    reader = ArrayReader(np.asarray(samples, dtype=np.float32).reshape(1, -1) / 32768.0)
+    writer = ArrayWriter(channels=1)
+    audiotsm.wsola(1, speed=speed).run(reader, writer)
+    return _to_int16(writer.data[0] * 32768.0)
+
+
+def build_atempo_filters(tempo):
+    """将 tempo 分解为 0.5~2.0 范围的多个 atempo 级联"""
+    filters = []
+    if tempo <= 0:
+        tempo = 1.0
+    while tempo < 0.5:
+        filters.append('atempo=0.5')
+        tempo /= 0.5
+    while tempo > 2.0:
+        filters.append('atempo=2.0')
+        tempo /= 2.0
+    filters.append(f'atempo={tempo:.6f}')
+    return filters
+
+
+def atempo_stretch(samples, speed, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """通过管道调用 ffmpeg atempo 变速"""
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        '-filter:a', ','.join(build_atempo_filters(speed)),
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', 'pipe:1'
+    ]
+    result = subprocess.run(cmd, input=np.ascontiguousarray(samples, dtype=np.int16).tobytes(),
+                            capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg atempo 变速失败: {result.stderr.decode('utf-8', errors='replace')}")
+    return pcm_bytes_to_array(result.stdout)
+
+
+# 单次ffmpeg批量变速处理的最大片段数：每个分支都要遍历整批输入，批次过大反而变慢
+ATEMPO_BATCH_SIZE = 20
+
+
+def _atempo_stretch_batch_once(items, sample_rate):
+    """用一个ffmpeg进程完成一批片段的 atempo 变速"""
+    arrays = [np.ascontiguousarray(samples, dtype=np.int16) for samples, _ in items]
+    bounds = np.concatenate([[0], np.cumsum([len(array) for array in arrays])])
+    output_lengths = [max(1, int(round(len(array) / speed))) for array, (_, speed) in zip(arrays, items)]
+
+    # 所有片段拼接为一路输入，asplit 后各分支按采样点截取自己的片段，
+    # atempo 变速后补齐/截断到精确长度，再按顺序拼接输出，便于按长度切分结果
+    count = len(items)
+    graph = [f"[0:a]asplit={count}" + "".join(f"[s{i}]" for i in range(count))]
+    for i, (_, speed) in enumerate(items):
+        graph.append(
+            f"[s{i}]atrim=start_sample={bounds[i]}:end_sample={bounds[i + 1]},asetpts=PTS-STARTPTS,"
+            f"{','.join(build_atempo_filters(speed))},"
+            f"apad=whole_len={output_lengths[i]},atrim=end_sample={output_lengths[i]}[o{i}]"
+        )
+    graph.append("".join(f"[o{i}]" for i in range(count)) + f"concat=n={count}:v=0:a=1[out]")
+
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        '-filter_complex', ';'.join(graph), '-map', '[out]',
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', 'pipe:1'
+    ]
+    result = subprocess.run(cmd, input=b''.join(array.tobytes() for array in arrays), capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg 批量 atempo 变速失败: {result.stderr.decode('utf-8', errors='replace')}")
+
+    output = pcm_bytes_to_array(result.stdout)
+    expected_length = sum(output_lengths)
+    if len(output) < expected_length:
+        output = np.concatenate([output, np.zeros(expected_length - len(output), dtype=np.int16)])
+    offsets = np.cumsum([0] + output_lengths)
+    return [output[offsets[i]:offsets[i + 1]].copy() for i in range(count)]
+
+
+def atempo_stretch_batch(items, sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """
+    批量 atempo 变速：每 ATEMPO_BATCH_SIZE 个片段只启动一个ffmpeg进程
+
+    Args:
+        items: [(samples, speed), ...]
+
+    Returns:
+        list: 与 items 顺序一致的 int16 数组，长度为 round(len(samples) / speed)
+    """
+    results = []
+    for offset in range(0, len(items), ATEMPO_BATCH_SIZE):
+        results.extend(_atempo_stretch_batch_once(items[offset:offset + ATEMPO_BATCH_SIZE], sample_rate))
+    return results
+
+
+STRETCH_ENGINES = {
+    "wsola": wsola_stretch,
+    "audiotsm": audiotsm_stretch,
+    "atempo": atempo_stretch,
+}
+
+
+def time_stretch(samples, speed, sample_rate=SYNTHESIS_SAMPLE_RATE, engine=DEFAULT_STRETCH_ENGINE):
+    """使用指定实现变速，返回 int16 数组"""
+    if engine not in STRETCH_ENGINES:
+        raise ValueError(f"不支持的变速实现: {engine}")
+    return STRETCH_ENGINES[engine](samples, speed, sample_rate)
+
+
+def time_stretch_batch(items, sample_rate=SYNTHESIS_SAMPLE_RATE, engine=DEFAULT_STRETCH_ENGINE):
+    """批量变速，items 为 [(samples, speed), ...]；atempo 使用单个ffmpeg进程处理整批"""
+    if engine == "atempo":
+        return atempo_stretch_batch(items, sample_rate)
+    return [time_stretch(samples, speed, sample_rate, engine) for samples, speed in items]
+
+
+def _stretch_in_shared_memory(shm_name, input_length, output_capacity, speed, sample_rate, engine):
+    """进程池工作函数：从共享内存读取输入，变速后写回同一块共享内存
+
+    Returns:
+        (输出长度, None)；输出超出预留容量时返回 (输出长度, 输出数组)
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffer = np.ndarray(input_length + output_capacity, dtype=np.int16, buffer=shm.buf)
+    try:
+        output = time_stretch(buffer[:input_length], speed, sample_rate, engine)
+        if len(output) > output_capacity:
+            return len(output), output
+        buffer[input_length:input_length + len(output)] = output
+        return len(output), None
+    finally:
+        del buffer
+        shm.close()
+
+
+class StretchProcessPool:
+    """变速进程池
+
+    进程数默认等于CPU核数。每个任务使用一块共享内存：前半部分为输入PCM，后半部分预留给输出，
+    避免通过pickle在进程间复制音频数据。
+    子进程统一用 spawn 方式启动：调用方（界面、异步合成）持有多个线程和锁，fork 出的子进程可能继承已被占用的锁。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """丢弃已损坏的进程池，下次提交任务时重新创建"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def stretch(self, samples, speed, sample_rate=SYNTHESIS_SAMPLE_RATE, engine=DEFAULT_STRETCH_ENGINE):
+        """在进程池中变速，阻塞等待结果并返回 int16 数组；进程池损坏时抛出 BrokenProcessPool"""
+        samples = np.ascontiguousarray(samples, dtype=np.int16)
+        input_length = len(samples)
+        # wsola 输出长度精确为 round(n / speed)，其他实现留出余量
+        output_capacity = int(np.ceil(input_length / speed * 1.05)) + 4096
+        shm = shared_memory.SharedMemory(create=True, size=(input_length + output_capacity) * 2)
+        buffer = np.ndarray(input_length + output_capacity, dtype=np.int16, buffer=shm.buf)
+        try:
+            buffer[:input_length] = samples
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_stretch_in_shared_memory, shm.name, input_length,
+                                         output_capacity, speed, sample_rate, engine)
+                output_length, overflow = future.result()
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                raise
+            if overflow is not None:
+                return overflow
+            return buffer[input_length:input_length + output_length].copy()
+        finally:
+            # 释放对共享内存的引用后才能关闭
+            del buffer
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        """关闭进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_global_stretch_pool = None
+_global_stretch_pool_lock = threading.Lock()
+
+
+def get_stretch_pool(max_workers=None):
+    """获取进程内共享的变速进程池，首次调用时可指定进程数"""
+    global _global_stretch_pool
+    with _global_stretch_pool_lock:
+        if _global_stretch_pool is None:
+            _global_stretch_pool = StretchProcessPool(max_workers)
+        return _global_stretch_pool
+
+
+def benchmark_time_stretch(durations=(1.0, 3.0, 8.0), speeds=(0.7, 1.3, 1.8), repeats=3,
+                           sample_rate=SYNTHESIS_SAMPLE_RATE):
+    """
+    对比各变速实现的耗时和输出时长误差
+
+    使用带谐波和包络的合成信号，不可用的实现（未安装audiotsm/ffmpeg）会被跳过。
+
+    Returns:
+        list: [{"engine", "duration", "speed", "avg_seconds", "realtime_factor", "length_error_ms"}, ...]
+    """
+    rng = np.random.default_rng(0)
+    results = []
+    for duration in durations:
+        t = np.arange(int(duration * sample_rate)) / sample_rate
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+        signal = sum(np.sin(2 * np.pi * f * t) / (n + 1) for n, f in enumerate((180, 360, 540, 1200)))
+        samples = _to_int16((signal * envelope * 0.3 + rng.normal(0, 0.01, len(t))) * 32767)
+
+        for speed in speeds:
+            expected_length = len(samples) / speed
+            for engine, func in STRETCH_ENGINES.items():
+                elapsed = []
+                output = None
+                try:
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        output = func(samples, speed, sample_rate)
+                        elapsed.append(time.perf_counter() - start)
+                except Exception as e:
+                    print(f"⏭️ 跳过 {engine}: {e}")
+                    continue
+                avg_seconds = sum(elapsed) / len(elapsed)
+                results.append({
+                    "engine": engine,
+                    "duration": duration,
+                    "speed": speed,
+                    "avg_seconds": avg_seconds,
+                    "realtime_factor": duration / avg_seconds if avg_seconds > 0 else float("inf"),
+                    "length_error_ms": (len(output) - expected_length) / sample_rate * 1000
+                })
+
+    print(f"{'实现':<10}{'时长(s)':>8}{'倍率':>6}{'平均耗时(ms)':>14}{'实时倍数':>10}{'长度误差(ms)':>14}")
+    for row in results:
+        print(f"{row['engine']:<10}{row['duration']:>8.1f}{row['speed']:>6.1f}{row['avg_seconds']*1000:>14.2f}"
+              f"{row['realtime_factor']:>10.0f}{row['length_error_ms']:>14.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_time_stretch()
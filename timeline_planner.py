@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+时间轴规划模块
+根据整条字幕时间轴计算每条字幕可用的最大时长（到下一条字幕开始之前），
+合成音频放得下时保持原速，只有超出可用时长时才压缩到恰好填满，避免不必要的变速。
+"""
+
+# 与下一条字幕之间保留的最小间隔（秒），避免两段语音首尾相接
+DEFAULT_MIN_GAP = 0.05
+
+
+def compute_slots(segments, total_duration=None, min_gap=DEFAULT_MIN_GAP):
+    """
+    计算每条字幕可用的最大时长（秒）
+
+    可用时长为从本条开始到下一条开始（减去 min_gap），最后一条到视频结束；
+    字幕互相重叠或视频时长未知时，至少保留字幕本身的时长。
+
+    Args:
+        segments: [(text, start_time, end_time), ...]，按开始时间排序
+        total_duration: 视频总时长，None 表示未知
+    """
+    slots = []
+    for i, (_, start_time, end_time) in enumerate(segments):
+        subtitle_duration = max(0.0, end_time - start_time)
+        if i + 1 < len(segments):
+            limit = segments[i + 1][1] - min_gap
+        elif total_duration is not None:
+            limit = total_duration
+        else:
+            limit = end_time
+        slots.append(max(subtitle_duration, limit - start_time))
+    return slots
+
+
+def plan_target_duration(raw_duration, slot_duration):
+    """返回合成音频应对齐到的时长：放得下时为原始时长（无需变速），否则为可用时长"""
+    if slot_duration <= 0 or raw_duration <= slot_duration:
+        return raw_duration
+    return slot_duration
+
+
+def plan_timeline(segments, durations, total_duration=None, min_gap=DEFAULT_MIN_GAP):
+    """
+    对整条时间轴做规划
+
+    Args:
+        segments: [(text, start_time, end_time), ...]
+        durations: 每条字幕合成音频的原始时长（秒），未合成的为None
+
+    Returns:
+        (plan, stats)：plan 为 [(目标时长, 速度倍率), ...]，速度倍率为1表示无需变速；
+        stats 包含需要变速的条数和最大倍率
+    """
+    slots = compute_slots(segments, total_duration, min_gap)
+    plan = []
+    stretched = 0
+    max_ratio = 1.0
+    for raw_duration, slot_duration in zip(durations, slots):
+        if raw_duration is None:
+            plan.append((slot_duration, 1.0))
+            continue
+        target = plan_target_duration(raw_duration, slot_duration)
+        ratio = raw_duration / target if target > 0 else 1.0
+        if ratio > 1.0:
+            stretched += 1
+            max_ratio = max(max_ratio, ratio)
+        plan.append((target, ratio))
+    stats = {"segments": len(plan), "stretched": stretched, "max_ratio": max_ratio}
+    return plan, stats
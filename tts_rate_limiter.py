@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+讯飞TTS自适应限流模块
+进程内所有 UnifiedSpeechSynthesis 实例共享同一个限流器：
+令牌桶控制每秒请求数，AIMD（加性增、乘性减）控制并发数，
+请求成功时逐步提高速率，遇到流控错误码时立即减半。
+"""
+
+import threading
+import time
+
+# 讯飞流控相关错误码：日调用量超限 / 秒级流控超限 / 并发路数超限
+THROTTLE_ERROR_CODES = {11201, 11202, 11203}
+
+
+class AdaptiveRateLimiter:
+    """令牌桶 + AIMD 自适应限流器（线程安全）"""
+
+    def __init__(self, initial_rate=5.0, min_rate=0.5, max_rate=50.0,
+                 initial_concurrency=4, min_concurrency=1, max_concurrency=64,
+                 decrease_factor=0.5):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+
+        self._rate = float(initial_rate)
+        self._concurrency_limit = float(initial_concurrency)
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        self._success_count = 0
+        self._throttle_count = 0
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        """按当前速率补充令牌（调用方需持有锁）"""
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self._rate), self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def _try_acquire_locked(self):
+        """在持有锁的情况下尝试占用一个请求名额"""
+        self._refill()
+        if self._in_flight < int(self._concurrency_limit) and self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self._in_flight += 1
+            return True
+        return False
+
+    def _wait_hint_locked(self):
+        """估计下一次可能获取成功前需要等待的时间"""
+        if self._tokens >= 1.0:
+            return 0.05
+        return max(0.01, (1.0 - self._tokens) / self._rate)
+
+    def try_acquire(self):
+        """非阻塞地尝试获取请求名额，返回是否成功"""
+        with self._condition:
+            return self._try_acquire_locked()
+
+    def acquire(self, timeout=None):
+        """阻塞直到获取请求名额，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._try_acquire_locked():
+                    wait_time = self._wait_hint_locked()
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait_time = min(wait_time, remaining)
+                    self._condition.wait(wait_time)
+                return True
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self, timeout=None):
+        """acquire 的 asyncio 版本，等待期间不阻塞事件循环"""
+        import asyncio
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._waiting += 1
+        try:
+            while True:
+                with self._condition:
+                    if self._try_acquire_locked():
+                        return True
+                    wait_time = self._wait_hint_locked()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait_time = min(wait_time, remaining)
+                await asyncio.sleep(wait_time)
+        finally:
+            with self._condition:
+                self._waiting -= 1
+
+    def release(self, success=True, error_code=None):
+        """释放请求名额并根据结果调整速率
+
+        Args:
+            success: 请求是否成功
+            error_code: 讯飞返回的错误码，属于 THROTTLE_ERROR_CODES 时触发退避
+        """
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            if error_code in THROTTLE_ERROR_CODES:
+                # 乘性减：速率与并发数同时减半
+                self._throttle_count += 1
+                self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+                self._concurrency_limit = max(self.min_concurrency,
+                                              self._concurrency_limit * self.decrease_factor)
+                self._tokens = min(self._tokens, 0.0)
+                print(f"⚠️ 触发讯飞流控 (code: {error_code})，速率降至 {self._rate:.2f}/s，"
+                      f"并发上限降至 {int(self._concurrency_limit)}")
+            elif success:
+                # 加性增：每个成功请求增加 1/当前值，约每一轮增加 1
+                self._success_count += 1
+                self._rate = min(self.max_rate, self._rate + 1.0 / self._rate)
+                self._concurrency_limit = min(self.max_concurrency,
+                                              self._concurrency_limit + 1.0 / self._concurrency_limit)
+            self._condition.notify_all()
+
+    def set_max_rate(self, max_rate):
+        """修改速率上限，当前速率超过新上限时立即降到上限"""
+        with self._condition:
+            self.max_rate = max(self.min_rate, float(max_rate))
+            self._rate = min(self._rate, self.max_rate)
+            self._tokens = min(self._tokens, max(1.0, self._rate))
+            self._condition.notify_all()
+
+    @property
+    def current_rate(self):
+        """当前允许的每秒请求数"""
+        with self._condition:
+            return self._rate
+
+    @property
+    def queue_depth(self):
+        """正在等待名额的请求数"""
+        with self._condition:
+            return self._waiting
+
+    def get_stats(self):
+        """获取限流器状态"""
+        with self._condition:
+            return {
+                "rate": self._rate,
+                "concurrency_limit": int(self._concurrency_limit),
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "success_count": self._success_count,
+                "throttle_count": self._throttle_count
+            }
+
+
+_global_limiter = None
+_global_limiter_lock = threading.Lock()
+
+
+def get_tts_rate_limiter(**kwargs):
+    """获取进程内共享的TTS限流器，首次调用时可传入参数进行初始化"""
+    global _global_limiter
+    with _global_limiter_lock:
+        if _global_limiter is None:
+            _global_limiter = AdaptiveRateLimiter(**kwargs)
+        return _global_limiter
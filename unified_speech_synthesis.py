@@ -6,13 +6,16 @@
 解决了音调、衔接和代码重复问题
 """
 
+import asyncio
 import base64
+import contextlib
 import datetime
 import hashlib
 import hmac
 import json
 import os
 import ssl
+import subprocess
 import threading
 import time
 import urllib.parse
@@ -24,13 +27,13 @@ import requests
 import random
 from hashlib import md5
 import re
-# 可选依赖：audiotsm（用于高质量变速）。若缺失，则在运行时降级。
+# 可选依赖：websockets（用于asyncio异步合成客户端）。若缺失，则只能使用同步接口。
 try:
-    import audiotsm  # noqa: F401
-    _HAS_AUDIOTSM = True
+    import websockets
+    _HAS_WEBSOCKETS = True
 except Exception:
-    audiotsm = None
-    _HAS_AUDIOTSM = False
+    websockets = None
+    _HAS_WEBSOCKETS = False
 from pydub import AudioSegment
 # 可选依赖：moviepy（用于提取原音频）。若缺失，则在运行时降级为ffmpeg。
 try:
@@ -43,23 +46,202 @@ import numpy as np
 from wsgiref.handlers import format_date_time
 from time import mktime
 import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 from queue import Queue
+from audio_io import (SYNTHESIS_SAMPLE_RATE, StreamingMp3Decoder, audio_segment_to_pcm, decode_mp3_bytes,
+                      pcm_bytes_to_array, pcm_duration, pcm_to_audio_segment, read_wav_header, resample_pcm,
+                      write_wav_pcm)
+from tts_rate_limiter import get_tts_rate_limiter
+from audio_cache import DEFAULT_CACHE_MAX_BYTES, get_audio_cache
+from time_stretch import DEFAULT_STRETCH_ENGINE, STRETCH_ENGINES, get_stretch_pool, time_stretch, time_stretch_batch
+from timeline_planner import compute_slots, plan_target_duration, plan_timeline
+from speech_rate_model import get_speech_rate_model
+from media_probe import get_media_probe
+from render_planner import build_render_command
+from audio_mixer import (DUCKING_ATTACK_MS, DUCKING_RELEASE_MS, WavBackgroundReader, float_to_int16,
+                         iter_dubbing_chunks, mix_audio_segments, write_wav_chunks)
+
+
+class SingleFlight:
+    """
+    相同请求合并器
+    
+    同一键值同一时刻只有一个调用者（leader）真正执行请求，其余调用者等待同一个Future并共享结果。
+    Future 使用 concurrent.futures.Future，线程和 asyncio（asyncio.wrap_future）都可以等待。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.coalesced_count = 0
+    
+    def begin(self, key):
+        """登记一个请求，返回 (future, is_leader)"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.coalesced_count += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._futures[key] = future
+            return future, True
+    
+    def finish(self, key, future, result=None, error=None):
+        """leader 完成请求后调用，唤醒所有等待者"""
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    @property
+    def in_flight_count(self):
+        """当前正在执行的不同请求数"""
+        with self._lock:
+            return len(self._futures)
+
+
+# 进程内共享的合成请求合并器，跨实例、跨任务生效
+_synthesis_single_flight = SingleFlight()
+
+
+class SynthesisSession:
+    """单次语音合成会话
+    
+    每次调用 synthesize_text 都会创建独立的会话对象来保存音频数据、错误信息和完成状态，
+    避免多个线程共用同一个 UnifiedSpeechSynthesis 实例时互相覆盖或拼接结果。
+    """
+    
+    def __init__(self, text, decoder=None, audio_format="lame", sample_rate=SYNTHESIS_SAMPLE_RATE):
+        self.text = text
+        self.audio_chunks = []
+        self.error = None
+        self.error_code = None
+        self.finished = threading.Event()
+        # 可选的流式解码器，收到的MP3数据块会立即送入解码
+        self.decoder = decoder
+        # 传输格式："raw" 为原始PCM，"lame" 为MP3
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+    
+    @property
+    def result(self):
+        """返回已接收的完整音频数据，未收到任何数据时返回None"""
+        if not self.audio_chunks:
+            return None
+        return b''.join(self.audio_chunks)
+    
+    def set_error(self, message):
+        """记录第一个错误，后续错误不覆盖"""
+        if self.error is None:
+            self.error = message
+    
+    def handle_message(self, message):
+        """处理一条WebSocket消息，返回True表示本次合成已结束"""
+        try:
+            data = json.loads(message)
+            code = data['code']
+            
+            if code != 0:
+                error_msg = data.get('message', '未知错误')
+                self.error_code = code
+                self.set_error(f"语音合成API错误 (code: {code}): {error_msg}")
+                return True
+            
+            audio_data = data.get('data', {}).get('audio')
+            status = data.get('data', {}).get('status', 0)
+            
+            if audio_data:
+                decoded_audio = base64.b64decode(audio_data)
+                self.audio_chunks.append(decoded_audio)
+                if self.decoder is not None:
+                    self.decoder.feed(decoded_audio)
+            
+            return status == 2
+            
+        except Exception as e:
+            self.set_error(f"处理WebSocket消息时出错: {str(e)}")
+            return True
+    
+    def wait(self, timeout):
+        """等待会话结束，返回是否在超时前完成"""
+        return self.finished.wait(timeout)
+    
+    def decode_pcm(self):
+        """结束解码并返回 int16 PCM 数组；流式解码不可用时在内存中整体解码"""
+        if self.audio_format == "raw":
+            # 原始PCM传输，无需解码
+            return pcm_bytes_to_array(self.result)
+        
+        if self.decoder is not None:
+            try:
+                return self.decoder.finish()
+            except Exception as e:
+                print(f"⚠️ 流式解码失败，改为整体解码: {e}")
+        return decode_mp3_bytes(self.result, self.sample_rate)
+    
+    def close_decoder(self):
+        """放弃解码（合成失败时调用）"""
+        if self.decoder is not None:
+            self.decoder.abort()
 
 
 class UnifiedSpeechSynthesis:
     """统一语音合成类"""
     
+    # 批量合成时的最大并行线程数（每个请求使用独立会话，线程安全）
+    MAX_SYNTHESIS_WORKERS = 16
+    # 异步批量合成时默认的最大在途请求数
+    MAX_ASYNC_CONCURRENCY = 64
+    # 等待限流名额的最长时间（秒）
+    RATE_LIMIT_WAIT_TIMEOUT = 300
+    # 流水线中并行翻译的线程数
+    TRANSLATE_WORKERS = 4
+    # 按语速模型选择语速时，预测时长需低于可用时长的比例（留出预测误差）
+    SPEED_TARGET_MARGIN = 0.95
+    # 自动提高语速的步长和上限（相对用户设置）
+    SPEED_STEP = 5
+    MAX_SPEED_BOOST = 30
+    # 未单独配置时，对齐缓存占总缓存容量的比例（其余归合成缓存）
+    ALIGNED_CACHE_SHARE = 0.25
+    
     def __init__(self):
-        self.synthesis_result = None
-        self.synthesis_error = None
-        self.synthesis_finished = False
+        # 缓存总容量上限（合成缓存与对齐缓存合计），可由 config.json 中的 audio_cache_max_mb 覆盖
+        self.cache_max_bytes = DEFAULT_CACHE_MAX_BYTES
+        # 对齐缓存的容量上限，从总容量中划出；None 表示按 ALIGNED_CACHE_SHARE 划分，
+        # 可由 aligned_cache_max_mb 覆盖
+        self.aligned_cache_max_bytes = None
+        # 缓存存储格式（flac/npy/wav），None 表示自动选择，可由 audio_cache_format 覆盖
+        self.cache_format = None
+        # 缓存目录，可由 audio_cache_dir 指向多个进程/机器共享的路径
+        self.cache_dir = "audio_cache"
+        # 变速实现（wsola/audiotsm/atempo），可由 time_stretch_engine 覆盖
+        self.stretch_engine = DEFAULT_STRETCH_ENGINE
+        # 变速是否交给独立进程池（绕开GIL），进程数默认等于CPU核数
+        self.use_stretch_pool = True
+        self.stretch_workers = None
+        # 是否根据语速模型为每条字幕自动提高语速（最多 MAX_SPEED_BOOST），可由 adaptive_speed 开启。
+        # 默认关闭：开启后实际语速可能高于用户设置的语速
+        self.adaptive_speed = False
+        # 最终混音是否按窗口流式处理（不把原音频整体载入内存），可由 streaming_mix 覆盖
+        self.streaming_mix = True
+        # 合成语音期间压低背景的起始/释放斜坡（毫秒），可由 ducking_attack_ms/ducking_release_ms 覆盖
+        self.ducking_attack_ms = DUCKING_ATTACK_MS
+        self.ducking_release_ms = DUCKING_RELEASE_MS
         
         # 从配置文件加载API配置
         self.load_config()
         
+        # 进程内共享的TTS自适应限流器
+        self.rate_limiter = get_tts_rate_limiter()
+        
         # 初始化音频缓存
         self.enable_cache = True  # 默认启用缓存
-        self.cache_dir = "audio_cache"
+        self.audio_cache = None
+        self.aligned_cache = None
+        self.speech_rate_model = None
         self._init_cache_dir()
         
     def load_config(self):
@@ -79,6 +261,25 @@ class UnifiedSpeechSynthesis:
                 self.BAIDU_APPID = config.get('baidu_appid', '20240510002047252')
                 self.BAIDU_APPKEY = config.get('baidu_appkey', 'kTWYriLuEEEKr0BE70d1')
                 
+                # TTS传输格式：raw（原始PCM，免解码）或 lame（MP3）
+                self.tts_audio_format = config.get('xunfei_tts_aue', 'raw')
+                
+                # 音频缓存容量上限（MB）
+                if 'audio_cache_max_mb' in config:
+                    self.cache_max_bytes = int(config['audio_cache_max_mb']) * 1024 * 1024
+                if 'aligned_cache_max_mb' in config:
+                    self.aligned_cache_max_bytes = int(config['aligned_cache_max_mb']) * 1024 * 1024
+                self.cache_format = config.get('audio_cache_format', self.cache_format)
+                self.cache_dir = config.get('audio_cache_dir') or self.cache_dir
+                if config.get('time_stretch_engine') in STRETCH_ENGINES:
+                    self.stretch_engine = config['time_stretch_engine']
+                self.use_stretch_pool = bool(config.get('stretch_process_pool', self.use_stretch_pool))
+                self.stretch_workers = config.get('stretch_workers', self.stretch_workers)
+                self.adaptive_speed = bool(config.get('adaptive_speed', self.adaptive_speed))
+                self.streaming_mix = bool(config.get('streaming_mix', self.streaming_mix))
+                self.ducking_attack_ms = int(config.get('ducking_attack_ms', self.ducking_attack_ms))
+                self.ducking_release_ms = int(config.get('ducking_release_ms', self.ducking_release_ms))
+                
                 print(f"✅ 成功加载语音合成API配置:")
                 print(f"   TTS APPID: {self.APPID}")
                 print(f"   TTS APIKey: {self.API_KEY[:8]}***")
@@ -94,6 +295,7 @@ class UnifiedSpeechSynthesis:
                 self.API_SECRET = 'Y2I4YTUxMDljZjk2YzAwZGMzNTgwYTNl'
                 self.BAIDU_APPID = '20240510002047252'
                 self.BAIDU_APPKEY = 'kTWYriLuEEEKr0BE70d1'
+                self.tts_audio_format = 'raw'
                 
         except Exception as e:
             print(f"❌ 加载配置失败: {e}")
@@ -103,6 +305,7 @@ class UnifiedSpeechSynthesis:
             self.API_SECRET = 'Y2I4YTUxMDljZjk2YzAwZGMzNTgwYTNl'
             self.BAIDU_APPID = '20240510002047252'
             self.BAIDU_APPKEY = 'kTWYriLuEEEKr0BE70d1'
+            self.tts_audio_format = 'raw'
     
     def create_websocket_url(self, text, voice_type="xiaoyan", speed=50, volume=50):
         """创建WebSocket连接URL - 使用正确的讯飞API认证方式（基于syntheticSpeech.py）"""
@@ -146,15 +349,14 @@ class UnifiedSpeechSynthesis:
         
         return url
     
-    def create_synthesis_params(self, text, voice_type="xiaoyan", speed=50, volume=50):
-        """创建语音合成参数"""
+    def create_synthesis_params(self, text, voice_type="xiaoyan", speed=50, volume=50,
+                                audio_format="lame", sample_rate=SYNTHESIS_SAMPLE_RATE):
+        """创建语音合成参数
+        
+        audio_format 为 "raw" 时服务端直接返回 16 位原始PCM，为 "lame" 时返回MP3。
+        """
         # 智能语音类型检测
-        if self._is_chinese(text):
-            if voice_type.startswith("x4_"):
-                voice_type = "xiaoyan"  # 中文文本使用中文发音人
-        else:
-            if not voice_type.startswith("x4_"):
-                voice_type = "x4_EnUs_Laura_education"  # 英文文本使用英文发音人
+        voice_type = self._resolve_voice_type(text, voice_type)
         
         # 优化语音参数
         adjusted_speed = self._adjust_speed_for_voice(speed, voice_type)
@@ -166,8 +368,8 @@ class UnifiedSpeechSynthesis:
                 "app_id": self.APPID
             },
             "business": {
-                "aue": "lame",
-                "auf": "audio/L16;rate=16000",
+                "aue": audio_format,
+                "auf": f"audio/L16;rate={sample_rate}",
                 "vcn": voice_type,
                 "speed": adjusted_speed,
                 "volume": adjusted_volume,
@@ -182,6 +384,80 @@ class UnifiedSpeechSynthesis:
         }
         return json.dumps(data)
     
+    def _resolve_voice_type(self, text, voice_type):
+        """根据文本语言确定实际使用的发音人（中文文本用中文发音人，英文文本用英文发音人）"""
+        if self._is_chinese(text):
+            if voice_type.startswith("x4_"):
+                return "xiaoyan"  # 中文文本使用中文发音人
+        else:
+            if not voice_type.startswith("x4_"):
+                return "x4_EnUs_Laura_education"  # 英文文本使用英文发音人
+        return voice_type
+    
+    def choose_speed(self, text, voice_type, speed, slot_duration):
+        """
+        根据语速模型为一条字幕选择语速，使原始合成音频尽量落在可用时长内
+        
+        只会在用户设置的基础上按 SPEED_STEP 提高语速（最多 MAX_SPEED_BOOST），不会放慢；
+        预测放得下时直接返回用户设置的语速。剩余的超出部分由时长对齐处理。
+        选定的语速按 (文本, 发音人, 用户语速, 可用时长) 记录在语速模型中，之后处理同一字幕时直接沿用，
+        不会因为模型重新拟合而换用其他语速、导致合成缓存失效。
+        """
+        if not self.adaptive_speed or self.speech_rate_model is None or not slot_duration or slot_duration <= 0:
+            return speed
+        actual_voice = self._resolve_voice_type(text, voice_type)
+        target_duration = slot_duration * self.SPEED_TARGET_MARGIN
+        
+        try:
+            remembered = self.speech_rate_model.get_speed_choice(text, actual_voice, speed, slot_duration)
+            if remembered is not None:
+                return remembered
+            chosen = speed
+            last_api_speed = None
+            for candidate in range(int(speed), min(100, int(speed) + self.MAX_SPEED_BOOST) + 1, self.SPEED_STEP):
+                api_speed = self._adjust_speed_for_voice(candidate, actual_voice)
+                if api_speed == last_api_speed:
+                    # 已到达该发音人的语速上限，继续提高没有效果
+                    break
+                last_api_speed = api_speed
+                chosen = candidate
+                predicted = self.speech_rate_model.predict_duration(text, actual_voice, api_speed)
+                if predicted is None or predicted <= target_duration:
+                    break
+            chosen = self.speech_rate_model.remember_speed_choice(text, actual_voice, speed, slot_duration, chosen)
+            if chosen != speed:
+                print(f"🏃 语速模型: 提高语速 {speed} → {chosen}，可用时长 {slot_duration:.2f}s")
+            return chosen
+        except Exception as e:
+            print(f"⚠️ 语速预测失败，使用原语速: {e}")
+            return speed
+    
+    def speech_rate_job(self):
+        """一次合成任务的上下文：任务期间语速模型参数保持不变（见 SpeechRateModel.job）"""
+        if self.speech_rate_model is None:
+            return contextlib.nullcontext()
+        return self.speech_rate_model.job()
+    
+    def _observe_speech_rate(self, text, voice_type, speed, samples):
+        """将一次实际合成结果记录到语速模型"""
+        if self.speech_rate_model is None or samples is None:
+            return
+        try:
+            actual_voice = self._resolve_voice_type(text, voice_type)
+            self.speech_rate_model.observe(text, actual_voice, self._adjust_speed_for_voice(speed, actual_voice),
+                                           pcm_duration(samples))
+        except Exception as e:
+            print(f"⚠️ 记录语速数据失败: {e}")
+    
+    def get_speech_rate_stats(self):
+        """获取语速模型参数及其预测精度"""
+        if self.speech_rate_model is None:
+            return {"model": {}, "accuracy": {}}
+        return {
+            "model": self.speech_rate_model.get_model(),
+            "accuracy": self.speech_rate_model.get_accuracy_stats()
+        }
+    
     def _is_chinese(self, text):
         """检测文本是否包含中文"""
         for char in text:
@@ -244,82 +520,88 @@ class UnifiedSpeechSynthesis:
                 return max(45, min(base_pitch + pitch_adjust, 60))
     
     def synthesize_text(self, text, output_file, voice_type="xiaoyan", speed=50, volume=50, quality="高质量"):
-        """使用讯飞语音合成API合成语音 - 增强缓存和质量支持"""
+        """使用讯飞语音合成API合成语音并保存为WAV文件 - 增强缓存和质量支持"""
+        samples = self.synthesize_pcm(text, voice_type, speed, volume, quality)
+        if samples is None:
+            return False
+        
+        write_wav_pcm(output_file, samples, SYNTHESIS_SAMPLE_RATE)
+        return True
+    
+    def synthesize_pcm(self, text, voice_type="xiaoyan", speed=50, volume=50, quality="高质量"):
+        """
+        使用讯飞语音合成API合成语音，直接返回内存中的PCM数据
+        
+        WebSocket收到的MP3数据块被逐块送入流式解码器，整个过程不产生临时文件。
+        
+        Returns:
+            numpy.ndarray: int16 单声道 PCM，采样率为 SYNTHESIS_SAMPLE_RATE；文本为空或请求无法创建时返回None
+        """
         if not text or not text.strip():
             print("❌ 文本为空，跳过合成")
-            return False
+            return None
         
         # 获取质量设置
         quality_settings = self._get_quality_settings(quality)
         
         # 检查缓存
-        cache_key = self._get_cache_key(text.strip(), voice_type, speed, volume, quality)
-        cached_file = self._get_cached_audio(cache_key)
-        if cached_file:
-            try:
-                import shutil
-                shutil.copy2(cached_file, output_file)
-                print(f"✅ 使用缓存音频文件: {output_file}")
-                return True
-            except Exception as e:
-                print(f"⚠️ 缓存文件复制失败: {e}")
+        cache_key = self._get_cache_key(text.strip(), self._resolve_voice_type(text, voice_type), speed, volume, quality)
+        cached_samples = self._load_cached_pcm(cache_key)
+        if cached_samples is not None:
+            return cached_samples
+        
+        # 相同请求正在其他线程合成时，等待其结果而不是重复调用API
+        future, is_leader = _synthesis_single_flight.begin(cache_key)
+        if not is_leader:
+            print(f"🔗 合并重复的合成请求: {text[:50]}...")
+            samples = future.result()
+            return None if samples is None else samples.copy()
         
+        try:
+            # 查缓存与登记之间，上一个 leader 可能刚好完成并写入了缓存，成为 leader 后再查一次
+            samples = self._load_cached_pcm(cache_key)
+            requested = samples is None
+            if requested:
+                samples = self._request_pcm(text, voice_type, speed, volume, quality, quality_settings, cache_key)
+        except BaseException as e:
+            _synthesis_single_flight.finish(cache_key, future, error=e)
+            raise
+        _synthesis_single_flight.finish(cache_key, future, result=samples)
+        if requested:
+            self._observe_speech_rate(text, voice_type, speed, samples)
+        return samples
+    
+    def _request_pcm(self, text, voice_type, speed, volume, quality, quality_settings, cache_key):
+        """实际调用讯飞API完成一次合成（不经过缓存和请求合并）"""
         print(f"🎤 开始语音合成: {text[:50]}...")
         print(f"🎧 质量: {quality}, 采样率: {quality_settings['sample_rate']}Hz")
         
-        self.synthesis_result = None
-        self.synthesis_error = None
-        self.synthesis_finished = False
-        
+        # 进程级自适应限流，所有实例共享。
+        # 签名URL带有Date且只在约5分钟内有效，必须在拿到名额之后再生成
+        if not self.rate_limiter.acquire(timeout=self.RATE_LIMIT_WAIT_TIMEOUT):
+            raise Exception("等待语音合成限流名额超时")
         try:
-            url = self.create_websocket_url(text, voice_type, speed, volume)
-            params = self.create_synthesis_params(text, voice_type, speed, volume)
-            
-           
-            
+            url, params, session = self._create_session(text, voice_type, speed, volume, quality_settings)
         except Exception as e:
+            self.rate_limiter.release(success=False)
             print(f"❌ 创建WebSocket URL失败: {e}")
-            return False
+            return None
         
         def on_message(ws, message):
-            try:
-                data = json.loads(message)
-                code = data['code']
-                
-                if code != 0:
-                    error_msg = data.get('message', '未知错误')
-                    self.synthesis_error = f"语音合成API错误 (code: {code}): {error_msg}"
-                    ws.close()
-                    return
-                
-                audio_data = data.get('data', {}).get('audio')
-                status = data.get('data', {}).get('status', 0)
-                
-                if audio_data:
-                    decoded_audio = base64.b64decode(audio_data)
-                    if self.synthesis_result is None:
-                        self.synthesis_result = decoded_audio
-                    else:
-                        self.synthesis_result += decoded_audio
-                
-                if status == 2:
-                    ws.close()
-                    
-            except Exception as e:
-                self.synthesis_error = f"处理WebSocket消息时出错: {str(e)}"
+            if session.handle_message(message):
                 ws.close()
         
         def on_error(ws, error):
-            self.synthesis_error = f"WebSocket连接错误: {str(error)}"
+            session.set_error(f"WebSocket连接错误: {str(error)}")
             
         def on_close(ws, close_status_code, close_msg):
-            self.synthesis_finished = True
+            session.finished.set()
             
         def on_open(ws):
             try:
                 ws.send(params)
             except Exception as e:
-                self.synthesis_error = f"发送参数失败: {str(e)}"
+                session.set_error(f"发送参数失败: {str(e)}")
                 ws.close()
         
         try:
@@ -330,62 +612,68 @@ class UnifiedSpeechSynthesis:
                                       on_error=on_error,
                                       on_close=on_close)
             ws.on_open = on_open
-            
             ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
             
             # 等待合成完成
-            timeout = 30
-            start_time = time.time()
-            
-            while not self.synthesis_finished and time.time() - start_time < timeout:
-                time.sleep(0.1)
-            
-            if self.synthesis_error:
-                raise Exception(self.synthesis_error)
-            
-            if self.synthesis_result is None:
-                raise Exception("语音合成失败：未收到音频数据")
-            
-            # 保存音频文件
-            temp_mp3_file = output_file.replace('.wav', '_temp.mp3')
-            with open(temp_mp3_file, 'wb') as f:
-                f.write(self.synthesis_result)
-            
-            # 验证并转换为WAV格式
-            try:
-                test_audio = AudioSegment.from_mp3(temp_mp3_file)
-                audio = AudioSegment.from_mp3(temp_mp3_file)
-                audio.export(output_file, format="wav")
-                
-                if os.path.exists(temp_mp3_file):
-                    os.remove(temp_mp3_file)
-                
-            except Exception as e:
-                # 尝试使用ffmpeg转换
-                try:
-                    import subprocess
-                    cmd = ['ffmpeg', '-y', '-i', temp_mp3_file, '-ar', '16000', '-ac', '1', output_file]
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode == 0:
-                        if os.path.exists(temp_mp3_file):
-                            os.remove(temp_mp3_file)
-                    else:
-                        raise Exception(f"音频格式转换失败: {result.stderr}")
-                except Exception:
-                    # 最后尝试：重命名MP3为WAV
-                    import shutil
-                    shutil.move(temp_mp3_file, output_file)
-            
-            # 保存到缓存
-            self._save_to_cache(cache_key, output_file)
-            
-            return True
-            
-        except Exception as e:
+            if not session.wait(timeout=30):
+                session.set_error("语音合成超时")
+        except Exception:
+            self.rate_limiter.release(False)
+            session.close_decoder()
+            raise
+        self.rate_limiter.release(session.error is None, session.error_code)
+        
+        try:
+            return self._finish_session(session, cache_key)
+        except Exception:
+            session.close_decoder()
             raise
     
-    def extract_original_audio_segments(self, video_file, segments, temp_audio_path=None, existing_audio_path=None):
-        """从原视频中提取完整音频和间隔片段 - 支持使用已存在的音频文件"""
+    def _create_session(self, text, voice_type, speed, volume, quality_settings):
+        """根据传输模式和质量设置创建请求URL、参数和会话对象"""
+        audio_format = self.tts_audio_format
+        sample_rate = quality_settings['tts_sample_rate']
+        
+        url = self.create_websocket_url(text, voice_type, speed, volume)
+        params = self.create_synthesis_params(text, voice_type, speed, volume, audio_format, sample_rate)
+        
+        decoder = self._create_stream_decoder(sample_rate) if audio_format == "lame" else None
+        session = SynthesisSession(text, decoder=decoder, audio_format=audio_format, sample_rate=sample_rate)
+        return url, params, session
+    
+    def _create_stream_decoder(self, sample_rate=SYNTHESIS_SAMPLE_RATE):
+        """创建流式MP3解码器，ffmpeg不可用时返回None（改为整体解码）"""
+        try:
+            return StreamingMp3Decoder(sample_rate)
+        except Exception as e:
+            print(f"⚠️ 流式解码器不可用: {e}")
+            return None
+    
+    def _finish_session(self, session, cache_key):
+        """检查会话结果，解码为PCM并写入缓存"""
+        if session.error:
+            raise Exception(session.error)
+        
+        if session.result is None:
+            raise Exception("语音合成失败：未收到音频数据")
+        
+        samples = session.decode_pcm()
+        if len(samples) == 0:
+            raise Exception("语音合成失败：解码后音频为空")
+        
+        if session.sample_rate != SYNTHESIS_SAMPLE_RATE:
+            samples = resample_pcm(samples, session.sample_rate, SYNTHESIS_SAMPLE_RATE)
+        
+        # 保存到缓存
+        self._save_pcm_to_cache(cache_key, samples)
+        return samples
+    
+    def extract_original_audio_segments(self, video_file, segments, temp_audio_path=None, existing_audio_path=None,
+                                        load_audio=True):
+        """从原视频中提取完整音频和间隔片段 - 支持使用已存在的音频文件
+        
+        load_audio 为 False 时不载入内存，直接返回WAV文件路径，供流式混音按窗口读取。
+        """
         try:
             import time
             import os
@@ -393,6 +681,12 @@ class UnifiedSpeechSynthesis:
             # 如果提供了已存在的音频文件，直接使用
             if existing_audio_path and os.path.exists(existing_audio_path):
                 print(f"🔄 使用已提取的音频文件: {existing_audio_path}")
+                if not load_audio:
+                    try:
+                        read_wav_header(existing_audio_path)
+                        return existing_audio_path
+                    except Exception as header_error:
+                        print(f"⚠️ 已存在音频文件无法按16位PCM映射，改为整体载入: {header_error}")
                 try:
                     full_original_audio = AudioSegment.from_wav(existing_audio_path)
                     print(f"✅ 已存在音频加载成功: {existing_audio_path}, 时长: {len(full_original_audio)/1000:.1f}秒")
@@ -480,6 +774,10 @@ class UnifiedSpeechSynthesis:
                 print(f"❌ 音频文件为空: {temp_full_audio}")
                 return None
             
+            if not load_audio and temp_audio_path is not None:
+                print(f"✅ 原音频提取成功: {temp_full_audio}")
+                return temp_full_audio
+            
             # 加载音频文件
             try:
                 full_original_audio = AudioSegment.from_wav(temp_full_audio)
@@ -526,72 +824,39 @@ class UnifiedSpeechSynthesis:
     
     def merge_audio_with_original_intervals(self, synthesized_segments, segments, 
                                           original_audio_segments, total_duration, output_file):
-        """智能音频合并 - 音频段已对齐，直接合并即可"""
+        """智能音频合并 - 音频段已对齐，在预分配的 float32 缓冲区中一次性混音（见 audio_mixer）
+        
+        original_audio_segments 为原音频WAV路径时改为流式分块混音，返回输出文件路径。
+        """
+        if isinstance(original_audio_segments, str):
+            try:
+                return self._stream_merge_audio(synthesized_segments, segments, original_audio_segments,
+                                                total_duration, output_file)
+            except Exception as e:
+                print(f"⚠️ 流式混音失败（{e}），改为整体载入原音频混音")
+                try:
+                    original_audio_segments = AudioSegment.from_file(original_audio_segments)
+                except Exception as load_error:
+                    print(f"⚠️ 原音频加载失败: {load_error}")
+                    original_audio_segments = None
+        
         try:
-            # 创建基于原音频的完整背景音轨
             if original_audio_segments and isinstance(original_audio_segments, AudioSegment):
-                # original_audio_segments 现在是完整的原音频
-                full_original = original_audio_segments
-                total_duration_ms = int(total_duration * 1000)
-                
-                # 确保原音频长度匹配
-                if len(full_original) > total_duration_ms:
-                    background_audio = full_original[:total_duration_ms]
-                else:
-                    # 如果原音频不够长，循环填充或用静音补齐
-                    background_audio = full_original
-                    while len(background_audio) < total_duration_ms:
-                        remaining = total_duration_ms - len(background_audio)
-                        if len(full_original) <= remaining:
-                            background_audio += full_original
-                        else:
-                            background_audio += full_original[:remaining]
-                
-                # 降低背景音频音量（作为环境音）
-                background_audio = background_audio - 25  # 降低25dB
+                # original_audio_segments 是完整的原音频，衰减后作为背景，不足总时长时循环填充
+                background_audio = original_audio_segments
                 print(f"✅ 使用原视频音频作为背景，长度: {len(background_audio)/1000:.1f}秒")
             else:
-                # 如果没有原音频，创建静音背景
-                background_audio = AudioSegment.silent(duration=int(total_duration * 1000))
+                background_audio = None
                 print("⚠️ 原音频提取失败，使用静音作为背景")
             
-            # 在指定位置叠加已对齐的合成语音
-            final_audio = background_audio
-            
-            for i, ((text, start_time, end_time), synth_segment) in enumerate(zip(segments, synthesized_segments)):
-                if synth_segment is None:
-                    continue
-                    
-                start_ms = int(start_time * 1000)
-                
-                # 音频段已经在合成时对齐，无需再次调整时长
-                print(f"📍 片段 {i+1}: {start_time:.1f}s-{end_time:.1f}s，音频时长={len(synth_segment)/1000:.2f}s")
-                
-                # 为合成音频添加渐变效果，改善衔接
-                fade_duration = min(50, len(synth_segment) // 20)  # 最多50ms渐变
-                if fade_duration > 10:
-                    synth_segment = synth_segment.fade_in(fade_duration).fade_out(fade_duration)
-                
-                # 在语音段期间降低背景音量
-                end_ms = start_ms + len(synth_segment)
-                if start_ms < len(final_audio) and end_ms <= len(final_audio):
-                    # 分割音频
-                    before = final_audio[:start_ms]
-                    during = final_audio[start_ms:end_ms] - 8  # 语音期间再降低8dB
-                    after = final_audio[end_ms:]
-                    
-                    # 重新组合
-                    final_audio = before + during + after
-                
-                # 叠加合成语音
-                if start_ms < len(final_audio):
-                    # 确保不超出边界
-                        if start_ms + len(synth_segment) > len(final_audio):
-                            synth_segment = synth_segment[:len(final_audio) - start_ms]
-                        
-                        final_audio = final_audio.overlay(synth_segment, position=start_ms)
-                
-                print(f"✅ 片段 {i+1}: 已叠加到 {start_time:.1f}s 位置")
+            mix_start = time.perf_counter()
+            mix, sample_rate = mix_audio_segments(synthesized_segments, segments, total_duration, background_audio,
+                                                  self.ducking_attack_ms, self.ducking_release_ms)
+            channels = mix.shape[1]
+            final_audio = AudioSegment(data=float_to_int16(mix).tobytes(), sample_width=2,
+                                       frame_rate=sample_rate, channels=channels)
+            placed = sum(1 for synth_segment in synthesized_segments if synth_segment is not None)
+            print(f"✅ 已叠加 {placed} 个合成语音片段，混音耗时 {time.perf_counter() - mix_start:.2f}秒")
             
             # 导出最终音频
             final_audio.export(output_file, format="wav")
@@ -603,6 +868,102 @@ class UnifiedSpeechSynthesis:
             # 备用方案：使用静音间隔
             return self._merge_with_silence(synthesized_segments, segments, total_duration, output_file)
     
+    def _stream_merge_audio(self, synthesized_segments, segments, background_path, total_duration, output_file):
+        """流式分块混音：按窗口读取背景WAV并逐块写出，峰值内存与视频时长无关"""
+        mix_start = time.perf_counter()
+        with WavBackgroundReader(background_path) as background_reader:
+            print(f"✅ 流式读取原音频作为背景: {background_path}，"
+                  f"长度: {background_reader.frames / background_reader.sample_rate:.1f}秒")
+            chunks = iter_dubbing_chunks(synthesized_segments, segments, total_duration,
+                                         background_reader.sample_rate, background_reader.channels,
+                                         background_reader, attack_ms=self.ducking_attack_ms,
+                                         release_ms=self.ducking_release_ms)
+            frames = write_wav_chunks(output_file, chunks, background_reader.sample_rate,
+                                      background_reader.channels)
+            sample_rate = background_reader.sample_rate
+        print(f"✅ 流式音频合并完成: {output_file}, 总长度: {frames / sample_rate:.1f}秒，"
+              f"耗时 {time.perf_counter() - mix_start:.2f}秒")
+        return output_file
+    
+    def mux_dubbing_stream(self, video_file, synthesized_segments, segments, background_path, total_duration,
+                           output_path, subtitles=None, quality_settings=None):
+        """
+        流式混音并通过标准输入把PCM直接送入ffmpeg，边混音边编码为AAC并封装到视频中
+
+        subtitles 为 render_planner.prepare_subtitles 的返回值时，字幕在同一次 ffmpeg 调用中嵌入；
+        quality_settings 为 _get_quality_settings 的返回值，决定烧录硬字幕时的视频编码参数。
+        失败时删除写了一半的输出文件，调用方可以直接重试或改用其他方式封装。
+        """
+        try:
+            return self._mux_dubbing_stream(video_file, synthesized_segments, segments, background_path,
+                                            total_duration, output_path, subtitles, quality_settings)
+        except BaseException:
+            self._remove_partial_output(output_path)
+            raise
+    
+    @staticmethod
+    def _remove_partial_output(output_path):
+        """删除封装失败时ffmpeg留下的不完整输出文件"""
+        try:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+                print(f"🗑️ 已删除不完整的输出文件: {output_path}")
+        except OSError as e:
+            print(f"⚠️ 删除不完整的输出文件失败 {output_path}: {e}")
+    
+    def _mux_dubbing_stream(self, video_file, synthesized_segments, segments, background_path, total_duration,
+                            output_path, subtitles, quality_settings):
+        """mux_dubbing_stream 的主体"""
+        quality_settings = quality_settings or {}
+        mix_start = time.perf_counter()
+        with WavBackgroundReader(background_path) as background_reader:
+            sample_rate = background_reader.sample_rate
+            channels = background_reader.channels
+            chunks = iter_dubbing_chunks(synthesized_segments, segments, total_duration, sample_rate, channels,
+                                         background_reader, attack_ms=self.ducking_attack_ms,
+                                         release_ms=self.ducking_release_ms)
+            ffmpeg_cmd, work_dir = build_render_command(video_file, output_path, pipe_format=(sample_rate, channels),
+                                                        subtitles=subtitles, duration=total_duration,
+                                                        crf=quality_settings.get('video_crf'),
+                                                        preset=quality_settings.get('video_preset'))
+            print(f"🔧 执行FFmpeg命令（音频经管道输入）: {' '.join(ffmpeg_cmd)}")
+            process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, cwd=work_dir)
+            # 单独线程读取错误输出，避免管道写满阻塞ffmpeg
+            stderr_data = []
+            stderr_reader = threading.Thread(target=lambda: stderr_data.append(process.stderr.read()), daemon=True)
+            stderr_reader.start()
+            
+            frames_written = 0
+            try:
+                try:
+                    for chunk in chunks:
+                        process.stdin.write(float_to_int16(chunk).tobytes())
+                        frames_written += len(chunk)
+                except BrokenPipeError:
+                    # -shortest 时视频结束后ffmpeg会提前停止读取，是否成功以返回码为准
+                    pass
+            except BaseException:
+                # 混音出错或被中断时终止ffmpeg，下面照常回收进程和读取线程
+                process.kill()
+                raise
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                returncode = process.wait()
+                stderr_reader.join()
+        
+        if returncode != 0:
+            stderr_text = b''.join(stderr_data).decode('utf-8', errors='replace')
+            raise Exception(f"FFmpeg管道封装失败: {stderr_text}")
+        if not os.path.exists(output_path):
+            raise Exception("输出文件未生成")
+        print(f"✅ 混音并封装完成: {output_path}，音频 {frames_written / sample_rate:.1f}秒，"
+              f"耗时 {time.perf_counter() - mix_start:.2f}秒")
+        return output_path
+    
     def _merge_with_silence(self, synthesized_segments, segments, total_duration, output_file):
         """备用方案：使用静音间隔合并音频"""
         merged_audio = AudioSegment.empty()
@@ -627,7 +988,7 @@ class UnifiedSpeechSynthesis:
         return merged_audio
     
     def adjust_audio_speed(self, audio_file, target_duration, output_file):
-        """调整音频速度以匹配目标时长"""
+        """调整音频文件速度以匹配目标时长（文件接口，内部使用 adjust_pcm_speed）"""
         try:
             # 智能检测音频格式
             try:
@@ -642,110 +1003,74 @@ class UnifiedSpeechSynthesis:
                 print(f"❌ 音频文件读取失败: {e}")
                 return False
             
-            current_duration = len(audio) / 1000.0
-            speed_rate = current_duration / target_duration
-            
-            print(f"🎵 音频调速: 当前时长={current_duration:.2f}s, 目标时长={target_duration:.2f}s, 速度倍率={speed_rate:.2f}")
-            
-            if abs(speed_rate - 1.0) < 0.1:  # 如果速度差异小于10%，不调整
-                print("⏭️ 速度差异小于10%，直接复制文件")
-                audio.export(output_file, format="wav")
-                return True
-            
-            # 改进的临时文件处理，避免占用冲突
-            import uuid
-            import time
-            
-            # 使用UUID和时间戳创建唯一的临时文件名
-            unique_id = str(uuid.uuid4())[:8]
-            timestamp = int(time.time() * 1000)
-            temp_wav_for_speed = f"temp_speed_{timestamp}_{unique_id}.wav"
-            
-            # 确保临时文件不存在
-            if os.path.exists(temp_wav_for_speed):
-                try:
-                    os.remove(temp_wav_for_speed)
-                except:
-                    temp_wav_for_speed = f"temp_speed_{timestamp}_{unique_id}_2.wav"
-            
-            try:
-                # 确保是WAV格式且符合audiotsm要求
-                print(f"🎵 创建临时调速文件: {temp_wav_for_speed}")
-                audio.set_frame_rate(16000).set_channels(1).export(temp_wav_for_speed, format="wav")
-                
-                # 等待文件系统完成写入
-                time.sleep(0.1)
-                
-                # 验证临时文件
-                if not os.path.exists(temp_wav_for_speed) or os.path.getsize(temp_wav_for_speed) == 0:
-                    raise Exception("临时WAV文件创建失败")
-                
-                # 使用audiotsm进行高质量变速（若可用），否则降级为 pydub+ffmpeg 的变速方案
-                try:
-                    if _HAS_AUDIOTSM:
-                        import audiotsm.io.wav
-                        reader = audiotsm.io.wav.WavReader(temp_wav_for_speed)
-                        writer = audiotsm.io.wav.WavWriter(output_file, reader.channels, reader.samplerate)
-                        wsola = audiotsm.wsola(reader.channels, speed=speed_rate)
-                        wsola.run(reader, writer)
-                        reader.close()
-                        writer.close()
-                        print(f"✅ 使用audiotsm调速成功")
-                    else:
-                        # 降级：使用ffmpeg atempo（支持0.5~2.0，超出范围分段叠加）
-                        import math, subprocess
-                        tempo = 1.0 / speed_rate if speed_rate != 0 else 1.0
-                        def build_filters(t):
-                            # 将 t 分解为 0.5~2.0 范围的多个 atempo 级联
-                            filters = []
-                            if t <= 0:
-                                t = 1.0
-                            while t < 0.5:
-                                filters.append('atempo=0.5')
-                                t /= 0.5
-                            while t > 2.0:
-                                filters.append('atempo=2.0')
-                                t /= 2.0
-                            filters.append(f'atempo={t:.6f}')
-                            return filters
-                        atempo_filters = build_filters(tempo)
-                        cmd = ['ffmpeg', '-y', '-i', temp_wav_for_speed, '-filter:a', ','.join(atempo_filters), output_file]
-                        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
-                        if result.returncode != 0:
-                            raise Exception(f"ffmpeg atempo 变速失败: {result.stderr}")
-                        print("✅ 使用ffmpeg atempo 调速成功（降级模式）")
-                    
-                except Exception as audiotsm_exec_error:
-                    print(f"⚠️ 调速执行失败: {audiotsm_exec_error}")
-                    raise audiotsm_exec_error
-                    
-            except Exception as audiotsm_error:
-                print(f"⚠️ audiotsm调速失败: {audiotsm_error}，尝试备用方法")
-                
-            finally:
-                # 清理临时文件，添加多次尝试机制
-                if os.path.exists(temp_wav_for_speed):
-                    for attempt in range(3):
-                        try:
-                            time.sleep(0.1)  # 短暂等待，确保文件句柄释放
-                            os.remove(temp_wav_for_speed)
-                            print(f"🗑️ 临时调速文件已清理: {temp_wav_for_speed}")
-                            break
-                        except Exception as cleanup_error:
-                            if attempt == 2:  # 最后一次尝试
-                                print(f"⚠️ 清理临时文件失败 (尝试{attempt+1}/3): {cleanup_error}")
-                                print(f"⚠️ 请手动删除文件: {temp_wav_for_speed}")
-                            else:
-                                time.sleep(0.2)  # 等待更长时间再试
+            samples = audio_segment_to_pcm(audio, SYNTHESIS_SAMPLE_RATE)
+            aligned = self.adjust_pcm_speed(samples, target_duration, SYNTHESIS_SAMPLE_RATE)
+            write_wav_pcm(output_file, aligned, SYNTHESIS_SAMPLE_RATE)
             
-            # 检查是否成功
-            if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                return True
+            return os.path.exists(output_file) and os.path.getsize(output_file) > 0
             
         except Exception as e:
             print(f"❌ 调整音频速度失败: {e}")
             return False
     
+    def adjust_pcm_speed(self, samples, target_duration, sample_rate=SYNTHESIS_SAMPLE_RATE, tolerance=0.1):
+        """
+        在内存中调整PCM音频速度以匹配目标时长
+        
+        Args:
+            samples: int16 单声道 PCM 数组
+            target_duration: 目标时长（秒）
+            tolerance: 速度差异小于该比例时不调整
+            sample_rate: 采样率
+        
+        Returns:
+            numpy.ndarray: 调速后的 int16 PCM 数组；速度差异小于 tolerance 时原样返回。调速失败时抛出异常
+        """
+        current_duration = pcm_duration(samples, sample_rate)
+        if target_duration <= 0 or current_duration <= 0:
+            return samples
+        
+        speed_rate = current_duration / target_duration
+        
+        print(f"🎵 音频调速: 当前时长={current_duration:.2f}s, 目标时长={target_duration:.2f}s, 速度倍率={speed_rate:.2f}")
+        
+        if abs(speed_rate - 1.0) < tolerance:  # 速度差异很小时不调整
+            print(f"⏭️ 速度差异小于{tolerance*100:.0f}%，保持原音频")
+            return samples
+        
+        try:
+            stretched = self._stretch(samples, speed_rate, sample_rate, self.stretch_engine)
+            print(f"✅ 使用{self.stretch_engine}调速成功")
+            return stretched
+        except Exception as e:
+            if self.stretch_engine == "atempo":
+                raise
+            print(f"⚠️ {self.stretch_engine}调速失败，降级为ffmpeg atempo: {e}")
+        
+        stretched = time_stretch(samples, speed_rate, sample_rate, "atempo")
+        print("✅ 使用ffmpeg atempo 调速成功（降级模式）")
+        return stretched
+    
+    def _get_align_workers(self):
+        """对齐阶段的并行数：使用进程池时等于进程数，否则为CPU核数"""
+        if self.use_stretch_pool:
+            return get_stretch_pool(self.stretch_workers).max_workers
+        return os.cpu_count() or 2
+    
+    def _stretch(self, samples, speed_rate, sample_rate, engine):
+        """
+        执行变速：优先交给变速进程池，进程池不可用时本次在当前进程中计算
+
+        本方法在对齐线程池中并发调用，这里不修改 use_stretch_pool；
+        损坏的进程池由 StretchProcessPool 自行丢弃，下次调用时重建。
+        """
+        if self.use_stretch_pool:
+            try:
+                return get_stretch_pool(self.stretch_workers).stretch(samples, speed_rate, sample_rate, engine)
+            except (BrokenProcessPool, OSError) as e:
+                print(f"⚠️ 变速进程池不可用，本段改为在当前进程中处理: {e}")
+        return time_stretch(samples, speed_rate, sample_rate, engine)
+    
     def translate_text(self, text, from_lang='auto', to_lang='zh'):
         """翻译文本"""
         try:
@@ -873,7 +1198,7 @@ class UnifiedSpeechSynthesis:
     
     def process_video(self, video_file, subtitle_file, output_path, 
                      conversion_type="英文转英文", voice_type=None, speed=100, volume=80,
-                     progress_callback=None, existing_audio_path=None, quality="高质量"):
+                     progress_callback=None, existing_audio_path=None, quality="高质量", subtitles=None):
         """
         处理视频：合成语音并替换音频
         
@@ -888,6 +1213,8 @@ class UnifiedSpeechSynthesis:
             progress_callback: 进度回调函数
             existing_audio_path: 已存在的音频文件路径（避免重复提取）
             quality: 输出质量 ("标准质量", "高质量", "超清质量")
+            subtitles: render_planner 准备的字幕，与音频替换在同一次 ffmpeg 调用中嵌入；
+                       嵌入成功时 subtitles['rendered'] 置为 True，失败时输出不带字幕的视频
         
         Returns:
             str: 生成的视频文件路径
@@ -930,15 +1257,17 @@ class UnifiedSpeechSynthesis:
             def get_temp_path(filename):
                 return os.path.join(temp_dir, filename).replace('\\', '/')
             
-            # 获取视频总时长
-            try:
-                video = VideoFileClip(video_file)
-                total_duration = video.duration
-                video.close()
-            except Exception as e:
-                print(f"获取视频时长失败: {e}")
-                # 使用最后一个字幕的结束时间作为总时长
-                total_duration = segments[-1][2] + 1
+            # 获取视频总时长（ffprobe 结果按文件缓存，见 media_probe）
+            total_duration = get_media_probe().get_duration(video_file)
+            if total_duration is None:
+                try:
+                    video = VideoFileClip(video_file)
+                    total_duration = video.duration
+                    video.close()
+                except Exception as e:
+                    print(f"获取视频时长失败: {e}")
+                    # 使用最后一个字幕的结束时间作为总时长
+                    total_duration = segments[-1][2] + 1
             
             # 合成语音
             synthesized_segments = []
@@ -950,123 +1279,122 @@ class UnifiedSpeechSynthesis:
             original_audio_path = get_temp_path("original_audio.wav")
             temp_files.append(original_audio_path)
             original_audio_segments = self.extract_original_audio_segments(
-                video_file, segments, original_audio_path, existing_audio_path
+                video_file, segments, original_audio_path, existing_audio_path,
+                load_audio=not self.streaming_mix
             )
             
-            # 预处理所有文本（翻译）
+            # 🚀 流水线处理：翻译 → 合成 → 对齐，各阶段通过有界队列衔接
             if progress_callback:
-                progress_callback(25, "预处理字幕文本...")
-            
-            processed_segments = []
-            for i, (text, start_time, end_time) in enumerate(segments):
-                # 根据转换类型处理文本
-                if conversion_type == "中文转英文":
-                    processed_text = self.translate_text(text, 'zh', 'en')
-                    default_voice = voice_type or "x4_EnUs_Laura_education"
-                elif conversion_type == "英文转中文":
-                    processed_text = self.translate_text(text, 'en', 'zh')
-                    default_voice = voice_type or "xiaoyan"
-                elif conversion_type == "中文转中文":
-                    processed_text = text
-                    default_voice = voice_type or "xiaoyan"
-                else:  # 英文转英文
-                    processed_text = text
-                    default_voice = voice_type or "x4_EnUs_Laura_education"
-                
-                processed_segments.append((processed_text, start_time, end_time))
-                
-                if progress_callback and i % 5 == 0:  # 每5个更新一次进度
-                    progress = 25 + int((i / len(segments)) * 15)
-                    progress_callback(progress, f"预处理文本 {i+1}/{len(segments)}")
-            
-            # 🚀 使用批量合成大幅提高速度
-            if progress_callback:
-                progress_callback(40, "开始批量语音合成...")
+                progress_callback(25, "开始流水线处理（翻译/合成/对齐）...")
             
-            def batch_progress_callback(progress, message):
+            def pipeline_progress_callback(progress, message):
                 if progress_callback:
-                    # 批量合成占40%进度（从40%到80%）
-                    actual_progress = 40 + int(progress * 0.4)
+                    # 流水线占60%进度（从25%到85%）
+                    actual_progress = 25 + int(progress * 0.6)
                     progress_callback(actual_progress, message)
             
-            # 确保发音人参数正确传递
-            actual_voice = voice_type or default_voice
-            print(f"🎤 使用发音人: {actual_voice}")
             print(f"🎧 音频质量: {quality}")
             
-            synthesized_segments = self.synthesize_batch_segments(
-                processed_segments, actual_voice, speed, volume, batch_progress_callback, quality
-            )
+            with self.speech_rate_job():
+                synthesized_segments = self.synthesize_pipeline(
+                    segments, conversion_type, voice_type, speed, volume, pipeline_progress_callback, quality,
+                    total_duration=total_duration
+                )
             
             # 合并音频 - 使用统一的路径
-            if progress_callback:
-                progress_callback(85, "合并音频...")
-            
             merged_audio_file = get_temp_path("merged_audio.wav")
             temp_files.append(merged_audio_file)
             
-            self.merge_audio_with_original_intervals(
-                synthesized_segments, segments, original_audio_segments, 
-                total_duration, merged_audio_file
-            )
+            # 字幕嵌入失败（如ffmpeg缺少libass）时再尝试一次不带字幕的封装
+            render_attempts = [subtitles, None] if subtitles else [None]
+            
+            # 流式混音时把混音PCM通过管道直接送入ffmpeg编码封装，不再写出 merged_audio.wav
+            audio_piped = False
+            if self.streaming_mix and isinstance(original_audio_segments, str):
+                if progress_callback:
+                    progress_callback(85, "混音并封装视频...")
+                for render_subtitles in render_attempts:
+                    try:
+                        self.mux_dubbing_stream(video_file, synthesized_segments, segments,
+                                                original_audio_segments, total_duration, output_path,
+                                                subtitles=render_subtitles, quality_settings=quality_settings)
+                        audio_piped = True
+                        if render_subtitles:
+                            render_subtitles['rendered'] = True
+                        break
+                    except Exception as e:
+                        if render_subtitles:
+                            print(f"⚠️ 带字幕的管道封装失败（{e}），改为不嵌入字幕")
+                        else:
+                            print(f"⚠️ 管道封装失败（{e}），改为导出音频文件后封装")
+            
+            if not audio_piped:
+                if progress_callback:
+                    progress_callback(85, "合并音频...")
+                self.merge_audio_with_original_intervals(
+                    synthesized_segments, segments, original_audio_segments, 
+                    total_duration, merged_audio_file
+                )
             
             # 合并视频和新音频
             if progress_callback:
                 progress_callback(95, "合并视频和音频...")
             
             try:
-                print(f"🎬 开始合并视频和音频...")
-                print(f"   视频文件: {video_file}")
-                print(f"   音频文件: {merged_audio_file}")
-                print(f"   输出文件: {output_path}")
+                if not audio_piped:
+                    print(f"🎬 开始合并视频和音频...")
+                    print(f"   视频文件: {video_file}")
+                    print(f"   音频文件: {merged_audio_file}")
+                    print(f"   输出文件: {output_path}")
                 
-                # 检查音频文件是否存在且有效
-                if not os.path.exists(merged_audio_file):
-                    raise Exception(f"合成音频文件不存在: {merged_audio_file}")
+                    # 检查音频文件是否存在且有效
+                    if not os.path.exists(merged_audio_file):
+                        raise Exception(f"合成音频文件不存在: {merged_audio_file}")
                 
-                audio_size = os.path.getsize(merged_audio_file)
-                if audio_size == 0:
-                    raise Exception(f"合成音频文件为空: {merged_audio_file}")
+                    audio_size = os.path.getsize(merged_audio_file)
+                    if audio_size == 0:
+                        raise Exception(f"合成音频文件为空: {merged_audio_file}")
                 
-                print(f"   音频文件大小: {audio_size / (1024*1024):.2f} MB")
+                    print(f"   音频文件大小: {audio_size / (1024*1024):.2f} MB")
                 
-                # 使用FFmpeg直接合并（更可靠）
-                try:
-                    import subprocess
-                    
-                    # FFmpeg命令：替换视频中的音频
-                    ffmpeg_cmd = [
-                        "ffmpeg", "-y",  # 覆盖输出文件
-                        "-i", video_file,  # 输入视频
-                        "-i", merged_audio_file,  # 输入音频
-                        "-c:v", "copy",  # 复制视频流（不重编码）
-                        "-c:a", "aac",   # 音频编码为AAC
-                        "-strict", "experimental",
-                        "-map", "0:v:0",  # 使用第一个文件的视频流
-                        "-map", "1:a:0",  # 使用第二个文件的音频流
-                        "-shortest",      # 以最短的流为准
-                        output_path
-                    ]
-                    
-                    print(f"🔧 执行FFmpeg命令: {' '.join(ffmpeg_cmd)}")
-                    result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, encoding='utf-8')
+                    # 使用FFmpeg直接合并（更可靠），字幕在同一次调用中嵌入
+                    try:
+                        for render_subtitles in render_attempts:
+                            # FFmpeg命令：替换视频中的音频，软字幕/无字幕时复制视频流
+                            ffmpeg_cmd, work_dir = build_render_command(video_file, output_path,
+                                                                        audio_file=merged_audio_file,
+                                                                        subtitles=render_subtitles,
+                                                                        duration=total_duration,
+                                                                        crf=quality_settings.get('video_crf'),
+                                                                        preset=quality_settings.get('video_preset'))
+                        
+                            print(f"🔧 执行FFmpeg命令: {' '.join(ffmpeg_cmd)}")
+                            result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, encoding='utf-8',
+                                                    cwd=work_dir)
+                            if result.returncode == 0:
+                                if render_subtitles:
+                                    render_subtitles['rendered'] = True
+                                break
+                            self._remove_partial_output(output_path)
+                            if render_subtitles:
+                                print(f"⚠️ 带字幕的封装失败，改为不嵌入字幕: {result.stderr}")
                     
-                    if result.returncode == 0:
-                        print(f"✅ FFmpeg合并成功!")
+                        if result.returncode == 0:
+                            print(f"✅ FFmpeg合并成功!")
                         
-                        # 验证输出文件
-                        if os.path.exists(output_path):
-                            output_size = os.path.getsize(output_path)
-                            print(f"   输出文件大小: {output_size / (1024*1024):.2f} MB")
+                            # 验证输出文件
+                            if os.path.exists(output_path):
+                                output_size = os.path.getsize(output_path)
+                                print(f"   输出文件大小: {output_size / (1024*1024):.2f} MB")
+                            else:
+                                raise Exception("输出文件未生成")
                         else:
-                            raise Exception("输出文件未生成")
-                    else:
-                        print(f"❌ FFmpeg错误: {result.stderr}")
-                        raise Exception(f"FFmpeg合并失败: {result.stderr}")
+                            print(f"❌ FFmpeg错误: {result.stderr}")
+                            raise Exception(f"FFmpeg合并失败: {result.stderr}")
                         
-                except Exception as ffmpeg_error:
-                    print(f"❌ FFmpeg合并失败: {ffmpeg_error}")
-                    raise Exception(f"视频音频合并失败: {ffmpeg_error}")
+                    except Exception as ffmpeg_error:
+                        print(f"❌ FFmpeg合并失败: {ffmpeg_error}")
+                        raise Exception(f"视频音频合并失败: {ffmpeg_error}")
                 
                 # 最终验证
                 if os.path.exists(output_path):
@@ -1089,11 +1417,12 @@ class UnifiedSpeechSynthesis:
                     
             except Exception as e:
                 print(f"❌ 合并视频音频失败: {e}")
-                # 至少保存音频文件到输出目录
-                backup_audio = output_path.replace('.mp4', '_audio.wav')
-                import shutil
-                shutil.copy2(merged_audio_file, backup_audio)
-                print(f"⚠️ 已保存音频文件: {backup_audio}")
+                # 至少保存音频文件到输出目录（管道封装时没有中间音频文件）
+                if os.path.exists(merged_audio_file):
+                    backup_audio = output_path.replace('.mp4', '_audio.wav')
+                    import shutil
+                    shutil.copy2(merged_audio_file, backup_audio)
+                    print(f"⚠️ 已保存音频文件: {backup_audio}")
                 raise e
             
             # 清理所有临时文件和目录
@@ -1141,8 +1470,141 @@ class UnifiedSpeechSynthesis:
                 
             raise e
     
-    def synthesize_batch_segments(self, text_segments, voice_type="xiaoyan", speed=50, volume=50, progress_callback=None, quality="高质量"):
-        """批量合成音频片段，在合成时就进行时长对齐 - 支持并行处理"""
+    def _resolve_conversion(self, conversion_type):
+        """根据转换类型返回 (源语言, 目标语言, 默认发音人)，无需翻译时语言为None"""
+        if conversion_type == "中文转英文":
+            return 'zh', 'en', "x4_EnUs_Laura_education"
+        elif conversion_type == "英文转中文":
+            return 'en', 'zh', "xiaoyan"
+        elif conversion_type == "中文转中文":
+            return None, None, "xiaoyan"
+        else:  # 英文转英文
+            return None, None, "x4_EnUs_Laura_education"
+    
+    def _run_pipeline(self, items, stages, queue_size):
+        """
+        使用有界队列串联多个处理阶段，每个阶段由若干线程并行处理
+        
+        Args:
+            items: 输入项列表
+            stages: [(阶段名称, 线程数, handler)]，handler(item) 返回下一阶段的输入，返回None表示该项终止
+            queue_size: 阶段间队列容量，上游过快时阻塞等待（背压）
+        
+        Returns:
+            list: 最后一个阶段的输出（顺序不定）
+        """
+        stop_signal = object()
+        queues = [Queue(maxsize=queue_size) for _ in stages] + [Queue()]
+        
+        def stage_worker(stage_index, stage_name, handler):
+            in_queue, out_queue = queues[stage_index], queues[stage_index + 1]
+            while True:
+                item = in_queue.get()
+                if item is stop_signal:
+                    break
+                try:
+                    result = handler(item)
+                except Exception as e:
+                    print(f"❌ 流水线阶段[{stage_name}]处理失败: {e}")
+                    result = None
+                if result is not None:
+                    out_queue.put(result)
+        
+        stage_threads = []
+        for stage_index, (stage_name, worker_count, handler) in enumerate(stages):
+            threads = [
+                threading.Thread(target=stage_worker, args=(stage_index, stage_name, handler), daemon=True)
+                for _ in range(max(1, worker_count))
+            ]
+            for thread in threads:
+                thread.start()
+            stage_threads.append(threads)
+        
+        # 输入队列有界，投递会随下游处理速度自然节流
+        for item in items:
+            queues[0].put(item)
+        
+        # 逐级关闭：上游阶段全部结束后再通知下游
+        for stage_index, threads in enumerate(stage_threads):
+            for _ in threads:
+                queues[stage_index].put(stop_signal)
+            for thread in threads:
+                thread.join()
+        
+        outputs = []
+        while not queues[-1].empty():
+            outputs.append(queues[-1].get_nowait())
+        return outputs
+    
+    def synthesize_pipeline(self, segments, conversion_type="英文转英文", voice_type=None, speed=50, volume=50,
+                            progress_callback=None, quality="高质量", queue_size=None, total_duration=None):
+        """
+        以流水线方式完成 翻译 → 合成 → 对齐
+        
+        某条字幕翻译完成后立即进入合成，合成完成后立即对齐，端到端耗时接近最慢的阶段而不是各阶段之和。
+        
+        Args:
+            segments: 原始字幕 [(text, start_time, end_time), ...]
+            progress_callback: 进度回调，progress 范围 0-100
+            queue_size: 阶段间队列容量，默认为合成线程数的2倍
+            total_duration: 视频总时长，用于确定最后一条字幕的可用时长
+        
+        Returns:
+            list: 与 segments 顺序一致的 AudioSegment 列表
+        """
+        source_lang, target_lang, default_voice = self._resolve_conversion(conversion_type)
+        actual_voice = voice_type or default_voice
+        num_segments = len(segments)
+        synth_workers = self.MAX_SYNTHESIS_WORKERS
+        align_workers = self._get_align_workers()
+        queue_size = queue_size or synth_workers * 2
+        
+        print(f"🚀 开始流水线处理 {num_segments} 个字幕段落")
+        print(f"🎤 使用发音人: {actual_voice}")
+        print(f"🔧 翻译线程: {self.TRANSLATE_WORKERS if source_lang else 1}，合成线程: {synth_workers}，"
+              f"对齐线程: {align_workers}，队列容量: {queue_size}")
+        
+        processed_texts = [text for text, _, _ in segments]
+        slots = compute_slots(segments, total_duration)
+        progress_lock = threading.Lock()
+        completed = [0]
+        
+        def report_progress():
+            with progress_lock:
+                completed[0] += 1
+                count = completed[0]
+            if progress_callback:
+                progress_callback(int(count / num_segments * 100),
+                                  f"已完成翻译+合成+对齐 {count}/{num_segments}")
+        
+        def translate_stage(item):
+            i, text, start_time, end_time = item
+            if source_lang:
+                text = self.translate_text(text, source_lang, target_lang)
+                processed_texts[i] = text
+            return i, text, start_time, end_time
+        
+        results, raw_durations = self._synthesize_and_align(
+            segments, processed_texts, slots, actual_voice, speed, volume, quality,
+            synth_workers, align_workers, queue_size, report_progress,
+            lead_stages=[("翻译", self.TRANSLATE_WORKERS if source_lang else 1, translate_stage)]
+        )
+        
+        successful_count = sum(1 for result in results if result is not None)
+        success_rate = (successful_count / num_segments) * 100 if num_segments else 0
+        print(f"✅ 流水线处理完成，成功率: {success_rate:.1f}%")
+        self._report_timeline_plan(segments, raw_durations, total_duration)
+        self._report_cache_stats()
+        return results
+    
+    def synthesize_batch_segments(self, text_segments, voice_type="xiaoyan", speed=50, volume=50, progress_callback=None, quality="高质量",
+                                  total_duration=None):
+        """批量合成音频片段并进行时长对齐 - 支持并行处理
+        
+        合成（网络IO）与对齐（CPU密集）分为两个流水线阶段：合成由线程池并发请求，
+        对齐交给按CPU核数创建的变速进程池，两者互不占用。
+        只有合成音频超出到下一条字幕前的可用时长时才变速（见 timeline_planner）。
+        """
         print(f"🚀 开始批量合成 {len(text_segments)} 个音频片段（含时长对齐）...")
         
         # 根据片段数量自动决定并行数量
@@ -1154,214 +1616,569 @@ class UnifiedSpeechSynthesis:
         elif num_segments <= 10:
             max_workers = 3
         else:
-            max_workers = min(4, num_segments // 3)  # 最多4个线程，避免API限制
+            # 每个请求使用独立的SynthesisSession，可安全提高并行度
+            max_workers = max(4, min(self.MAX_SYNTHESIS_WORKERS, num_segments // 3))
+        align_workers = self._get_align_workers()
+        
+        print(f"🔧 使用 {max_workers} 个线程并行处理语音合成，{align_workers} 个进程并行对齐")
+        
+        slots = compute_slots(text_segments, total_duration)
+        progress_lock = threading.Lock()
+        completed = [0]
+        
+        def report_progress():
+            with progress_lock:
+                completed[0] += 1
+                count = completed[0]
+            if progress_callback:
+                progress = int((count / num_segments) * 30)  # 合成占30%进度
+                progress_callback(progress, f"已完成音频合成+对齐 {count}/{num_segments}")
+        
+        results, raw_durations = self._synthesize_and_align(
+            text_segments, [text for text, _, _ in text_segments], slots, voice_type, speed, volume, quality,
+            max_workers, align_workers, max_workers * 2, report_progress
+        )
+        
+        # 计算成功率
+        successful_count = sum(1 for result in results if result is not None)
+        success_rate = (successful_count / num_segments) * 100 if num_segments else 0
+        
+        limiter_stats = self.rate_limiter.get_stats()
+        print(f"🔗 累计合并重复合成请求: {_synthesis_single_flight.coalesced_count}")
+        self._report_cache_stats()
+        self._report_timeline_plan(text_segments, raw_durations, total_duration)
+        print(f"✅ 批量合成+对齐完成，成功率: {success_rate:.1f}%，并行度: {max_workers}，"
+              f"当前限流速率: {limiter_stats['rate']:.2f}/s，并发上限: {limiter_stats['concurrency_limit']}")
+        return results
+    
+    def _synthesize_and_align(self, segments, texts, slots, voice_type, speed, volume, quality,
+                              synth_workers, align_workers, queue_size, report_progress, lead_stages=()):
+        """
+        synthesize_pipeline 和 synthesize_batch_segments 共用的 合成 → 对齐 流程
         
-        print(f"🔧 使用 {max_workers} 个线程并行处理语音合成")
+        合成与对齐作为流水线的最后两个阶段；atempo 引擎下对齐推迟到流水线结束后批量变速；
+        最后串行重试失败的片段，仍失败的用静音占位。每个片段结束时调用一次 report_progress。
         
-        # 创建结果队列，保持顺序
-        results = [None] * len(text_segments)
+        Args:
+            segments: [(text, start_time, end_time), ...]
+            texts: 实际合成的文本，前置阶段（如翻译）可以在流水线运行期间改写
+            lead_stages: 合成之前的阶段 [(阶段名称, 线程数, handler)]，
+                         最后一个前置阶段需输出 (i, text, start_time, end_time)
+        
+        Returns:
+            tuple: (与 segments 顺序一致的 AudioSegment 列表, 原始合成时长列表)
+        """
+        num_segments = len(segments)
+        results = [None] * num_segments
+        raw_durations = [None] * num_segments
         
-        # 定义单个片段处理函数
-        def process_segment(i, text, start_time, end_time):
-            """处理单个音频片段"""
+        def synthesize_stage(item):
+            i, text, start_time, end_time = item
             if not text.strip():
-                return i, None, "空文本"
-                
+                report_progress()
+                return None
             try:
-                # 计算目标时长
-                target_duration = end_time - start_time
-                
-                temp_output = f"temp_segment_{i}_{int(time.time() * 1000)}_{threading.current_thread().ident}.wav"
-                temp_aligned = f"temp_aligned_{i}_{int(time.time() * 1000)}_{threading.current_thread().ident}.wav"
-                
-                # 第一步：调用原有的合成方法
-                success = self.synthesize_text(text, temp_output, voice_type, speed, volume, quality)
-                
-                if success and os.path.exists(temp_output):
-                    # 第二步：立即进行时长对齐
-                    align_success = self.adjust_audio_speed(temp_output, target_duration, temp_aligned)
-                    
-                    if align_success and os.path.exists(temp_aligned):
-                        # 读取对齐后的音频数据到内存
-                        audio_segment = AudioSegment.from_wav(temp_aligned)
-                        print(f"✅ 片段 {i+1}: 合成+对齐成功，目标时长={target_duration:.2f}s，实际时长={len(audio_segment)/1000:.2f}s")
-                        
-                        # 清理临时文件
-                        try:
-                            os.remove(temp_output)
-                            os.remove(temp_aligned)
-                        except:
-                            pass
-                        
-                        return i, audio_segment, "成功"
-                    else:
-                        print(f"⚠️ 片段 {i+1}: 时长对齐失败，使用原始合成音频")
-                        audio_segment = AudioSegment.from_wav(temp_output)
-                        try:
-                            os.remove(temp_output)
-                        except:
-                            pass
-                        return i, audio_segment, "对齐失败"
-                else:
-                    return i, None, "合成失败"
-                    
+                segment_speed = self.choose_speed(text, voice_type, speed, slots[i])
+                samples = self.synthesize_pcm(text, voice_type, segment_speed, volume, quality)
             except Exception as e:
                 print(f"❌ 片段 {i} 合成失败: {e}")
-                return i, None, str(e)
-        
-        # 使用线程池并行处理
-        if max_workers == 1:
-            # 单线程处理（串行）
-            for i, (text, start_time, end_time) in enumerate(text_segments):
-                index, audio_segment, status = process_segment(i, text, start_time, end_time)
-                results[index] = audio_segment
-                
-                # 更新进度
-                if progress_callback:
-                    progress = int(((i + 1) / len(text_segments)) * 30)  # 合成占30%进度
-                    progress_callback(progress, f"已完成音频合成+对齐 {i + 1}/{len(text_segments)}")
-        else:
-            # 多线程并行处理
-            completed_count = 0
-            failed_indices = []
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有任务
-                future_to_index = {
-                    executor.submit(process_segment, i, text, start_time, end_time): i
-                    for i, (text, start_time, end_time) in enumerate(text_segments)
-                }
-                
-                # 收集结果
-                for future in concurrent.futures.as_completed(future_to_index):
-                    try:
-                        index, audio_segment, status = future.result()
-                        results[index] = audio_segment
-                        
-                        if audio_segment is None:
-                            failed_indices.append(index)
-                        
-                        completed_count += 1
-                        
-                        # 更新进度
-                        if progress_callback:
-                            progress = int((completed_count / len(text_segments)) * 30)  # 合成占30%进度
-                            progress_callback(progress, f"已完成音频合成+对齐 {completed_count}/{len(text_segments)}")
-                            
-                    except Exception as e:
-                        index = future_to_index[future]
-                        print(f"❌ 片段 {index} 处理异常: {e}")
-                        failed_indices.append(index)
-                        completed_count += 1
-            
-            # 重试失败的片段（串行）
-            if failed_indices:
-                print(f"⚠️ 重试 {len(failed_indices)} 个失败的片段...")
-                for index in failed_indices:
-                    if index < len(text_segments):
-                        text, start_time, end_time = text_segments[index]
-                        target_duration = end_time - start_time
-                        
-                        print(f"🔄 重试片段 {index}: {text[:50]}... (使用发音人: {voice_type})")
-                        
-                        # 增加重试次数和等待时间
-                        success = False
-                        for attempt in range(3):  # 最多3次重试
-                            retry_index, retry_audio, retry_status = process_segment(index, text, start_time, end_time)
-                            if retry_audio is not None:
-                                results[index] = retry_audio
-                                print(f"✅ 片段 {index} 重试成功 (第{attempt+1}次)")
-                                success = True
-                                break
-                            else:
-                                print(f"⚠️ 片段 {index} 第{attempt+1}次重试失败")
-                                if attempt < 2:  # 不是最后一次，等待重试
-                                    time.sleep(1)
-                        
-                        if not success:
-                            print(f"❌ 片段 {index} 所有重试都失败，使用静音")
-                            results[index] = AudioSegment.silent(duration=int(target_duration * 1000))
+                samples = None
+            # 失败的片段在重试结束后再计入进度
+            if samples is None:
+                return None
+            return i, samples
         
-        # 计算成功率
-        successful_count = sum(1 for result in results if result is not None)
-        success_rate = (successful_count / len(text_segments)) * 100 if text_segments else 0
+        # atempo 引擎每次变速都要启动ffmpeg，先收集需要对齐的片段，流水线结束后一次性批量变速
+        deferred_alignments = []
+        deferred_lock = threading.Lock()
+        batch_align = self.stretch_engine == "atempo"
+        
+        def align_stage(item):
+            i, samples = item
+            raw_durations[i] = pcm_duration(samples)
+            if batch_align:
+                with deferred_lock:
+                    deferred_alignments.append((i, samples))
+                return None
+            results[i], _ = self._align_segment_pcm(i, samples, slots[i])
+            report_progress()
+            return None
+        
+        self._run_pipeline(
+            [(i, text, start_time, end_time) for i, (text, start_time, end_time) in enumerate(segments)],
+            list(lead_stages) + [
+                ("合成", synth_workers, synthesize_stage),
+                ("对齐", align_workers, align_stage),
+            ],
+            queue_size
+        )
+        
+        for i, (audio_segment, _) in self._align_segments_batch(deferred_alignments, slots).items():
+            results[i] = audio_segment
+            report_progress()
+        
+        # 重试失败的片段（串行）
+        failed_indices = [i for i in range(num_segments) if results[i] is None and texts[i].strip()]
+        if failed_indices:
+            print(f"⚠️ 重试 {len(failed_indices)} 个失败的片段...")
+        for index in failed_indices:
+            text = texts[index]
+            target_duration = segments[index][2] - segments[index][1]
+            print(f"🔄 重试片段 {index}: {text[:50]}... (使用发音人: {voice_type})")
+            
+            for attempt in range(3):  # 最多3次重试
+                try:
+                    segment_speed = self.choose_speed(text, voice_type, speed, slots[index])
+                    samples = self.synthesize_pcm(text, voice_type, segment_speed, volume, quality)
+                    if samples is not None:
+                        raw_durations[index] = pcm_duration(samples)
+                        results[index], _ = self._align_segment_pcm(index, samples, slots[index])
+                        print(f"✅ 片段 {index} 重试成功 (第{attempt+1}次)")
+                        break
+                except Exception as e:
+                    print(f"⚠️ 片段 {index} 第{attempt+1}次重试失败: {e}")
+                if attempt < 2:  # 不是最后一次，等待重试
+                    time.sleep(1)
+            
+            if results[index] is None:
+                print(f"❌ 片段 {index} 所有重试都失败，使用静音")
+                results[index] = AudioSegment.silent(duration=int(target_duration * 1000))
+            report_progress()
+        
+        return results, raw_durations
+    
+    def _align_segment_pcm(self, i, samples, slot_duration):
+        """按时间轴对合成后的PCM音频进行时长对齐，返回 (audio_segment, status)
+        
+        slot_duration 为该字幕可用的最大时长（见 timeline_planner.compute_slots）。
+        音频放得下时保持原速；超出时压缩到恰好填满可用时长。
+        对齐结果按 (原始音频哈希, 目标时长) 存入第二级缓存，重复渲染时直接复用，跳过变速处理。
+        """
+        raw_duration = pcm_duration(samples, SYNTHESIS_SAMPLE_RATE)
+        target_duration = plan_target_duration(raw_duration, slot_duration)
+        if target_duration >= raw_duration:
+            print(f"✅ 片段 {i+1}: 合成音频 {raw_duration:.2f}s 未超出可用时长 {slot_duration:.2f}s，无需变速")
+            return pcm_to_audio_segment(samples, SYNTHESIS_SAMPLE_RATE), "无需变速"
+        
+        try:
+            aligned_key = self._get_aligned_cache_key(samples, target_duration)
+            aligned = self._load_aligned_pcm(aligned_key)
+            if aligned is None:
+                # 压缩后必须落在可用时长内，不再保留10%的容差
+                aligned = self.adjust_pcm_speed(samples, target_duration, SYNTHESIS_SAMPLE_RATE, tolerance=0.0)
+                if aligned is not samples:
+                    self._save_aligned_pcm(aligned_key, aligned)
+            audio_segment = pcm_to_audio_segment(aligned, SYNTHESIS_SAMPLE_RATE)
+            print(f"✅ 片段 {i+1}: 合成+对齐成功，目标时长={target_duration:.2f}s，实际时长={len(audio_segment)/1000:.2f}s")
+            return audio_segment, "成功"
+        except Exception as e:
+            print(f"⚠️ 片段 {i+1}: 时长对齐失败（{e}），使用原始合成音频")
+            return pcm_to_audio_segment(samples, SYNTHESIS_SAMPLE_RATE), "对齐失败"
+    
+    def _align_segments_batch(self, items, slots):
+        """批量对齐多个片段，返回 {i: (audio_segment, status)}
+        
+        与 _align_segment_pcm 的规划和缓存规则相同，但未命中对齐缓存且需要变速的片段
+        交给 time_stretch_batch 一起处理：atempo 引擎下每批只启动一个ffmpeg进程。
+        批量变速失败时逐个回退到 _align_segment_pcm。
+        """
+        aligned_results = {}
+        pending = []
+        for i, samples in items:
+            raw_duration = pcm_duration(samples, SYNTHESIS_SAMPLE_RATE)
+            target_duration = plan_target_duration(raw_duration, slots[i])
+            if target_duration >= raw_duration:
+                aligned_results[i] = (pcm_to_audio_segment(samples, SYNTHESIS_SAMPLE_RATE), "无需变速")
+                continue
+            aligned_key = self._get_aligned_cache_key(samples, target_duration)
+            aligned = self._load_aligned_pcm(aligned_key)
+            if aligned is not None:
+                aligned_results[i] = (pcm_to_audio_segment(aligned, SYNTHESIS_SAMPLE_RATE), "成功")
+                continue
+            pending.append((i, samples, raw_duration / target_duration, aligned_key))
+        
+        if not pending:
+            return aligned_results
+        
+        print(f"🎵 批量变速 {len(pending)} 个片段（{self.stretch_engine}）")
+        try:
+            stretched_list = time_stretch_batch([(samples, speed_rate) for _, samples, speed_rate, _ in pending],
+                                                SYNTHESIS_SAMPLE_RATE, self.stretch_engine)
+        except Exception as e:
+            print(f"⚠️ 批量变速失败（{e}），改为逐个对齐")
+            for i, samples, _, _ in pending:
+                aligned_results[i] = self._align_segment_pcm(i, samples, slots[i])
+            return aligned_results
+        
+        for (i, _, _, aligned_key), stretched in zip(pending, stretched_list):
+            self._save_aligned_pcm(aligned_key, stretched)
+            aligned_results[i] = (pcm_to_audio_segment(stretched, SYNTHESIS_SAMPLE_RATE), "成功")
+        print(f"✅ 批量变速完成: {len(pending)} 个片段")
+        return aligned_results
+    
+    def _report_timeline_plan(self, segments, raw_durations, total_duration):
+        """输出时间轴规划统计：需要变速的片段数和最大压缩倍率"""
+        _, stats = plan_timeline(segments, raw_durations, total_duration)
+        print(f"🕒 时间轴规划: {stats['stretched']}/{stats['segments']} 个片段需要变速，"
+              f"最大压缩倍率 {stats['max_ratio']:.2f}")
+    
+    async def _run_session_async(self, session, url, params):
+        """在事件循环中完成一次WebSocket合成会话"""
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        
+        try:
+            async with websockets.connect(url, ssl=ssl_context) as ws:
+                await ws.send(params)
+                async for message in ws:
+                    if session.handle_message(message):
+                        break
+        except Exception as e:
+            session.set_error(f"WebSocket连接错误: {str(e)}")
+        finally:
+            session.finished.set()
+    
+    async def synthesize_text_async(self, text, output_file, voice_type="xiaoyan", speed=50, volume=50,
+                                    quality="高质量", timeout=30):
+        """synthesize_text 的 asyncio 版本 - 等待WebSocket数据时不占用线程"""
+        samples = await self.synthesize_pcm_async(text, voice_type, speed, volume, quality, timeout)
+        if samples is None:
+            return False
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, write_wav_pcm, output_file, samples, SYNTHESIS_SAMPLE_RATE)
+        return True
+    
+    async def synthesize_pcm_async(self, text, voice_type="xiaoyan", speed=50, volume=50,
+                                   quality="高质量", timeout=30):
+        """synthesize_pcm 的 asyncio 版本，返回 int16 PCM 数组"""
+        if not _HAS_WEBSOCKETS:
+            raise RuntimeError("异步语音合成需要安装 websockets 库")
+        
+        if not text or not text.strip():
+            print("❌ 文本为空，跳过合成")
+            return None
+        
+        loop = asyncio.get_running_loop()
+        quality_settings = self._get_quality_settings(quality)
+        
+        # 检查缓存
+        cache_key = self._get_cache_key(text.strip(), self._resolve_voice_type(text, voice_type), speed, volume, quality)
+        cached_samples = await loop.run_in_executor(None, self._load_cached_pcm, cache_key)
+        if cached_samples is not None:
+            return cached_samples
+        
+        # 相同请求正在合成时（同步或异步、本任务或其他任务），等待其结果
+        future, is_leader = _synthesis_single_flight.begin(cache_key)
+        if not is_leader:
+            print(f"🔗 合并重复的合成请求: {text[:50]}...")
+            samples = await asyncio.wrap_future(future)
+            return None if samples is None else samples.copy()
+        
+        try:
+            # 与 synthesize_pcm 相同：成为 leader 后再查一次缓存
+            samples = await loop.run_in_executor(None, self._load_cached_pcm, cache_key)
+            requested = samples is None
+            if requested:
+                samples = await self._request_pcm_async(text, voice_type, speed, volume, quality_settings,
+                                                        cache_key, timeout)
+        except BaseException as e:
+            _synthesis_single_flight.finish(cache_key, future, error=e)
+            raise
+        _synthesis_single_flight.finish(cache_key, future, result=samples)
+        if requested:
+            await loop.run_in_executor(None, self._observe_speech_rate, text, voice_type, speed, samples)
+        return samples
+    
+    async def _request_pcm_async(self, text, voice_type, speed, volume, quality_settings, cache_key, timeout):
+        """异步调用讯飞API完成一次合成（不经过缓存和请求合并）"""
+        loop = asyncio.get_running_loop()
+        print(f"🎤 开始异步语音合成: {text[:50]}...")
+        
+        # 先拿限流名额再生成签名URL，避免排队期间URL中的Date过期
+        if not await self.rate_limiter.acquire_async(timeout=self.RATE_LIMIT_WAIT_TIMEOUT):
+            raise Exception("等待语音合成限流名额超时")
+        try:
+            url, params, session = self._create_session(text, voice_type, speed, volume, quality_settings)
+        except Exception as e:
+            self.rate_limiter.release(success=False)
+            print(f"❌ 创建WebSocket URL失败: {e}")
+            return None
+        
+        try:
+            await asyncio.wait_for(self._run_session_async(session, url, params), timeout)
+        except asyncio.TimeoutError:
+            session.set_error(f"语音合成超时 ({timeout}s)")
+        finally:
+            self.rate_limiter.release(session.error is None, session.error_code)
+        
+        try:
+            # 解码收尾属于阻塞操作，交给线程池执行
+            return await loop.run_in_executor(None, self._finish_session, session, cache_key)
+        except Exception:
+            session.close_decoder()
+            raise
+    
+    async def synthesize_batch_segments_async(self, text_segments, voice_type="xiaoyan", speed=50, volume=50,
+                                              progress_callback=None, quality="高质量",
+                                              max_concurrency=None, request_timeout=30, max_retries=3,
+                                              total_duration=None):
+        """
+        synthesize_batch_segments 的 asyncio 版本
+        
+        所有片段的WebSocket请求在同一个事件循环中并发执行，由信号量限制同时在途的请求数，
+        时长对齐等阻塞操作在线程池中执行。可在线程中通过 asyncio.run(...) 调用。
+        
+        Args:
+            text_segments: [(text, start_time, end_time), ...]
+            max_concurrency: 同时在途的合成请求数，默认 MAX_ASYNC_CONCURRENCY
+            request_timeout: 单个请求的超时时间（秒）
+            max_retries: 单个片段的最大尝试次数
+            total_duration: 视频总时长，用于确定最后一条字幕的可用时长
+        
+        Returns:
+            list: 与 text_segments 顺序一致的 AudioSegment 列表
+        """
+        num_segments = len(text_segments)
+        max_concurrency = max_concurrency or self.MAX_ASYNC_CONCURRENCY
+        print(f"🚀 开始异步批量合成 {num_segments} 个音频片段，最大并发请求数: {max_concurrency}")
+        
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        results = [None] * num_segments
+        slots = compute_slots(text_segments, total_duration)
+        
+        # 选择语速需要读写语速模型的SQLite数据，进入事件循环前在线程池中一次算好
+        def choose_speeds():
+            return [self.choose_speed(text, voice_type, speed, slot) if text.strip() else speed
+                    for (text, _, _), slot in zip(text_segments, slots)]
+        segment_speeds = await loop.run_in_executor(None, choose_speeds)
+        
+        async def process_segment(i, text, start_time, end_time):
+            """处理单个音频片段（含重试）"""
+            if not text.strip():
+                return i, None, "空文本"
+            
+            target_duration = end_time - start_time
+            segment_speed = segment_speeds[i]
+            for attempt in range(max_retries):
+                try:
+                    async with semaphore:
+                        samples = await self.synthesize_pcm_async(
+                            text, voice_type, segment_speed, volume, quality, timeout=request_timeout
+                        )
+                    if samples is None:
+                        return i, None, "合成失败"
+                    
+                    audio_segment, status = await loop.run_in_executor(
+                        None, self._align_segment_pcm, i, samples, slots[i]
+                    )
+                    return i, audio_segment, status
+                    
+                except Exception as e:
+                    print(f"⚠️ 片段 {i} 第{attempt+1}次合成失败: {e}")
+                    if attempt < max_retries - 1:
+                        await asyncio.sleep(1)
+            
+            print(f"❌ 片段 {i} 所有重试都失败，使用静音")
+            return i, AudioSegment.silent(duration=int(target_duration * 1000)), "重试失败"
+        
+        tasks = [
+            asyncio.ensure_future(process_segment(i, text, start_time, end_time))
+            for i, (text, start_time, end_time) in enumerate(text_segments)
+        ]
+        
+        completed_count = 0
+        for future in asyncio.as_completed(tasks):
+            index, audio_segment, status = await future
+            results[index] = audio_segment
+            completed_count += 1
+            
+            if progress_callback:
+                progress = int((completed_count / num_segments) * 30)  # 合成占30%进度
+                progress_callback(progress, f"已完成音频合成+对齐 {completed_count}/{num_segments}")
         
-        print(f"✅ 批量合成+对齐完成，成功率: {success_rate:.1f}%，并行度: {max_workers}")
+        successful_count = sum(1 for result in results if result is not None)
+        success_rate = (successful_count / num_segments) * 100 if num_segments else 0
+        print(f"✅ 异步批量合成+对齐完成，成功率: {success_rate:.1f}%，最大并发: {max_concurrency}")
         return results
     
     def _init_cache_dir(self):
-        """初始化音频缓存目录"""
+        """初始化音频缓存目录及索引"""
         try:
-            import os
-            if not os.path.exists(self.cache_dir):
-                os.makedirs(self.cache_dir)
-            print(f"🗂️ 音频缓存目录: {self.cache_dir}")
+            synthesis_max_bytes, aligned_max_bytes = self._split_cache_budget()
+            self.audio_cache = get_audio_cache(self.cache_dir, synthesis_max_bytes, self.cache_format)
+            # 第二级缓存：保存已完成时长对齐的片段，与合成缓存共用总容量
+            self.aligned_cache = get_audio_cache(os.path.join(self.cache_dir, "aligned"),
+                                                 aligned_max_bytes, self.cache_format)
+            # 语速模型与缓存放在一起，共享同一缓存目录的进程共享同一份模型
+            self.speech_rate_model = get_speech_rate_model(self.cache_dir)
+            print(f"🗂️ 音频缓存目录: {self.cache_dir}，容量上限: {self.cache_max_bytes / (1024*1024):.0f} MB"
+                  f"（合成 {synthesis_max_bytes / (1024*1024):.0f} MB + 对齐 {aligned_max_bytes / (1024*1024):.0f} MB）")
         except Exception as e:
             print(f"⚠️ 创建缓存目录失败: {e}")
             self.enable_cache = False
     
+    def _split_cache_budget(self):
+        """把总缓存容量划分给合成缓存和对齐缓存，返回 (合成缓存上限, 对齐缓存上限)"""
+        if self.aligned_cache_max_bytes is None:
+            aligned_max_bytes = int(self.cache_max_bytes * self.ALIGNED_CACHE_SHARE)
+        else:
+            aligned_max_bytes = min(max(int(self.aligned_cache_max_bytes), 0), self.cache_max_bytes)
+        return self.cache_max_bytes - aligned_max_bytes, aligned_max_bytes
+    
     def _get_quality_settings(self, quality):
-        """根据质量设置获取音频参数"""
+        """根据质量设置获取音频参数
+        
+        tts_sample_rate 为请求讯飞TTS时使用的采样率。讯飞 audio/L16 仅支持 8000/16000，
+        8000 再升采样会明显损失音质，因此各档位都请求接口支持的最高值 16000；
+        sample_rate 为最终输出的采样率。
+        video_crf / video_preset 为烧录硬字幕时重新编码视频的 libx264 参数（其他情况视频流直接复制）。
+        """
         quality_map = {
             "标准质量": {
                 "sample_rate": 16000,
+                "tts_sample_rate": 16000,
                 "bitrate": "128k",
                 "audio_format": "mp3",
                 "fade_duration": 50,
-                "compression": "medium"
+                "compression": "medium",
+                "video_crf": 23,
+                "video_preset": "veryfast"
             },
             "高质量": {
                 "sample_rate": 22050,
+                "tts_sample_rate": 16000,
                 "bitrate": "192k", 
                 "audio_format": "wav",
                 "fade_duration": 100,
-                "compression": "low"
+                "compression": "low",
+                "video_crf": 20,
+                "video_preset": "medium"
             },
             "超清质量": {
                 "sample_rate": 44100,
+                "tts_sample_rate": 16000,
                 "bitrate": "320k",
                 "audio_format": "wav",
                 "fade_duration": 150,
-                "compression": "none"
+                "compression": "none",
+                "video_crf": 18,
+                "video_preset": "slow"
             }
         }
         return quality_map.get(quality, quality_map["高质量"])
     
     def _get_cache_key(self, text, voice_type, speed, volume, quality):
-        """生成缓存键值"""
+        """生成缓存键值（voice_type 应为自动切换后的实际发音人）
+        
+        键值包含请求讯飞时的传输格式和采样率：两者改变时合成结果不同，不能共用缓存。
+        """
         import hashlib
-        cache_string = f"{text}_{voice_type}_{speed}_{volume}_{quality}"
+        tts_sample_rate = self._get_quality_settings(quality)['tts_sample_rate']
+        cache_string = f"{text}_{voice_type}_{speed}_{volume}_{quality}_{self.tts_audio_format}_{tts_sample_rate}"
         return hashlib.md5(cache_string.encode('utf-8')).hexdigest()
     
-    def _get_cached_audio(self, cache_key):
-        """从缓存获取音频文件"""
-        if not self.enable_cache:
+    def is_cached(self, text, voice_type="xiaoyan", speed=50, volume=50, quality="高质量"):
+        """判断合成结果是否已在缓存中（不计入命中统计）"""
+        if not self.enable_cache or self.audio_cache is None or not text or not text.strip():
+            return False
+        cache_key = self._get_cache_key(text.strip(), self._resolve_voice_type(text, voice_type), speed, volume, quality)
+        return self.audio_cache.contains(cache_key)
+    
+    def _load_cached_pcm(self, cache_key):
+        """从缓存读取PCM数据，未命中时返回None"""
+        if not self.enable_cache or self.audio_cache is None:
             return None
-            
+        
         try:
-            import os
-            cache_file = os.path.join(self.cache_dir, f"{cache_key}.wav")
-            if os.path.exists(cache_file):
-                print(f"🎯 使用缓存音频: {cache_key}")
-                return cache_file
+            cached = self.audio_cache.load(cache_key)
+            if cached is None:
+                return None
+            samples, sample_rate = cached
+            print(f"🎯 使用缓存音频: {cache_key}")
+            if sample_rate != SYNTHESIS_SAMPLE_RATE:
+                samples = resample_pcm(samples, sample_rate, SYNTHESIS_SAMPLE_RATE)
+            return samples
         except Exception as e:
-            print(f"⚠️ 读取缓存失败: {e}")
-        return None
+            print(f"⚠️ 缓存文件读取失败: {e}")
+            return None
     
-    def _save_to_cache(self, cache_key, audio_file):
-        """保存音频到缓存"""
-        if not self.enable_cache:
+    def _save_pcm_to_cache(self, cache_key, samples):
+        """保存PCM数据到缓存"""
+        if not self.enable_cache or self.audio_cache is None:
             return
             
         try:
-            import os
-            import shutil
-            cache_file = os.path.join(self.cache_dir, f"{cache_key}.wav")
-            shutil.copy2(audio_file, cache_file)
+            self.audio_cache.put(cache_key, samples, SYNTHESIS_SAMPLE_RATE)
             print(f"💾 音频已缓存: {cache_key}")
         except Exception as e:
             print(f"⚠️ 保存缓存失败: {e}")
     
+    def _get_aligned_cache_key(self, samples, target_duration):
+        """生成对齐缓存键值：原始音频内容哈希 + 目标时长（毫秒）+ 变速引擎"""
+        raw_hash = hashlib.md5(np.ascontiguousarray(samples, dtype=np.int16).tobytes()).hexdigest()
+        engine = self.stretch_engine
+        cache_string = f"{raw_hash}_{int(round(target_duration * 1000))}_{engine}"
+        return hashlib.md5(cache_string.encode('utf-8')).hexdigest()
+    
+    def _load_aligned_pcm(self, aligned_key):
+        """从对齐缓存读取已对齐的PCM数据，未命中时返回None"""
+        if not self.enable_cache or self.aligned_cache is None:
+            return None
+        
+        try:
+            cached = self.aligned_cache.load(aligned_key)
+            if cached is None:
+                return None
+            print(f"🎯 使用已对齐缓存: {aligned_key}")
+            return cached[0]
+        except Exception as e:
+            print(f"⚠️ 对齐缓存读取失败: {e}")
+            return None
+    
+    def _save_aligned_pcm(self, aligned_key, samples):
+        """保存已对齐的PCM数据到对齐缓存"""
+        if not self.enable_cache or self.aligned_cache is None:
+            return
+        
+        try:
+            self.aligned_cache.put(aligned_key, samples, SYNTHESIS_SAMPLE_RATE)
+        except Exception as e:
+            print(f"⚠️ 保存对齐缓存失败: {e}")
+    
+    def get_cache_stats(self):
+        """获取缓存统计（命中/未命中/节省字节数/容量等），缓存不可用时返回None
+        
+        Returns:
+            dict: {"synthesis": 合成缓存统计, "aligned": 对齐缓存统计}
+        """
+        if self.audio_cache is None:
+            return None
+        return {
+            "synthesis": self.audio_cache.get_stats(),
+            "aligned": self.aligned_cache.get_stats() if self.aligned_cache is not None else None
+        }
+    
+    def _report_cache_stats(self):
+        """打印并持久化缓存统计"""
+        if not self.enable_cache or self.audio_cache is None:
+            return
+        try:
+            if self.aligned_cache is not None:
+                self.aligned_cache.flush_stats()
+                aligned_stats = self.aligned_cache.get_stats()
+                print(f"🗂️ 对齐缓存统计: 命中 {aligned_stats['hits']}，未命中 {aligned_stats['misses']}，"
+                      f"占用 {aligned_stats['total_bytes'] / (1024*1024):.1f} MB")
+            self.audio_cache.flush_stats()
+            stats = self.audio_cache.get_stats()
+            print(f"🗂️ 缓存统计: 命中 {stats['hits']}，未命中 {stats['misses']}，"
+                  f"命中率 {stats['hit_rate']*100:.1f}%，节省 {stats['bytes_saved'] / (1024*1024):.1f} MB，"
+                  f"占用 {stats['total_bytes'] / (1024*1024):.1f}/{stats['max_bytes'] / (1024*1024):.0f} MB")
+        except Exception as e:
+            print(f"⚠️ 缓存统计保存失败: {e}")
+    
     def set_cache_enabled(self, enabled):
         """设置是否启用缓存"""
         self.enable_cache = enabled
@@ -1408,7 +2225,60 @@ def run_en_to_en(video_file, subtitle_file, output_path, voice_type="x4_EnUs_Lau
     )
 
 
-if __name__ == "__main__":
-    # 测试代码
+def benchmark_tts_transport(text="This is a benchmark sentence for speech synthesis.",
+                            voice_type="x4_EnUs_Laura_education", repeats=3):
+    """
+    对比 raw(PCM) 与 lame(MP3) 两种传输模式在各TTS采样率下的合成耗时
+    
+    请求参数只随 tts_sample_rate 变化，采样率相同的质量档位只测第一个
+    （目前各档位都请求 16000，见 _get_quality_settings，每种传输模式只有一行结果）。
+    需要可用的讯飞TTS配置和网络，基准测试期间禁用缓存。
+    
+    Returns:
+        list: [{"audio_format", "quality", "tts_sample_rate", "avg_seconds", "audio_seconds"}, ...]
+    """
     synthesis = UnifiedSpeechSynthesis()
-    print("统一语音合成模块已就绪") 
+    synthesis.enable_cache = False
+    original_format = synthesis.tts_audio_format
+    results = []
+    
+    # tts_sample_rate -> 使用该采样率的第一个质量档位
+    levels = {}
+    for quality in ("标准质量", "高质量", "超清质量"):
+        levels.setdefault(synthesis._get_quality_settings(quality)['tts_sample_rate'], quality)
+    
+    try:
+        for audio_format in ("raw", "lame"):
+            synthesis.tts_audio_format = audio_format
+            for tts_sample_rate, quality in levels.items():
+                elapsed = []
+                samples = None
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    samples = synthesis.synthesize_pcm(text, voice_type, 50, 50, quality)
+                    elapsed.append(time.perf_counter() - start)
+                results.append({
+                    "audio_format": audio_format,
+                    "quality": quality,
+                    "tts_sample_rate": tts_sample_rate,
+                    "avg_seconds": sum(elapsed) / len(elapsed),
+                    "audio_seconds": pcm_duration(samples) if samples is not None else 0.0
+                })
+    finally:
+        synthesis.tts_audio_format = original_format
+    
+    print(f"{'传输格式':<8}{'质量':<8}{'采样率':>8}{'平均耗时(s)':>12}{'音频时长(s)':>12}")
+    for row in results:
+        print(f"{row['audio_format']:<10}{row['quality']:<8}{row['tts_sample_rate']:>10}"
+              f"{row['avg_seconds']:>12.3f}{row['audio_seconds']:>12.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark_tts_transport()
+    else:
+        # 测试代码
+        synthesis = UnifiedSpeechSynthesis()
+        print("统一语音合成模块已就绪") 